@@ -1,16 +1,186 @@
 # admin.py
-from django.contrib import admin
+"""
+Admin for tables that hold millions of rows.
+
+- Changelist totals come from EstimatedCountPaginator (the PostgreSQL
+  planner's row estimate instead of COUNT(*)), and the extra unfiltered
+  "N total" count is switched off.
+- Every FK shown in a list is fetched with list_select_related, and user /
+  post FKs use raw-id inputs instead of <select>s of every user.
+- Ordering, filters and search only touch indexed columns.
+- Heavy bulk actions queue background jobs (api/jobs.py) instead of running
+  inside the request.
+"""
+import json
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from . import counters
+from .jobs import enqueue
 from .models import (
     UserProfile, Post, Comment, Like, Message,
     Follower, FriendRequest, Story, StoryView
 )
+from .services import cleanup_expired_stories
+
+
+class EstimatedCountPaginator(Paginator):
+    """Uses the planner's row estimate on PostgreSQL; exact counts below EXACT_BELOW rows."""
+    EXACT_BELOW = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == "postgresql":
+            estimate = planner_estimate(queryset)
+            if estimate >= self.EXACT_BELOW:
+                return estimate
+        return super().count
+
+
+def planner_estimate(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+def _queued(modeladmin, request, what):
+    modeladmin.message_user(request, f"Queued: {what}. It runs in the background.", messages.SUCCESS)
+
+
+# ===================================================================
+# Users
+# ===================================================================
+@admin.register(UserProfile)
+class UserProfileAdmin(LargeTableAdmin):
+    list_display = ('user', 'full_name', 'is_private', 'posts_count', 'followers_count', 'following_count')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('=user__username',)  # exact match on the unique index
+    ordering = ('-id',)
+    actions = ['recompute_counters']
+
+    @admin.action(description="Recompute post / follower counters")
+    def recompute_counters(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True))
+        enqueue(counters.recompute_profiles, user_ids)
+        _queued(self, request, f"recount of {len(user_ids)} profiles")
+
+
+@admin.register(Follower)
+class FollowerAdmin(LargeTableAdmin):
+    list_display = ('id', 'follower', 'followed', 'created_at')
+    list_select_related = ('follower', 'followed')
+    raw_id_fields = ('follower', 'followed')
+    ordering = ('-id',)
+
+
+@admin.register(FriendRequest)
+class FriendRequestAdmin(LargeTableAdmin):
+    list_display = ('id', 'sender', 'receiver', 'status', 'created_at')
+    list_select_related = ('sender', 'receiver')
+    raw_id_fields = ('sender', 'receiver')
+    ordering = ('-id',)
+
+
+# ===================================================================
+# Posts
+# ===================================================================
+@admin.register(Post)
+class PostAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'created_at', 'deleted_at', 'likes_count', 'comments_count')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    list_filter = (('deleted_at', admin.EmptyFieldListFilter), ('created_at', admin.DateFieldListFilter))
+    ordering = ('-created_at',)
+    actions = ['recompute_counters', 'delete_and_purge']
+
+    def get_actions(self, request):
+        # A plain delete would skip media release and counter updates
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_queryset(self, request):
+        # Tombstoned posts stay visible here until their purge job finishes
+        return Post.all_objects.all()
+
+    @admin.action(description="Recompute like / comment counters")
+    def recompute_counters(self, request, queryset):
+        post_ids = [str(pk) for pk in queryset.values_list('id', flat=True)]
+        enqueue(counters.recompute_posts, post_ids)
+        _queued(self, request, f"recount of {len(post_ids)} posts")
+
+    @admin.action(description="Delete and purge (likes, comments, media)")
+    def delete_and_purge(self, request, queryset):
+        from .purge import delete_post
+        posts = list(queryset.filter(deleted_at__isnull=True).only('id', 'user_id'))
+        for post in posts:
+            delete_post(post)
+        _queued(self, request, f"purge of {len(posts)} posts")
+
+
+@admin.register(Comment)
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('id', 'post', 'user', 'created_at')
+    list_select_related = ('post', 'user')
+    raw_id_fields = ('post', 'user', 'parent')
+    list_filter = (('created_at', admin.DateFieldListFilter),)
+    ordering = ('-created_at',)
+
+
+@admin.register(Like)
+class LikeAdmin(LargeTableAdmin):
+    list_display = ('id', 'post', 'user', 'created_at')
+    list_select_related = ('post', 'user')
+    raw_id_fields = ('post', 'user')
+    list_filter = (('created_at', admin.DateFieldListFilter),)
+    ordering = ('-id',)
+
+
+# ===================================================================
+# Messages & stories
+# ===================================================================
+@admin.register(Message)
+class MessageAdmin(LargeTableAdmin):
+    list_display = ('id', 'sender', 'receiver', 'is_read', 'created_at')
+    list_select_related = ('sender', 'receiver')
+    raw_id_fields = ('sender', 'receiver')
+    list_filter = (('created_at', admin.DateFieldListFilter),)
+    ordering = ('-created_at',)
+
+
+@admin.register(Story)
+class StoryAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'media_type', 'created_at', 'expires_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    list_filter = (('expires_at', admin.DateFieldListFilter),)
+    ordering = ('-expires_at',)
+    actions = ['purge_expired']
+
+    @admin.action(description="Purge all expired stories (ignores the selection)")
+    def purge_expired(self, request, queryset):
+        enqueue(cleanup_expired_stories, dedup_key="admin:cleanup_expired_stories")
+        _queued(self, request, "expired story cleanup")
+
 
-admin.site.register(UserProfile)
-admin.site.register(Post)
-admin.site.register(Comment)
-admin.site.register(Like)
-admin.site.register(Message)
-admin.site.register(Follower)
-admin.site.register(FriendRequest)
-admin.site.register(Story)
-admin.site.register(StoryView)
+@admin.register(StoryView)
+class StoryViewAdmin(LargeTableAdmin):
+    list_display = ('id', 'story', 'viewer', 'viewed_at')
+    list_select_related = ('story', 'viewer')
+    raw_id_fields = ('story', 'viewer')
+    ordering = ('-id',)
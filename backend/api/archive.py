@@ -0,0 +1,215 @@
+# backend/api/archive.py
+"""
+Cold storage for old direct messages.
+
+Once a day archive_old_messages() finds conversations with messages older
+than MESSAGE_ARCHIVE_AFTER_DAYS and queues archive_conversation() for each.
+That packs the old rows, oldest first, into segments of up to
+MESSAGE_SEGMENT_SIZE messages: a JSON list, zstd-compressed when the
+`zstandard` package is installed and gzip otherwise, stored at
+
+    messages/archive/<low user id>-<high user id>/<first message id>.json.<zst|gz>
+
+with one MessageSegment row (time range, count, codec) per blob. The rows
+are then deleted. A segment is uploaded and indexed before its rows go,
+and its key only depends on the rows, so a failed run can simply be
+repeated.
+
+chat_page() serves GET /messages/chat/<user_id>/ newest first with a
+(created_at, id) cursor: live rows first, then the segments, so a client
+paging back through a conversation doesn't see where the archive starts.
+"""
+import gzip
+import io
+import json
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .jobs import enqueue, job, periodic
+from .media import release_media
+from .models import Message, MessageSegment
+from .utils.storage import get_storage
+
+User = get_user_model()
+
+PREFIX = "messages/archive"
+CURSOR_SALT = "api.archive.chat"
+FIELDS = ("id", "sender_id", "receiver_id", "text", "media_path", "is_read", "created_at")
+EXTENSIONS = {"zstd": "zst", "gzip": "gz"}
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(blob, codec):
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+def conversation(user_a, user_b):
+    """(lower id, higher id): how segments name a conversation."""
+    return tuple(sorted((int(user_a), int(user_b))))
+
+
+def _between(low, high):
+    return Q(sender_id=low, receiver_id=high) | Q(sender_id=high, receiver_id=low)
+
+
+# -------------------------------------------------------------------
+# Packing
+# -------------------------------------------------------------------
+@periodic(every=24 * 60 * 60)
+def archive_old_messages():
+    if not settings.MESSAGE_ARCHIVE_AFTER_DAYS:
+        return
+    cutoff = timezone.now() - timedelta(days=settings.MESSAGE_ARCHIVE_AFTER_DAYS)
+    old = Message.objects.filter(created_at__lt=cutoff)
+    pairs = {conversation(*p) for p in old.order_by().values_list("sender_id", "receiver_id").distinct()}
+    for low, high in sorted(pairs):
+        enqueue(archive_conversation, low, high, cutoff.isoformat(), dedup_key=f"archive:{low}:{high}")
+    print(f"[ARCHIVE] {len(pairs)} conversations queued")
+
+
+@job("cleanup")
+def archive_conversation(low, high, cutoff):
+    """Move the conversation's messages older than cutoff (ISO time) into segments."""
+    old = Message.objects.filter(_between(low, high), created_at__lt=parse_datetime(cutoff))
+    codec = "zstd" if _zstd() else "gzip"
+    storage = get_storage()
+    packed = segments = 0
+    while True:
+        rows = list(old.order_by("created_at", "id").values(*FIELDS)[:settings.MESSAGE_SEGMENT_SIZE])
+        if not rows:
+            break
+        path = f"{PREFIX}/{low}-{high}/{rows[0]['id']}.json.{EXTENSIONS[codec]}"
+        blob = _compress(json.dumps(rows, default=str, ensure_ascii=False).encode(), codec)
+        if not storage.put(path, io.BytesIO(blob), upsert=True):
+            raise RuntimeError(f"upload failed: {path}")
+        MessageSegment.objects.update_or_create(path=path, defaults={
+            "user_low_id": low, "user_high_id": high, "codec": codec,
+            "first_at": rows[0]["created_at"], "last_at": rows[-1]["created_at"],
+            "message_count": len(rows),
+        })
+        # Media stays referenced by the segment, so nothing is released here
+        Message.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+        packed += len(rows)
+        segments += 1
+    print(f"[ARCHIVE] {low}-{high}: {packed} messages in {segments} segments ({codec})")
+    return packed
+
+
+def read_segment(segment, missing_ok=False):
+    """The segment's message dicts, oldest first."""
+    blob = get_storage().get(segment.path)
+    if blob is None:
+        if missing_ok:
+            return []
+        raise RuntimeError(f"missing archive segment {segment.path}")
+    rows = json.loads(_decompress(blob, segment.codec))
+    for row in rows:
+        row["id"] = uuid.UUID(row["id"])
+        row["created_at"] = parse_datetime(row["created_at"])
+    return rows
+
+
+def segments_of(user_id):
+    return MessageSegment.objects.filter(Q(user_low_id=user_id) | Q(user_high_id=user_id))
+
+
+def drop_segments(segments):
+    """Delete segments with their blobs and release the media their messages used."""
+    dropped = 0
+    for segment in segments.order_by("id"):
+        items = [{"path": row["media_path"]} for row in read_segment(segment, missing_ok=True) if row["media_path"]]
+        get_storage().delete([segment.path])
+        segment.delete()
+        release_media(items)
+        dropped += 1
+    return dropped
+
+
+# -------------------------------------------------------------------
+# Reading (chat history)
+# -------------------------------------------------------------------
+def _key(row):
+    return row["created_at"], row["id"]
+
+
+def _archived(low, high, before, limit):
+    """Up to `limit` archived message dicts older than `before`, newest first."""
+    segments = MessageSegment.objects.filter(user_low_id=low, user_high_id=high)
+    if before:
+        segments = segments.filter(first_at__lte=before[0])
+    found = []
+    for segment in segments.order_by("-last_at").iterator():
+        rows = read_segment(segment)
+        found += [row for row in reversed(rows) if before is None or _key(row) < before]
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def chat_page(user, other, cursor=None, page_size=20):
+    """
+    (messages oldest first, next cursor or None) for one page of the
+    conversation, newest page first. Raises signing.BadSignature for
+    tampered cursors.
+    """
+    before = None
+    if cursor:
+        state = signing.loads(cursor, salt=CURSOR_SALT)
+        before = (parse_datetime(state["t"]), uuid.UUID(state["i"]))
+
+    low, high = conversation(user.id, other.id)
+    live = Message.objects.filter(_between(low, high))
+    if before:
+        live = live.filter(Q(created_at__lt=before[0]) | Q(created_at=before[0], id__lt=before[1]))
+    # One extra row tells whether there is a next page
+    messages = list(live.order_by("-created_at", "-id")[:page_size + 1])
+
+    if len(messages) <= page_size:
+        # Past the live rows: continue in the archive
+        start = (messages[-1].created_at, messages[-1].id) if messages else before
+        messages += [Message(**row) for row in _archived(low, high, start, page_size + 1 - len(messages))]
+
+    users = {user.id: user, other.id: other}
+    for msg in messages:
+        msg.sender, msg.receiver = users[msg.sender_id], users[msg.receiver_id]
+
+    next_cursor = None
+    if len(messages) > page_size:
+        messages = messages[:page_size]
+        last = messages[-1]
+        next_cursor = signing.dumps({"t": last.created_at.isoformat(), "i": str(last.id)}, salt=CURSOR_SALT)
+    return messages[::-1], next_cursor
+
+
+def export_rows(user):
+    """The user's archived messages as data-export rows (exports.py)."""
+    for segment in segments_of(user.id).order_by("first_at").iterator():
+        names = dict(User.objects.filter(
+            id__in=[segment.user_low_id, segment.user_high_id]
+        ).values_list("id", "username"))
+        for row in read_segment(segment):
+            row["sender__username"] = names.get(row.pop("sender_id"))
+            row["receiver__username"] = names.get(row.pop("receiver_id"))
+            yield row
@@ -0,0 +1,239 @@
+# backend/api/async_views.py
+"""
+Async-native versions of the I/O-bound endpoints, for the ASGI app
+(instagram/asgi.py, e.g. `gunicorn instagram.asgi:application -k uvicorn.workers.UvicornWorker`).
+
+The DRF viewsets block a worker thread for the whole storage round-trip.
+These views await the storage HTTP calls instead and run independent work
+concurrently with asyncio.gather (all media of a post upload in parallel;
+the profile lookups are issued together), so one process can keep many
+requests in flight. Responses match the DRF endpoints they mirror.
+
+Note: Django still executes async ORM calls on a single sync thread per
+request, so the DB part of a gather is queued, while storage uploads truly
+overlap.
+"""
+import asyncio
+import math
+import os
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import blocks, counters, tags, visibility
+from .media import media_type_for, astore_upload, process_post_media, process_story_media, release_media
+from .models import UserProfile, Follower, FriendRequest, Post, Message, Story
+from .serializers import (
+    UserProfileSerializer, PostSerializer, MessageSerializer, StorySerializer,
+)
+from .throttling import client_ident, consume
+from .utils.storage import get_storage
+from .jobs import enqueue
+
+User = get_user_model()
+
+# Same weights as the DRF twins (api/throttling.py); unlisted views use the defaults
+THROTTLE_COSTS = {
+    'create_post': 20,
+    'create_story': 10,
+    'send_message': 2,
+    'upload_profile_picture': 10,
+}
+
+
+# -------------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------------
+async def aget_user_from_session_key(session_key):
+    """Async twin of auth.get_user_from_session_key."""
+    if not session_key:
+        return None
+    try:
+        session = await Session.objects.aget(session_key=session_key)
+        if session.expire_date < timezone.now():
+            await session.adelete()
+            return None
+        user_id = session.get_decoded().get('_auth_user_id')
+        if not user_id:
+            return None
+        return await User.objects.aget(id=user_id, is_active=True)
+    except (Session.DoesNotExist, User.DoesNotExist):
+        return None
+
+
+def session_required(view):
+    """
+    Authenticate via X-Session-ID (like SessionIDAuthentication), set
+    request.user and apply the shared rate limit.
+    """
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user_from_session_key(request.headers.get("X-Session-ID"))
+        if not user:
+            return JsonResponse({"detail": "Invalid or expired session. Please log in again."}, status=401)
+        request.user = user
+
+        if settings.THROTTLE_ENABLED:
+            cost = THROTTLE_COSTS.get(view.__name__) or settings.THROTTLE_DEFAULT_COSTS[
+                "read" if request.method in ("GET", "HEAD", "OPTIONS") else "write"
+            ]
+            wait = await sync_to_async(consume)(client_ident(request, user), cost)
+            if wait:
+                response = JsonResponse({"detail": "Request was throttled."}, status=429)
+                response["Retry-After"] = str(math.ceil(wait))
+                return response
+        return await view(request, *args, **kwargs)
+    wrapper.__name__ = view.__name__
+    return csrf_exempt(wrapper)
+
+
+async def serialize(serializer_class, instance, request, context=None, **kwargs):
+    # Serializers may touch the DB (SerializerMethodFields), so run them sync
+    context = {'request': request, **(context or {})}
+    return await sync_to_async(
+        lambda: serializer_class(instance, context=context, **kwargs).data
+    )()
+
+
+# -------------------------------------------------------------------
+# Uploads
+# -------------------------------------------------------------------
+@require_POST
+@session_required
+async def create_post(request):
+    files = request.FILES.getlist('media')
+    if not files:
+        return JsonResponse({"error": "Media files required."}, status=400)
+    media_types = [media_type_for(f.name, getattr(f, 'content_type', None)) for f in files]
+    if not all(media_types):
+        return JsonResponse({"error": "Only image/video allowed."}, status=400)
+    empty = [f.name for f in files if not f.size]
+    if empty:
+        return JsonResponse({"error": f"{empty[0]} is empty."}, status=400)
+
+    prefix = f"posts/{request.user.id}"
+    items = await asyncio.gather(*(astore_upload(f, prefix, t) for f, t in zip(files, media_types)))
+    if not all(items):
+        # Like PostViewSet.create: no post unless every original was stored
+        await sync_to_async(release_media)([item for item in items if item])
+        return JsonResponse({"error": "Could not store the media, please retry."}, status=502)
+    post = await Post.objects.acreate(
+        user=request.user, caption=request.POST.get('caption', ''), media=list(items)
+    )
+    await sync_to_async(counters.post_added)(request.user.id)
+    await sync_to_async(tags.index_post)(post)
+    await sync_to_async(enqueue)(process_post_media, str(post.id))
+
+    post = await Post.objects.select_related('user', 'user__profile').aget(id=post.id)
+    return JsonResponse(await serialize(PostSerializer, post, request), status=201)
+
+
+@require_POST
+@session_required
+async def create_story(request):
+    file = request.FILES.get('file') or request.FILES.get('media')
+    if not file:
+        return JsonResponse({"media": ["media file required"]}, status=400)
+    media_type = media_type_for(file.name)
+    if not media_type:
+        return JsonResponse({"media": ["Only image/video allowed"]}, status=400)
+
+    item = await astore_upload(file, f"stories/{request.user.id}", media_type)
+    if not item:
+        return JsonResponse({"media": ["Upload failed"]}, status=400)
+
+    story = await Story.objects.acreate(
+        user=request.user,
+        media=item,
+        media_type=media_type,
+        expires_at=timezone.now() + timedelta(hours=24),
+    )
+    await sync_to_async(counters.bump_profile_version)(request.user.id)
+    await sync_to_async(enqueue)(process_story_media, str(story.id))
+    return JsonResponse(await serialize(StorySerializer, story, request), status=201)
+
+
+@require_POST
+@session_required
+async def send_message(request):
+    receiver_id = request.POST.get('receiver')
+    if not receiver_id:
+        return JsonResponse({"receiver": "Receiver is required"}, status=400)
+
+    file = request.FILES.get('media')
+    # Receiver lookup and media upload don't depend on each other
+    receiver, item = await asyncio.gather(
+        User.objects.filter(id=receiver_id).afirst(),
+        astore_upload(file, f"messages/{request.user.id}", media_type_for(file.name) or 'file')
+        if file else asyncio.sleep(0),
+    )
+    if file and not item:
+        return JsonResponse({"media": ["Upload failed"]}, status=400)
+    if receiver is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    if await sync_to_async(blocks.is_blocked)(request.user.id, receiver.id):
+        # The upload already happened; release it like any unused one
+        if item:
+            await sync_to_async(release_media)([item])
+        return JsonResponse({"detail": "You cannot message this user."}, status=403)
+
+    msg = await Message.objects.acreate(
+        sender=request.user,
+        receiver=receiver,
+        text=request.POST.get('text', ''),
+        media_path=item["path"] if item else None,
+    )
+    return JsonResponse(await serialize(MessageSerializer, msg, request), status=201)
+
+
+@require_POST
+@session_required
+async def upload_profile_picture(request):
+    file = request.FILES.get('profile_pic')
+    if not file:
+        return JsonResponse({"error": "No profile picture file was provided. Expected field 'profile_pic'."}, status=400)
+    if media_type_for(file.name) != 'image':
+        return JsonResponse({"error": "Only image files are allowed."}, status=400)
+
+    ext = os.path.splitext(file.name)[1].lower()
+    path = f"profiles/{request.user.id}/profile_pic{ext}"
+    if not await get_storage().aput(path, file, upsert=True):
+        return JsonResponse({"error": "Storage upload failed."}, status=500)
+
+    profile = await UserProfile.objects.select_related('user').aget(user=request.user)
+    profile.profile_pic_path = path
+    await profile.asave(update_fields=['profile_pic_path'])
+    await sync_to_async(counters.bump_profile_version)(request.user.id)
+    return JsonResponse(await serialize(UserProfileSerializer, profile, request))
+
+
+# -------------------------------------------------------------------
+# Composite reads
+# -------------------------------------------------------------------
+@require_GET
+@session_required
+async def profile_detail(request, username):
+    """Profile + viewer relationship + latest posts, with the lookups issued together."""
+    profile = await UserProfile.objects.select_related('user').filter(user__username=username).afirst()
+    # Blocked either way: the profile doesn't exist for the viewer (as in ProfileViewSet)
+    if profile is None or await sync_to_async(blocks.is_blocked)(request.user.id, profile.user_id):
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    is_following, is_requested, posts = await asyncio.gather(
+        Follower.objects.filter(follower=request.user, followed=profile.user).aexists(),
+        FriendRequest.objects.filter(sender=request.user, receiver=profile.user, status='pending').aexists(),
+        sync_to_async(lambda: list(
+            visibility.posts(request.user).filter(user=profile.user)
+            .select_related('user', 'user__profile')[:12]
+        ))(),
+    )
+    relationship = {profile.user_id: {'is_following': is_following, 'is_requested': is_requested}}
+    data = await serialize(UserProfileSerializer, profile, request, {'relationship': relationship})
+    data['recent_posts'] = await serialize(PostSerializer, posts, request, many=True)
+    return JsonResponse(data)
@@ -24,7 +24,8 @@ def get_user_from_session_key(session_key: str):
         user_id = data.get('_auth_user_id')
         if not user_id:
             return None
-        return User.objects.get(id=user_id)
+        # Deactivated accounts (e.g. pending erasure) can no longer authenticate
+        return User.objects.get(id=user_id, is_active=True)
     except (Session.DoesNotExist, User.DoesNotExist):
         return None
 
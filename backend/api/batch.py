@@ -0,0 +1,189 @@
+# backend/api/batch.py
+"""
+POST /api/batch/ — several API calls in one round-trip (app launch fires
+auth/me, feed, stories, pending requests and the profile at once).
+
+    {"atomic": false,
+     "requests": [{"id": "me", "method": "GET", "path": "/api/auth/me/"},
+                  {"id": "feed", "method": "GET", "path": "/api/posts/feed/?page=1"},
+                  {"method": "POST", "path": "/api/likes/toggle/", "body": {"post_id": "..."}}]}
+
+    -> {"committed": true,
+        "responses": [{"id": "me", "status": 200, "body": {...}}, ...]}
+
+Sub-requests are dispatched straight to the resolved views, skipping
+middleware; each one authenticates with the forwarded X-Session-ID like a
+direct call, and async views (/api/async/...) run via async_to_sync. Runs of consecutive GETs execute concurrently on BATCH_WORKERS
+threads; writes run one at a time in order. With "atomic": true everything
+runs in order inside one transaction (REPEATABLE READ on PostgreSQL, so all
+reads see one snapshot) and any failing item rolls the whole batch back.
+
+Sub-requests still pay their own throttle cost and are load-shed like
+direct calls; every item gets its own status code.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connection, connections, transaction
+from django.urls import Resolver404, resolve
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .auth import SessionIDAuthentication
+from .middleware import db_latency, shed_response
+from .utils.lazy import lazy
+
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE")
+# Forwarded to every sub-request (auth header, host, client address, ...)
+FORWARDED_META = (
+    "HTTP_X_SESSION_ID", "HTTP_HOST", "HTTP_USER_AGENT", "HTTP_X_FORWARDED_FOR",
+    "HTTP_X_FORWARDED_PROTO", "REMOTE_ADDR", "SERVER_NAME", "SERVER_PORT", "wsgi.url_scheme",
+)
+
+
+@lazy
+def _executor():
+    return ThreadPoolExecutor(settings.BATCH_WORKERS, thread_name_prefix="batch")
+
+
+def _parse(items):
+    """Validate the sub-requests; returns (specs, error message)."""
+    if not isinstance(items, list) or not items:
+        return None, "requests must be a non-empty list."
+    if len(items) > settings.BATCH_MAX_REQUESTS:
+        return None, f"At most {settings.BATCH_MAX_REQUESTS} requests per batch."
+    specs = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            return None, f"requests[{i}] must be an object."
+        method = str(item.get("method", "GET")).upper()
+        path = item.get("path") or ""
+        if method not in METHODS:
+            return None, f"requests[{i}]: unsupported method {method}."
+        if not path.startswith("/api/") or urlsplit(path).path.rstrip("/") == "/api/batch":
+            return None, f"requests[{i}]: path must be an /api/ endpoint other than /api/batch/."
+        specs.append({"id": item.get("id", i), "method": method, "path": path, "body": item.get("body")})
+    return specs, None
+
+
+def _sub_request(parent, spec):
+    url = urlsplit(spec["path"])
+    body = json.dumps(spec["body"]).encode() if spec["body"] is not None else b""
+    environ = {key: parent.META[key] for key in FORWARDED_META if key in parent.META}
+    environ.update({
+        "REQUEST_METHOD": spec["method"],
+        "PATH_INFO": url.path,
+        "QUERY_STRING": url.query,
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": BytesIO(body),
+    })
+    environ.setdefault("SERVER_NAME", "localhost")
+    environ.setdefault("SERVER_PORT", "80")
+    return WSGIRequest(environ)
+
+
+def _dispatch(parent, spec):
+    request = _sub_request(parent, spec)
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return {"id": spec["id"], "status": 404, "body": {"detail": "Not found."}}
+
+    view = match.func
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+    try:
+        response = shed_response(request, match.func)
+        if response is None:
+            response = view(request, *match.args, **match.kwargs)
+            if hasattr(response, "render"):
+                response.render()
+        status = response.status_code
+    except Exception as e:
+        print(f"[BATCH ERROR] {spec['method']} {spec['path']}: {e}")
+        return {"id": spec["id"], "status": 500, "body": {"detail": "Internal error."}}
+
+    result = {"id": spec["id"], "status": status}
+    content = getattr(response, "content", b"")
+    if content:
+        try:
+            result["body"] = json.loads(content)
+        except ValueError:
+            result["body"] = content.decode(errors="replace")
+    if response.has_header("Retry-After"):
+        result["retry_after"] = response["Retry-After"]
+    return result
+
+
+def _dispatch_in_worker(parent, spec):
+    # Worker threads keep their own connections: recycle them like a request
+    # thread would, and time their queries for load shedding too
+    close_old_connections()
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(db_latency))
+        return _dispatch(parent, spec)
+
+
+def run_concurrently(parent, specs):
+    """Consecutive GETs in parallel, anything else one by one, in order."""
+    results, reads = [], []
+
+    def flush():
+        if len(reads) == 1:
+            results.append(_dispatch(parent, reads[0]))
+        elif reads:
+            results.extend(_executor().map(lambda spec: _dispatch_in_worker(parent, spec), reads))
+        reads.clear()
+
+    for spec in specs:
+        if spec["method"] == "GET":
+            reads.append(spec)
+        else:
+            flush()
+            results.append(_dispatch(parent, spec))
+    flush()
+    return results
+
+
+def run_atomically(parent, specs):
+    """(results, committed): all in one transaction, rolled back if any item fails."""
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        results = [_dispatch(parent, spec) for spec in specs]
+        failed = any(r["status"] >= 400 for r in results)
+        if failed:
+            transaction.set_rollback(True)
+    return results, not failed
+
+
+class BatchView(APIView):
+    authentication_classes = [SessionIDAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser]
+    # The sub-requests are throttled individually
+    throttle_cost = 1
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        specs, error = _parse(data.get("requests"))
+        if error:
+            return Response({"error": error}, status=400)
+
+        if data.get("atomic") is True:
+            results, committed = run_atomically(request._request, specs)
+        else:
+            results, committed = run_concurrently(request._request, specs), True
+        return Response({"committed": committed, "responses": results})
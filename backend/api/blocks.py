@@ -0,0 +1,117 @@
+# backend/api/blocks.py
+"""
+Blocks and mutes.
+
+- A block hides both users from each other: posts, stories, comments,
+  search results and profiles. Creating one also removes their follows and
+  pending follow requests (one transaction), and a blocked user can't
+  follow, request or message the blocker again.
+- A mute only takes the muted user out of the muter's feed and story tray.
+
+Each user's lists are cached (one cache get per request) and applied in
+the list query itself as `NOT (user_id IN (...))`, so pagination stays
+exact and no query is added. Most users block nobody, which makes the
+filter a no-op.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from . import counters
+from .models import Block, Follower, FriendRequest, Mute
+
+CACHE_TTL = 60 * 60
+
+
+def _cache_key(user_id):
+    return f"blocks:{user_id}"
+
+
+def _lists(user_id):
+    if user_id is None:  # anonymous
+        return {"hidden": [], "muted": []}
+    lists = cache.get(_cache_key(user_id))
+    if lists is None:
+        pairs = Block.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id)) \
+            .values_list("blocker_id", "blocked_id")
+        lists = {
+            "hidden": sorted({b if a == user_id else a for a, b in pairs}),
+            "muted": sorted(Mute.objects.filter(muter_id=user_id).values_list("muted_id", flat=True)),
+        }
+        cache.set(_cache_key(user_id), lists, CACHE_TTL)
+    return lists
+
+
+def _invalidate(*user_ids):
+    from .ranking import _latest_key
+
+    # After commit, so a concurrent read can't cache the old lists again.
+    # The ranked feed's next first page is re-ranked without them.
+    keys = [_cache_key(uid) for uid in user_ids] + [_latest_key(uid) for uid in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def hidden_ids(user_id):
+    """Users blocked by, or blocking, user_id."""
+    return _lists(user_id)["hidden"]
+
+
+def feed_excluded_ids(user_id):
+    lists = _lists(user_id)
+    return lists["hidden"] + lists["muted"]
+
+
+def is_blocked(user_id, other_id):
+    """Either of the two blocked the other."""
+    return int(other_id) in hidden_ids(user_id)
+
+
+def exclude_users(queryset, user_ids, field="user"):
+    """Anti-join `queryset` against user_ids on `field`, in the same statement."""
+    if not user_ids:
+        return queryset
+    return queryset.exclude(**{f"{field}__in": user_ids})
+
+
+# -------------------------------------------------------------------
+# Write path
+# -------------------------------------------------------------------
+def block(blocker_id, blocked_id):
+    with transaction.atomic():
+        _, created = Block.objects.get_or_create(blocker_id=blocker_id, blocked_id=blocked_id)
+        follows = Follower.objects.filter(
+            Q(follower_id=blocker_id, followed_id=blocked_id)
+            | Q(follower_id=blocked_id, followed_id=blocker_id)
+        )
+        severed = list(follows.values_list("follower_id", "followed_id"))
+        follows.delete()
+        for follower_id, followed_id in severed:
+            counters.follow_removed(follower_id, followed_id)
+        FriendRequest.objects.filter(
+            Q(sender_id=blocker_id, receiver_id=blocked_id)
+            | Q(sender_id=blocked_id, receiver_id=blocker_id),
+            status="pending",
+        ).delete()
+        _invalidate(blocker_id, blocked_id)
+        counters.bump_profile_version(blocker_id, blocked_id)
+    return created
+
+
+def unblock(blocker_id, blocked_id):
+    deleted, _ = Block.objects.filter(blocker_id=blocker_id, blocked_id=blocked_id).delete()
+    if deleted:
+        _invalidate(blocker_id, blocked_id)
+        counters.bump_profile_version(blocker_id, blocked_id)
+    return bool(deleted)
+
+
+def mute(muter_id, muted_id):
+    _, created = Mute.objects.get_or_create(muter_id=muter_id, muted_id=muted_id)
+    _invalidate(muter_id)
+    return created
+
+
+def unmute(muter_id, muted_id):
+    deleted, _ = Mute.objects.filter(muter_id=muter_id, muted_id=muted_id).delete()
+    _invalidate(muter_id)
+    return bool(deleted)
@@ -0,0 +1,129 @@
+# backend/api/counters.py
+"""
+Denormalized counters (UserProfile.posts/followers/following_count,
+Post.likes/comments_count).
+
+Write paths adjust them with single F() UPDATEs; bulk jobs adjust them in
+aggregate (one UPDATE per distinct delta) or recompute them from the source
+tables when exact deltas are unknown.
+
+Every profile change also bumps the profile's cache version, which keys the
+cached profile screen (ProfileViewSet.screen).
+"""
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .jobs import job
+from .models import UserProfile, Follower, Post, Like, Comment
+
+
+def _apply(model, lookup_field, deltas: dict, field: str):
+    """Apply {pk: delta} to `field`, one UPDATE per distinct delta value."""
+    by_delta = {}
+    for key, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(key)
+    for delta, keys in by_delta.items():
+        model._base_manager.filter(**{f"{lookup_field}__in": keys}).update(**{field: F(field) + delta})
+
+
+# -------------------------------------------------------------------
+# Profile versions
+# -------------------------------------------------------------------
+def _version_key(user_id):
+    return f"profile:version:{user_id}"
+
+
+def profile_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_profile_version(*user_ids):
+    # A fresh timestamp rather than +1: an evicted key can never reuse an old version
+    cache.set_many({_version_key(uid): time.time_ns() for uid in user_ids}, None)
+
+
+# -------------------------------------------------------------------
+# Profiles
+# -------------------------------------------------------------------
+def follow_added(follower_id, followed_id, delta=1):
+    UserProfile.objects.filter(user_id=follower_id).update(following_count=F("following_count") + delta)
+    UserProfile.objects.filter(user_id=followed_id).update(followers_count=F("followers_count") + delta)
+    bump_profile_version(follower_id, followed_id)
+
+
+def follow_removed(follower_id, followed_id):
+    follow_added(follower_id, followed_id, delta=-1)
+
+
+def adjust_profiles(field: str, deltas: dict):
+    """Bulk {user_id: delta} adjustment of one profile counter."""
+    _apply(UserProfile, "user_id", deltas, field)
+    bump_profile_version(*deltas)
+
+
+def post_added(user_id, delta=1):
+    UserProfile.objects.filter(user_id=user_id).update(posts_count=F("posts_count") + delta)
+    bump_profile_version(user_id)
+
+
+@job("counters")
+def recompute_profiles(user_ids=None):
+    """Recount profile counters from the source tables (all profiles if user_ids is None)."""
+    def count_of(queryset, field):
+        return Coalesce(Subquery(
+            queryset.filter(**{field: OuterRef("user_id")})
+            .order_by().values(field).annotate(n=Count("pk")).values("n")
+        ), Value(0))
+
+    profiles = UserProfile.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        profiles = profiles.filter(user_id__in=user_ids)
+    profiles.update(
+        posts_count=count_of(Post.objects.all(), "user"),
+        followers_count=count_of(Follower.objects.all(), "followed"),
+        following_count=count_of(Follower.objects.all(), "follower"),
+    )
+    if user_ids is not None:
+        bump_profile_version(*user_ids)
+
+
+# -------------------------------------------------------------------
+# Posts
+# -------------------------------------------------------------------
+def like_added(post_id, delta=1):
+    Post.all_objects.filter(id=post_id).update(likes_count=F("likes_count") + delta)
+
+
+def comments_added(post_id, delta=1):
+    Post.all_objects.filter(id=post_id).update(comments_count=F("comments_count") + delta)
+
+
+def adjust_posts(field: str, post_ids):
+    """Decrement `field` once per occurrence of a post id in post_ids."""
+    _apply(Post, "id", {pk: -n for pk, n in Counter(post_ids).items()}, field)
+
+
+@job("counters")
+def recompute_posts(post_ids=None):
+    """Recount post counters from the source tables (all posts if post_ids is None)."""
+    def count_of(model):
+        return Coalesce(Subquery(
+            model.objects.filter(post=OuterRef("pk"))
+            .order_by().values("post").annotate(n=Count("pk")).values("n")
+        ), Value(0))
+
+    posts = Post.all_objects.all()
+    if post_ids is not None:
+        posts = posts.filter(id__in=list(post_ids))
+    posts.update(likes_count=count_of(Like), comments_count=count_of(Comment))
@@ -0,0 +1,103 @@
+# backend/api/db_routing.py
+"""
+Read-replica routing.
+
+Replicas are configured with REPLICA_DATABASE_URLS (comma separated) and
+become the aliases replica_0, replica_1, ... in settings.DATABASES. Locally,
+two SQLite files are enough to try it out:
+
+    DATABASE_URL=sqlite:///db.sqlite3
+    REPLICA_DATABASE_URLS=sqlite:///db.sqlite3
+
+Reads go to a replica only while ReplicaRoutingMiddleware has marked the
+current request as replica-safe: a GET/HEAD/OPTIONS from a client that has
+not written recently. Everything else (writes, requests from a client
+pinned after a write, background jobs, management commands) uses the
+primary. Unhealthy replicas are skipped for a short cool-down.
+"""
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+PRIMARY = "default"
+PRIMARY_ONLY_MODELS = {"sessions.Session"}
+
+# False by default: only the middleware opts a request into replica reads
+_replica_reads = ContextVar("replica_reads", default=False)
+
+_health = {}  # alias -> (healthy, checked_at)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith("replica_")]
+
+
+def replica_is_healthy(alias) -> bool:
+    healthy, checked_at = _health.get(alias, (True, 0))
+    if time.monotonic() - checked_at < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        return healthy
+    try:
+        connections[alias].ensure_connection()
+        healthy = True
+    except Exception as e:
+        print(f"[REPLICA DOWN] {alias}: {e}")
+        healthy = False
+    _health[alias] = (healthy, time.monotonic())
+    return healthy
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Session lookups authenticate every request; never risk replica lag there
+        if not _replica_reads.get() or model._meta.label in PRIMARY_ONLY_MODELS:
+            return PRIMARY
+        healthy = [alias for alias in replica_aliases() if replica_is_healthy(alias)]
+        return random.choice(healthy) if healthy else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return not db.startswith("replica_")
+
+
+# -------------------------------------------------------------------
+# Read-your-writes stickiness
+# -------------------------------------------------------------------
+PIN_COOKIE = "db_pin"
+
+
+def _pin_key(session_key):
+    return "db-pin:" + hashlib.sha256(session_key.encode()).hexdigest()
+
+
+def pin_to_primary(session_key):
+    if session_key:
+        cache.set(_pin_key(session_key), 1, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(session_key):
+    return bool(session_key) and cache.get(_pin_key(session_key)) is not None
+
+
+class use_replicas:
+    """Allow (or forbid) replica reads inside a block: `with use_replicas(): ...`."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+    def __enter__(self):
+        self._token = _replica_reads.set(self.enabled)
+        return self
+
+    def __exit__(self, *exc):
+        _replica_reads.reset(self._token)
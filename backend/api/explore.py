@@ -0,0 +1,79 @@
+# backend/api/explore.py
+"""
+Explore (GET /posts/explore/).
+
+refresh_explore() runs every EXPLORE_REFRESH seconds. It counts likes and
+comments per post in the time bands of WINDOWS, one conditional-aggregate
+query per table over the last WINDOWS[-1] hours (indexed on created_at).
+Each band is weighted by 0.5 ** (band midpoint / HALF_LIFE_HOURS), so recent
+activity dominates while older engagement fades out instead of dropping off
+a cliff. Posts by private accounts and deleted posts never enter the table.
+
+The top EXPLORE_SIZE posts replace ExploreRanking in one transaction; the
+endpoint just pages through it by rank.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .jobs import periodic
+from .models import Comment, ExploreRanking, Like
+
+WINDOWS = [(0, 1), (1, 6), (6, 24), (24, 72), (72, 168)]  # bands in hours ago
+HALF_LIFE_HOURS = 24.0
+COMMENT_WEIGHT = 2.0
+EXPLORE_SIZE = 500
+EXPLORE_REFRESH = 15 * 60
+
+
+def band_weights():
+    return [0.5 ** (((start + end) / 2) / HALF_LIFE_HOURS) for start, end in WINDOWS]
+
+
+def windowed_counts(model, now):
+    """{post_id: [count per band]} for public, live posts."""
+    bands = {
+        f"b{i}": Count("id", filter=Q(
+            created_at__gte=now - timedelta(hours=end),
+            created_at__lt=now - timedelta(hours=start),
+        ))
+        for i, (start, end) in enumerate(WINDOWS)
+    }
+    rows = (
+        model.objects.filter(
+            created_at__gte=now - timedelta(hours=WINDOWS[-1][1]),
+            post__deleted_at__isnull=True,
+            post__user__profile__is_private=False,
+        )
+        .values("post_id")
+        .annotate(**bands)
+    )
+    return {r["post_id"]: [r[f"b{i}"] for i in range(len(WINDOWS))] for r in rows}
+
+
+def compute_scores(now=None):
+    """[(post_id, score)] best first, at most EXPLORE_SIZE long."""
+    now = now or timezone.now()
+    weights = band_weights()
+    scores = {}
+    for model, factor in ((Like, 1.0), (Comment, COMMENT_WEIGHT)):
+        for post_id, counts in windowed_counts(model, now).items():
+            scores[post_id] = scores.get(post_id, 0.0) + factor * sum(
+                w * n for w, n in zip(weights, counts)
+            )
+    return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:EXPLORE_SIZE]
+
+
+@periodic(every=EXPLORE_REFRESH, queue_name="counters")
+def refresh_explore():
+    now = timezone.now()
+    ranked = compute_scores(now)
+    with transaction.atomic():
+        ExploreRanking.objects.all().delete()
+        ExploreRanking.objects.bulk_create([
+            ExploreRanking(post_id=post_id, rank=i, score=score, computed_at=now)
+            for i, (post_id, score) in enumerate(ranked, start=1)
+        ])
+    print(f"[EXPLORE] ranked {len(ranked)} posts")
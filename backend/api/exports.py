@@ -0,0 +1,203 @@
+# backend/api/exports.py
+"""
+"Download your data" (POST /exports/, then GET /exports/<id>/download/).
+
+build_export() writes one ZIP to a temp file on disk:
+
+    profile.json
+    posts.ndjson, comments.ndjson, likes.ndjson, stories.ndjson,
+    messages.ndjson, followers.ndjson, following.ndjson
+    media/<storage key>          originals of posts, stories, messages, avatar
+
+Each table is read with .iterator(chunk_size=EXPORT_CHUNK_SIZE) (a
+server-side cursor on PostgreSQL) and written row by row into its ZIP
+member, and media is fetched EXPORT_MEDIA_WORKERS at a time and written as
+it arrives, so memory stays flat however large the account is. The ZIP is
+then uploaded to storage under exports/<user_id>/ and kept for
+EXPORT_RETENTION_DAYS.
+
+Download links are signed (EXPORT_LINK_TTL) so they work without the
+session header, e.g. from a browser or download manager, and resume with
+HTTP Range requests.
+"""
+import json
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from . import archive
+from .jobs import enqueue, job, periodic
+from .models import Comment, DataExport, Follower, Like, Message, Post, Story, UserProfile
+from .utils.storage import get_storage
+
+LINK_SALT = "api.exports.download"
+
+# (member name, queryset factory, exported fields)
+TABLES = [
+    ("posts.ndjson", lambda user: Post.objects.filter(user=user).order_by("created_at"),
+     ("id", "caption", "media", "likes_count", "comments_count", "created_at")),
+    ("comments.ndjson", lambda user: Comment.objects.filter(user=user).order_by("created_at"),
+     ("id", "post_id", "parent_id", "text", "created_at")),
+    ("likes.ndjson", lambda user: Like.objects.filter(user=user).order_by("created_at"),
+     ("post_id", "created_at")),
+    ("stories.ndjson", lambda user: Story.objects.filter(user=user).order_by("created_at"),
+     ("id", "media", "media_type", "created_at", "expires_at")),
+    ("messages.ndjson", lambda user: Message.objects.filter(Q(sender=user) | Q(receiver=user)).order_by("created_at"),
+     ("id", "sender__username", "receiver__username", "text", "media_path", "is_read", "created_at")),
+    ("followers.ndjson", lambda user: Follower.objects.filter(followed=user).order_by("created_at"),
+     ("follower__username", "created_at")),
+    ("following.ndjson", lambda user: Follower.objects.filter(follower=user).order_by("created_at"),
+     ("followed__username", "created_at")),
+]
+
+# Rows moved out of the database, written ahead of the member's table rows
+ARCHIVED = {
+    "messages.ndjson": lambda user: archive.export_rows(user),
+}
+
+
+def _dumps(row):
+    return (json.dumps(row, default=str, ensure_ascii=False) + "\n").encode()
+
+
+def _media_keys(user):
+    """Storage keys of the user's original media, streamed from the DB."""
+    chunk = settings.EXPORT_CHUNK_SIZE
+    profile_pic = UserProfile.objects.filter(user=user).values_list("profile_pic_path", flat=True).first()
+    if profile_pic:
+        yield profile_pic
+    for media in Post.objects.filter(user=user).values_list("media", flat=True).iterator(chunk_size=chunk):
+        for item in media or []:
+            if item.get("path"):
+                yield item["path"]
+    for item in Story.objects.filter(user=user).values_list("media", flat=True).iterator(chunk_size=chunk):
+        if item and item.get("path"):
+            yield item["path"]
+    yield from (
+        Message.objects.filter(sender=user).exclude(media_path__isnull=True).exclude(media_path="")
+        .values_list("media_path", flat=True).iterator(chunk_size=chunk)
+    )
+    for row in archive.export_rows(user):
+        if row["sender__username"] == user.username and row["media_path"]:
+            yield row["media_path"]
+
+
+def _unique_keys(user):
+    seen = set()  # deduplicated uploads share one key
+    for key in _media_keys(user):
+        # Legacy rows may hold external URLs; those aren't ours to copy
+        if key not in seen and not key.startswith(("http://", "https://")):
+            seen.add(key)
+            yield key
+
+
+def write_media(zf, user):
+    storage = get_storage()
+    keys = _unique_keys(user)
+    workers = settings.EXPORT_MEDIA_WORKERS
+    with ThreadPoolExecutor(workers, thread_name_prefix="export-media") as pool:
+        # At most 2 * workers objects in memory at a time
+        while batch := list(islice(keys, workers * 2)):
+            for key, data in zip(batch, pool.map(storage.get, batch)):
+                if data is None:
+                    print(f"[EXPORT] missing media {key}")
+                    continue
+                # Photos and videos are already compressed
+                zf.writestr(f"media/{key}", data, compress_type=zipfile.ZIP_STORED)
+
+
+def write_zip(fileobj, user):
+    chunk = settings.EXPORT_CHUNK_SIZE
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        profile = UserProfile.objects.filter(user=user).values(
+            "full_name", "bio", "is_private", "profile_pic_path",
+            "posts_count", "followers_count", "following_count",
+        ).first() or {}
+        profile.update(username=user.username, email=user.email, date_joined=user.date_joined)
+        zf.writestr("profile.json", json.dumps(profile, default=str, ensure_ascii=False, indent=2))
+
+        for name, queryset, fields in TABLES:
+            with zf.open(name, "w", force_zip64=True) as member:
+                for row in ARCHIVED.get(name, lambda user: ())(user):
+                    member.write(_dumps(row))
+                for row in queryset(user).values(*fields).iterator(chunk_size=chunk):
+                    member.write(_dumps(row))
+
+        write_media(zf, user)
+
+
+@job("cleanup")
+def build_export(export_id):
+    export = DataExport.objects.select_related("user").filter(id=export_id, status="pending").first()
+    if not export:
+        return
+    export.status = "running"
+    export.save(update_fields=["status"])
+
+    path = f"exports/{export.user_id}/{export.id}.zip"
+    try:
+        with tempfile.NamedTemporaryFile(suffix=".zip") as tmp:
+            write_zip(tmp, export.user)
+            tmp.flush()
+            size = os.path.getsize(tmp.name)
+            zip_file = File(tmp, name=os.path.basename(path))
+            zip_file.content_type = "application/zip"
+            if not get_storage().put(path, zip_file, upsert=True):
+                raise RuntimeError("upload failed")
+    except Exception as e:
+        print(f"[EXPORT FAILED] {export.id}: {e}")
+        export.status, export.error = "failed", str(e)
+        export.save(update_fields=["status", "error"])
+        return
+
+    now = timezone.now()
+    export.status, export.path, export.size = "ready", path, size
+    export.finished_at = now
+    export.expires_at = now + timedelta(days=settings.EXPORT_RETENTION_DAYS)
+    export.save(update_fields=["status", "path", "size", "finished_at", "expires_at"])
+    print(f"[EXPORT] {export.id} ready ({size} bytes)")
+
+
+def request_export(user):
+    """The user's export in progress, or a newly queued one."""
+    export = DataExport.objects.filter(user=user, status__in=["pending", "running"]).first()
+    if export:
+        return export, False
+    export = DataExport.objects.create(user=user)
+    enqueue(build_export, str(export.id), dedup_key=f"export:{export.id}")
+    return export, True
+
+
+# -------------------------------------------------------------------
+# Download links
+# -------------------------------------------------------------------
+def download_token(export):
+    return signing.dumps({"e": str(export.id)}, salt=LINK_SALT)
+
+
+def export_for_token(token):
+    """The ready export a token points at, or None if invalid / expired."""
+    try:
+        export_id = signing.loads(token, salt=LINK_SALT, max_age=settings.EXPORT_LINK_TTL)["e"]
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+    return DataExport.objects.filter(id=export_id, status="ready", expires_at__gt=timezone.now()).first()
+
+
+@periodic(every=6 * 60 * 60)
+def cleanup_expired_exports():
+    expired = DataExport.objects.filter(expires_at__lt=timezone.now())
+    paths = [p for p in expired.values_list("path", flat=True) if p]
+    if paths:
+        get_storage().delete(paths)
+    deleted, _ = expired.delete()
+    print(f"[EXPORT] removed {deleted} expired exports")
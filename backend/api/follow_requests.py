@@ -0,0 +1,100 @@
+# backend/api/follow_requests.py
+"""
+Bulk accept / reject of pending follow requests
+(POST /friend-requests/accept_bulk/ and /reject_bulk/).
+
+Rejecting locks the receiver's pending requests and flips them in one
+UPDATE. Accepting works through them BATCH_SIZE at a time, each batch in
+one transaction:
+
+- the batch's rows that are still pending are locked (select_for_update),
+  so requests answered concurrently are skipped, and one UPDATE flips the
+  locked rows to "accepted";
+- the mutual Follower rows (sender -> receiver and receiver -> sender) are
+  inserted with one bulk_create(ignore_conflicts=True);
+- profile counters move by the number of rows actually inserted, with one
+  UPDATE per counter and distinct delta (counters.adjust_profiles).
+
+Large "accept all" runs go to the fanout queue instead of the request.
+"""
+from django.db import transaction
+
+from . import counters
+from .jobs import job
+from .models import Follower, FriendRequest
+
+BATCH_SIZE = 1000
+
+
+def pending_for(receiver_id, ids=None):
+    requests = FriendRequest.objects.filter(receiver_id=receiver_id, status="pending")
+    if ids is not None:
+        requests = requests.filter(id__in=ids)
+    return requests
+
+
+def _lock_pending(requests):
+    """[(id, sender id)] of the still pending requests, locked until the transaction ends."""
+    return list(requests.filter(status="pending").select_for_update().values_list("id", "sender_id"))
+
+
+def reject_requests(receiver_id, ids=None):
+    with transaction.atomic():
+        rows = _lock_pending(pending_for(receiver_id, ids))
+        rejected = FriendRequest.objects.filter(
+            id__in=[request_id for request_id, _ in rows]
+        ).update(status="rejected")
+    if rejected:
+        counters.bump_profile_version(receiver_id, *{sender_id for _, sender_id in rows})
+    return rejected
+
+
+def _accept_batch(receiver_id, rows):
+    """rows: [(request id, sender id)] that were pending. Returns the number accepted."""
+    with transaction.atomic():
+        # Requests rejected or accepted since `rows` was read get no follows
+        rows = _lock_pending(FriendRequest.objects.filter(id__in=[request_id for request_id, _ in rows]))
+        sender_ids = {sender_id for _, sender_id in rows}
+        accepted = FriendRequest.objects.filter(
+            id__in=[request_id for request_id, _ in rows]
+        ).update(status="accepted")
+
+        # Pairs that already exist aren't counted again
+        existing = set(
+            Follower.objects.filter(follower_id=receiver_id, followed_id__in=sender_ids)
+            .values_list("follower_id", "followed_id")
+        ) | set(
+            Follower.objects.filter(follower_id__in=sender_ids, followed_id=receiver_id)
+            .values_list("follower_id", "followed_id")
+        )
+        pairs = [(s, receiver_id) for s in sender_ids] + [(receiver_id, s) for s in sender_ids]
+        new_pairs = [p for p in pairs if p not in existing]
+        Follower.objects.bulk_create(
+            [Follower(follower_id=a, followed_id=b) for a, b in new_pairs], ignore_conflicts=True
+        )
+
+        following, followers = {}, {}
+        for follower_id, followed_id in new_pairs:
+            following[follower_id] = following.get(follower_id, 0) + 1
+            followers[followed_id] = followers.get(followed_id, 0) + 1
+        counters.adjust_profiles("following_count", following)
+        counters.adjust_profiles("followers_count", followers)
+    return accepted
+
+
+@job("fanout")
+def accept_requests(receiver_id, ids=None):
+    """Accept the receiver's pending requests (all of them if ids is None)."""
+    total, last_id = 0, 0
+    while True:
+        # Keyset over the (receiver, status) index; accepted rows drop out
+        rows = list(
+            pending_for(receiver_id, ids).filter(id__gt=last_id)
+            .order_by("id").values_list("id", "sender_id")[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        total += _accept_batch(receiver_id, rows)
+        last_id = rows[-1][0]
+    print(f"[FOLLOW REQUESTS] {receiver_id} accepted {total}")
+    return total
@@ -0,0 +1,312 @@
+# backend/api/jobs.py
+"""
+Background jobs.
+
+Functions become jobs with @job(queue) (or @periodic(every, queue) for
+scheduled ones) and are queued with enqueue(fn, *args). Queues are drained
+in priority order:
+
+    uploads > fanout > counters > cleanup
+
+so a burst of cleanup work never delays media processing.
+
+Backends (JOBS_BACKEND):
+  * inprocess - a thread pool inside the web process; no extra services.
+                wsgi.py / asgi.py start the periodic scheduler.
+  * redis     - one list per queue in Redis (REDIS_URL); run
+                `python manage.py run_jobs` as the worker + scheduler.
+With JOBS_EAGER=True (tests) jobs run inline, at the enqueue() call.
+
+Otherwise jobs are queued when the current transaction commits, so they
+always see the rows the request wrote. A dedup_key drops a job while an
+identical one is still waiting. Every run is timed (see stats()).
+"""
+import heapq
+import importlib
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from .utils.lazy import lazy
+
+# Highest priority first
+QUEUES = ("uploads", "fanout", "counters", "cleanup")
+
+_registry = {}  # job name -> (fn, queue)
+_schedule = {}  # job name -> interval in seconds
+
+
+def job_name(fn):
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
+def job(queue_name="cleanup"):
+    """Register fn as a job on `queue_name`. The function itself is returned unchanged."""
+    if queue_name not in QUEUES:
+        raise ValueError(f"Unknown job queue: {queue_name}")
+
+    def register(fn):
+        _registry[job_name(fn)] = (fn, queue_name)
+        return fn
+    return register
+
+
+def periodic(every, queue_name="cleanup"):
+    """Register fn as a job that the scheduler queues every `every` seconds."""
+    def register(fn):
+        job(queue_name)(fn)
+        _schedule[job_name(fn)] = every
+        return fn
+    return register
+
+
+def _resolve(name):
+    if name not in _registry:
+        # Jobs register on import; a fresh worker may not have imported the module yet
+        importlib.import_module(name.rsplit(".", 1)[0])
+    return _registry[name]
+
+
+# -------------------------------------------------------------------
+# Metrics
+# -------------------------------------------------------------------
+_metrics = defaultdict(lambda: {"runs": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0, "wait_ms": 0.0})
+_metrics_lock = threading.Lock()
+
+
+def _record(name, run_ms, wait_ms, ok):
+    with _metrics_lock:
+        m = _metrics[name]
+        m["runs"] += 1
+        m["failures"] += 0 if ok else 1
+        m["total_ms"] += run_ms
+        m["max_ms"] = max(m["max_ms"], run_ms)
+        m["wait_ms"] += wait_ms
+
+
+def stats():
+    """Per-job {runs, failures, avg_ms, max_ms, avg_wait_ms} for this process."""
+    with _metrics_lock:
+        return {
+            name: {
+                "runs": m["runs"],
+                "failures": m["failures"],
+                "avg_ms": round(m["total_ms"] / m["runs"], 1),
+                "max_ms": round(m["max_ms"], 1),
+                "avg_wait_ms": round(m["wait_ms"] / m["runs"], 1),
+            }
+            for name, m in _metrics.items() if m["runs"]
+        }
+
+
+# -------------------------------------------------------------------
+# Execution
+# -------------------------------------------------------------------
+def _dedup_cache_key(key):
+    return f"jobs:dedup:{key}"
+
+
+def execute(payload, inline=False):
+    """Run one queued job (a dict from _payload) and record its timing."""
+    name = payload["name"]
+    if payload.get("dedup_key"):
+        # From here on an identical job may be queued again
+        cache.delete(_dedup_cache_key(payload["dedup_key"]))
+
+    fn, queue_name = _resolve(name)
+    started = time.time()
+    wait_ms = max(0.0, (started - payload.get("run_at", started)) * 1000)
+    ok = True
+    if not inline:
+        close_old_connections()
+    try:
+        fn(*payload.get("args", ()), **payload.get("kwargs", {}))
+    except Exception as e:
+        ok = False
+        print(f"[JOB ERROR] {name} failed: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        if not inline:
+            # Worker threads hold their own connections; inline runs share the caller's
+            close_old_connections()
+        run_ms = (time.time() - started) * 1000
+        _record(name, run_ms, wait_ms, ok)
+        print(f"[JOB] {queue_name}/{name} {'ok' if ok else 'failed'} in {run_ms:.0f} ms (waited {wait_ms:.0f} ms)")
+
+
+class InProcessBackend:
+    """Priority queue drained by a small thread pool inside this process."""
+
+    def __init__(self, workers):
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()  # FIFO within a priority
+        self._timers = []  # heap of (run_at, seq, payload)
+        self._timers_ready = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"jobs-{i}", daemon=True).start()
+        threading.Thread(target=self._release_delayed, name="jobs-delayed", daemon=True).start()
+
+    def push(self, payload):
+        if payload["run_at"] > time.time():
+            with self._timers_ready:
+                heapq.heappush(self._timers, (payload["run_at"], next(self._seq), payload))
+                self._timers_ready.notify()
+        else:
+            self._queue.put((QUEUES.index(payload["queue"]), next(self._seq), payload))
+
+    def _release_delayed(self):
+        while True:
+            with self._timers_ready:
+                while not self._timers or self._timers[0][0] > time.time():
+                    timeout = self._timers[0][0] - time.time() if self._timers else None
+                    self._timers_ready.wait(timeout)
+                _, _, payload = heapq.heappop(self._timers)
+            self._queue.put((QUEUES.index(payload["queue"]), next(self._seq), payload))
+
+    def _work(self):
+        while True:
+            _, _, payload = self._queue.get()
+            execute(payload)
+
+
+class RedisBackend:
+    """One Redis list per queue; `manage.py run_jobs` pops them in priority order."""
+
+    DELAYED_KEY = "jobs:delayed"
+
+    def __init__(self, url):
+        import redis  # only deployments using this backend need the client
+
+        self.redis = redis.Redis.from_url(url)
+
+    @staticmethod
+    def queue_key(queue_name):
+        return f"jobs:queue:{queue_name}"
+
+    def push(self, payload):
+        data = json.dumps(payload)
+        if payload["run_at"] > time.time():
+            self.redis.zadd(self.DELAYED_KEY, {data: payload["run_at"]})
+        else:
+            self.redis.lpush(self.queue_key(payload["queue"]), data)
+
+    def promote_due(self):
+        """Move delayed jobs whose time has come onto their queues."""
+        for data in self.redis.zrangebyscore(self.DELAYED_KEY, 0, time.time(), start=0, num=100):
+            # Only the worker that removes it re-queues it
+            if self.redis.zrem(self.DELAYED_KEY, data):
+                self.redis.lpush(self.queue_key(json.loads(data)["queue"]), data)
+
+    def pop(self, timeout=1):
+        # BRPOP checks the keys in order, which gives us the queue priorities
+        res = self.redis.brpop([self.queue_key(q) for q in QUEUES], timeout=timeout)
+        return json.loads(res[1]) if res else None
+
+    def work(self, stop):
+        while not stop.is_set():
+            self.promote_due()
+            payload = self.pop()
+            if payload:
+                execute(payload)
+
+
+@lazy
+def backend():
+    if settings.JOBS_BACKEND == "redis":
+        return RedisBackend(settings.REDIS_URL)
+    return InProcessBackend(settings.JOBS_WORKERS)
+
+
+# -------------------------------------------------------------------
+# Queueing
+# -------------------------------------------------------------------
+def _payload(name, queue_name, args, kwargs, delay, dedup_key):
+    return {
+        "name": name,
+        "queue": queue_name,
+        "args": list(args),
+        "kwargs": kwargs,
+        "run_at": time.time() + (delay or 0),
+        "dedup_key": dedup_key,
+    }
+
+
+def enqueue(fn, *args, delay=None, dedup_key=None, **kwargs):
+    """
+    Queue a registered job once the current transaction commits (or run it
+    right away with JOBS_EAGER).
+
+    delay:     seconds to wait before it becomes runnable (retries)
+    dedup_key: skip if a job with the same key is already waiting
+    Arguments must be JSON-serializable (ids, not model instances).
+    """
+    name = job_name(fn)
+    if name not in _registry:
+        raise ValueError(f"{name} is not a registered job; decorate it with @job")
+    # Round-trip through JSON in every mode, so a bad argument fails here
+    # (and in eager tests) rather than only in RedisBackend.push
+    payload = json.loads(json.dumps(_payload(name, _registry[name][1], args, kwargs, delay, dedup_key)))
+
+    def push():
+        if dedup_key and not cache.add(_dedup_cache_key(dedup_key), 1, settings.JOBS_DEDUP_TTL):
+            return
+        if settings.JOBS_EAGER:
+            execute(payload, inline=True)
+        else:
+            backend().push(payload)
+
+    if settings.JOBS_EAGER:
+        push()
+    else:
+        transaction.on_commit(push)
+
+
+# -------------------------------------------------------------------
+# Periodic scheduler
+# -------------------------------------------------------------------
+def _import_job_modules():
+    # Periodic jobs register themselves when their module is imported
+    for module in settings.JOBS_MODULES:
+        importlib.import_module(module)
+
+
+def run_due_periodic(last_run):
+    """Queue every periodic job whose interval elapsed; updates last_run in place."""
+    now = time.time()
+    for name, every in _schedule.items():
+        if now - last_run.get(name, 0) < every:
+            continue
+        last_run[name] = now
+        # With a shared cache only one process per interval queues it
+        if cache.add(f"jobs:periodic:{name}", 1, int(every)):
+            fn, _ = _resolve(name)
+            enqueue(fn, dedup_key=f"periodic:{name}")
+
+
+def _scheduler_loop(stop, tick):
+    _import_job_modules()
+    last_run = {}
+    while not stop.is_set():
+        try:
+            run_due_periodic(last_run)
+        except Exception as e:
+            print(f"[JOB SCHEDULER ERROR] {e}")
+        stop.wait(tick)
+
+
+@lazy
+def start_scheduler():
+    """Start the periodic scheduler thread (once per process)."""
+    stop = threading.Event()
+    threading.Thread(
+        target=_scheduler_loop, args=(stop, settings.JOBS_SCHEDULER_TICK), name="jobs-scheduler", daemon=True,
+    ).start()
+    return stop
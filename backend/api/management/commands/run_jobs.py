@@ -0,0 +1,35 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = "Run background job workers and the periodic scheduler (api/jobs.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.JOBS_WORKERS)
+        parser.add_argument("--no-scheduler", action="store_true", help="Only drain queues; another process schedules.")
+
+    def handle(self, *args, workers, no_scheduler, **options):
+        if not no_scheduler:
+            jobs.start_scheduler()
+
+        stop = threading.Event()
+        backend = jobs.backend()
+        if isinstance(backend, jobs.RedisBackend):
+            for i in range(workers):
+                threading.Thread(target=backend.work, args=(stop,), name=f"jobs-{i}", daemon=True).start()
+        # The in-process backend already runs its own worker threads; this
+        # process then only executes the periodic jobs it schedules itself.
+
+        self.stdout.write(f"Running {settings.JOBS_BACKEND} job workers ({workers}). Ctrl+C to stop.")
+        try:
+            while not stop.wait(60):
+                pass
+        except KeyboardInterrupt:
+            stop.set()
+        for name, job_stats in sorted(jobs.stats().items()):
+            self.stdout.write(f"{name}: {job_stats}")
@@ -0,0 +1,348 @@
+# backend/api/media.py
+"""
+Media processing pipeline.
+
+Every uploaded file is stored as a *media item* (a small dict kept in
+Post.media / Story.media) instead of a bare URL:
+
+    {
+        "path": "posts/3/<uuid>.jpg",      # original object's storage key
+        "sha256": "9f86d08...",              # content hash -> MediaObject
+        "type": "image" | "video",
+        "status": "pending" | "ready" | "failed",
+        "width": 1080, "height": 1350,      # filled in by the worker
+        "blurhash": "LEHV6nWB2yk8pyo0adR*.7kCMdnj",
+        "variants": {
+            "thumbnail": {"path": ..., "width": ..., "height": ...},
+            "feed": {...},
+            "full": {...},
+        },
+    }
+
+The request only uploads the original; resizing, re-encoding and the
+blurhash placeholder are produced by process_post_media / process_story_media
+on the "uploads" job queue. Items hold storage keys only; variant_url asks the
+active storage backend for URLs at read time.
+
+Originals are content-addressed: store_upload hashes the file while
+streaming it and reuses an existing MediaObject (bumping its ref_count)
+instead of uploading the same bytes twice. release_media drops references
+and only removes blobs from storage once nothing points at them.
+"""
+import hashlib
+import io
+import os
+import uuid
+from mimetypes import guess_type
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .jobs import job
+from .utils.storage import get_storage
+
+# Longest edge (px) for each size class, smallest first.
+SIZE_CLASSES = {
+    "thumbnail": 320,
+    "feed": 1080,
+    "full": 2048,
+}
+DEFAULT_SIZE = "feed"
+
+VARIANT_FORMAT = "WEBP"
+VARIANT_EXT = ".webp"
+VARIANT_CONTENT_TYPE = "image/webp"
+VARIANT_QUALITY = 80
+
+BLURHASH_COMPONENTS = (4, 3)
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Processed fields shared by every item pointing at the same MediaObject
+META_KEYS = ("width", "height", "blurhash", "variants")
+
+
+def media_type_for(name: str, content_type: str = None):
+    """Return 'image' / 'video' for an uploaded file, or None if unsupported."""
+    mime_type = content_type or guess_type(name)[0] or ""
+    if mime_type.startswith("image/"):
+        return "image"
+    if mime_type.startswith("video/"):
+        return "video"
+    return None
+
+
+def build_media_item(path: str, media_type: str, sha256: str = None) -> dict:
+    """Media item for a freshly uploaded original, before processing."""
+    return {
+        "path": path,
+        "sha256": sha256,
+        "type": media_type,
+        "status": "pending" if media_type == "image" else "ready",
+        "width": None,
+        "height": None,
+        "blurhash": None,
+        "variants": {},
+    }
+
+
+# -------------------------------------------------------------------
+# Content-addressed storage
+# -------------------------------------------------------------------
+def hash_upload(file_obj):
+    """SHA-256 and size of an uploaded file, read in chunks (never fully buffered)."""
+    digest = hashlib.sha256()
+    size = 0
+    file_obj.seek(0)
+    if hasattr(file_obj, "chunks"):
+        chunks = file_obj.chunks(HASH_CHUNK_SIZE)
+    else:
+        chunks = iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b"")
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest(), size
+
+
+def _item_for_object(obj, media_type: str) -> dict:
+    item = build_media_item(obj.path, media_type, obj.sha256)
+    if obj.meta.get("variants"):
+        item.update({key: obj.meta.get(key) for key in META_KEYS}, status="ready")
+    return item
+
+
+def _reuse(sha256: str, media_type: str):
+    """Media item for content already in storage (one more reference), or None."""
+    from .models import MediaObject
+
+    if not MediaObject.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + 1):
+        return None
+    print(f"[DEDUP HIT] {sha256}")
+    return _item_for_object(MediaObject.objects.get(sha256=sha256), media_type)
+
+
+def _new_path(file_obj, prefix: str) -> str:
+    name = getattr(file_obj, "name", "") or ""
+    return f"{prefix}/{uuid.uuid4()}{os.path.splitext(name)[1].lower()}"
+
+
+def _register(file_obj, sha256: str, size: int, path: str, media_type: str) -> dict:
+    """Record a freshly uploaded blob as a MediaObject and return its item."""
+    from .models import MediaObject
+
+    try:
+        with transaction.atomic():
+            obj = MediaObject.objects.create(
+                sha256=sha256,
+                path=path,
+                size=size,
+                content_type=getattr(file_obj, "content_type", "") or "",
+                ref_count=1,
+            )
+    except IntegrityError:
+        # An identical file was stored concurrently: keep theirs, drop ours
+        get_storage().delete([path])
+        MediaObject.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + 1)
+        obj = MediaObject.objects.get(sha256=sha256)
+    return _item_for_object(obj, media_type)
+
+
+def store_upload(file_obj, prefix: str, media_type: str):
+    """
+    Store an uploaded file under `prefix` and return its media item, or None
+    if the file is empty or the upload failed. Identical content already in
+    storage is reused without uploading again.
+    """
+    sha256, size = hash_upload(file_obj)
+    if not size:
+        print("[ERROR] File is empty!")
+        return None
+    item = _reuse(sha256, media_type)
+    if item:
+        return item
+    path = _new_path(file_obj, prefix)
+    if not get_storage().put(path, file_obj):
+        return None
+    return _register(file_obj, sha256, size, path, media_type)
+
+
+async def astore_upload(file_obj, prefix: str, media_type: str):
+    """store_upload for the ASGI views: the same steps, with the upload itself awaited."""
+    from asgiref.sync import sync_to_async
+
+    sha256, size = await sync_to_async(hash_upload, thread_sensitive=False)(file_obj)
+    if not size:
+        print("[ERROR] File is empty!")
+        return None
+    item = await sync_to_async(_reuse)(sha256, media_type)
+    if item:
+        return item
+    path = _new_path(file_obj, prefix)
+    if not await get_storage().aput(path, file_obj):
+        return None
+    return await sync_to_async(_register)(file_obj, sha256, size, path, media_type)
+
+
+def release_media(items):
+    """
+    Drop one reference per media item. Blobs (original + variants) are
+    removed from storage in a single call once their last reference is
+    gone. Items stored before deduplication are removed directly.
+    """
+    from .models import MediaObject
+
+    paths = []
+    for item in items:
+        if not item or not item.get("path"):
+            continue
+        lookup = {"sha256": item["sha256"]} if item.get("sha256") else {"path": item["path"]}
+        with transaction.atomic():
+            obj = MediaObject.objects.select_for_update().filter(**lookup).first()
+            if obj is None:
+                paths += media_paths(item)
+            elif obj.ref_count > 1:
+                MediaObject.objects.filter(pk=obj.pk).update(ref_count=F("ref_count") - 1)
+            else:
+                paths += media_paths({"path": obj.path, **obj.meta})
+                obj.delete()
+    get_storage().delete(paths)
+
+
+def variant_url(item: dict, size: str = DEFAULT_SIZE):
+    """
+    Best URL of a media item for the requested size class.
+
+    Falls back to the next larger variant and finally to the original, so
+    pending or failed items still render.
+    """
+    if not item:
+        return None
+    variants = item.get("variants") or {}
+    names = list(SIZE_CLASSES)
+    start = names.index(size) if size in SIZE_CLASSES else names.index(DEFAULT_SIZE)
+    for name in names[start:]:
+        if name in variants:
+            return get_storage().url(variants[name]["path"])
+    return get_storage().url(item.get("path"))
+
+
+# -------------------------------------------------------------------
+# Processing ("uploads" jobs, see api/jobs.py)
+# -------------------------------------------------------------------
+def _variant_path(original_path: str, size: str) -> str:
+    stem = os.path.splitext(original_path)[0]
+    return f"{stem}_{size}{VARIANT_EXT}"
+
+
+def _encode_blurhash(image):
+    import blurhash
+
+    small = image.convert("RGB")
+    small.thumbnail((64, 64))
+    return blurhash.encode(small, *BLURHASH_COMPONENTS)
+
+
+def process_media_item(item: dict) -> dict:
+    """
+    Return the item with variants filled in, generating them only once per
+    stored blob. Never raises; failures mark the item 'failed'.
+    """
+    from .models import MediaObject
+
+    if item.get("type") != "image" or item.get("status") == "ready":
+        return item
+
+    obj = MediaObject.objects.filter(sha256=item["sha256"]).first() if item.get("sha256") else None
+    if obj and obj.meta.get("variants"):
+        return {**item, **{key: obj.meta.get(key) for key in META_KEYS}, "status": "ready"}
+
+    processed = generate_variants(item)
+    if obj and processed["status"] == "ready":
+        MediaObject.objects.filter(pk=obj.pk).update(
+            meta={key: processed[key] for key in META_KEYS}
+        )
+    return processed
+
+
+def generate_variants(item: dict) -> dict:
+    """
+    Download the original, write resized WebP variants next to it and
+    return the updated item.
+    """
+    from PIL import Image, ImageOps
+
+    data = get_storage().get(item["path"])
+    if not data:
+        return {**item, "status": "failed"}
+
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            image = ImageOps.exif_transpose(source)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        width, height = image.size
+
+        variants = {}
+        for size, edge in SIZE_CLASSES.items():
+            resized = image.copy()
+            # Never upscale: small originals reuse the largest size that fits
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+
+            buf = io.BytesIO()
+            resized.save(buf, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            upload = ContentFile(buf.getvalue(), name=f"{size}{VARIANT_EXT}")
+            upload.content_type = VARIANT_CONTENT_TYPE
+
+            path = _variant_path(item["path"], size)
+            # Variant paths derive from the shared original, so re-runs overwrite
+            if not get_storage().put(path, upload, upsert=True):
+                return {**item, "status": "failed"}
+            variants[size] = {
+                "path": path,
+                "width": resized.width,
+                "height": resized.height,
+            }
+
+        return {
+            **item,
+            "status": "ready",
+            "width": width,
+            "height": height,
+            "blurhash": _encode_blurhash(image),
+            "variants": variants,
+        }
+    except Exception as e:
+        print(f"[MEDIA PROCESSING FAILED] {item.get('path')}: {e}")
+        return {**item, "status": "failed"}
+
+
+def media_paths(item: dict) -> list:
+    """Every storage key owned by a media item (original + variants)."""
+    if not item:
+        return []
+    paths = [item["path"]] if item.get("path") else []
+    paths += [v["path"] for v in (item.get("variants") or {}).values()]
+    return paths
+
+
+@job("uploads")
+def process_post_media(post_id):
+    from .models import Post
+
+    post = Post.objects.filter(id=post_id).only("id", "media").first()
+    if not post:
+        return
+    post.media = [process_media_item(item) for item in post.media]
+    post.save(update_fields=["media"])
+
+
+@job("uploads")
+def process_story_media(story_id):
+    from .models import Story
+
+    story = Story.objects.filter(id=story_id).only("id", "media").first()
+    if not story:
+        return
+    story.media = process_media_item(story.media)
+    story.save(update_fields=["media"])
@@ -0,0 +1,128 @@
+# backend/api/middleware.py
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from .db_routing import PIN_COOKIE, is_pinned, pin_to_primary, replica_aliases, use_replicas
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from replicas, except for clients that wrote
+    within the last REPLICA_PIN_SECONDS. Those are pinned to the primary
+    (by cookie for browsers, by X-Session-ID for the mobile app) so they
+    always see their own posts and follows.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        session_key = request.headers.get("X-Session-ID")
+        safe = request.method in SAFE_METHODS
+        pinned = PIN_COOKIE in request.COOKIES or is_pinned(session_key)
+
+        with use_replicas(safe and not pinned):
+            response = self.get_response(request)
+
+        if not safe and response.status_code < 400:
+            pin_to_primary(session_key)
+            # login / signup hand out a new session key in this very response
+            new_key = getattr(getattr(request, "session", None), "session_key", None)
+            if new_key != session_key:
+                pin_to_primary(new_key)
+            response.set_cookie(
+                PIN_COOKIE, "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+                secure=not settings.DEBUG,
+            )
+        return response
+
+
+# -------------------------------------------------------------------
+# Load shedding
+# -------------------------------------------------------------------
+class DbLatency:
+    """Exponentially weighted moving average of query time in this process."""
+
+    ALPHA = 0.2
+    STALE_AFTER = 10  # seconds without samples: assume the DB recovered
+
+    def __init__(self):
+        self.ewma_ms = 0.0
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.ewma_ms = ms if not self.updated_at else self.ALPHA * ms + (1 - self.ALPHA) * self.ewma_ms
+            self.updated_at = time.monotonic()
+
+    def current(self):
+        if time.monotonic() - self.updated_at > self.STALE_AFTER:
+            return 0.0
+        return self.ewma_ms
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.observe((time.monotonic() - started) * 1000)
+
+
+db_latency = DbLatency()
+
+
+def is_low_priority(view_func, method):
+    """Views opt in with `low_priority_actions` (viewsets) or `low_priority = True`."""
+    if method not in SAFE_METHODS:
+        return False
+    cls = getattr(view_func, "cls", None)
+    actions = getattr(view_func, "actions", None) or {}
+    if cls is not None and actions.get(method.lower()) in getattr(cls, "low_priority_actions", ()):
+        return True
+    return bool(getattr(cls or view_func, "low_priority", False))
+
+
+class LoadSheddingMiddleware:
+    """
+    Times every query; while the average passes LOAD_SHED_DB_LATENCY_MS,
+    low-priority reads (search, follower lists, ...) get 503 + Retry-After
+    so feed, posting and messaging keep the database to themselves.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(db_latency))
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return shed_response(request, view_func)
+
+
+def shed_response(request, view_func):
+    """503 response if the request should be shed right now, else None."""
+    if settings.LOAD_SHED_DB_LATENCY_MS and db_latency.current() > settings.LOAD_SHED_DB_LATENCY_MS \
+            and is_low_priority(view_func, request.method):
+        print(f"[LOAD SHED] {request.path} (db {db_latency.current():.0f} ms)")
+        response = JsonResponse({"detail": "Server is busy, please retry shortly."}, status=503)
+        response["Retry-After"] = str(settings.LOAD_SHED_RETRY_AFTER)
+        return response
+    return None
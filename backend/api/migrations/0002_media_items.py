@@ -0,0 +1,75 @@
+import os
+from mimetypes import guess_type
+
+from django.db import migrations, models
+
+
+def _item_from_url(url, media_type=None):
+    bucket = os.getenv("SUPABASE_BUCKET", "files")
+    mime_type = guess_type(url)[0] or ""
+    return {
+        "path": url.split(f"/{bucket}/")[-1],
+        "url": url,
+        "type": media_type or ("video" if mime_type.startswith("video/") else "image"),
+        # Existing originals keep rendering as-is; they were never processed.
+        "status": "ready",
+        "width": None,
+        "height": None,
+        "blurhash": None,
+        "variants": {},
+    }
+
+
+def forwards(apps, schema_editor):
+    Post = apps.get_model("api", "Post")
+    Story = apps.get_model("api", "Story")
+
+    for post in Post.objects.only("id", "media_urls").iterator(chunk_size=500):
+        post.media = [_item_from_url(url) for url in post.media_urls or [] if url]
+        post.save(update_fields=["media"])
+
+    for story in Story.objects.only("id", "media_url", "media_type").iterator(chunk_size=500):
+        story.media = _item_from_url(story.media_url, story.media_type) if story.media_url else {}
+        story.save(update_fields=["media"])
+
+
+def backwards(apps, schema_editor):
+    Post = apps.get_model("api", "Post")
+    Story = apps.get_model("api", "Story")
+
+    for post in Post.objects.only("id", "media").iterator(chunk_size=500):
+        post.media_urls = [item["url"] for item in post.media or [] if item.get("url")]
+        post.save(update_fields=["media_urls"])
+
+    for story in Story.objects.only("id", "media").iterator(chunk_size=500):
+        story.media_url = (story.media or {}).get("url") or ""
+        story.save(update_fields=["media_url"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="media",
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name="story",
+            name="media",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.RemoveField(
+            model_name="post",
+            name="media_urls",
+        ),
+        migrations.RemoveField(
+            model_name="story",
+            name="media_url",
+        ),
+    ]
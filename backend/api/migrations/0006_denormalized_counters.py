@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field, outer):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field).annotate(n=Count("pk")).values("n")
+    ), Value(0))
+
+
+def backfill_counters(apps, schema_editor):
+    UserProfile = apps.get_model("api", "UserProfile")
+    Follower = apps.get_model("api", "Follower")
+    Post = apps.get_model("api", "Post")
+    Like = apps.get_model("api", "Like")
+    Comment = apps.get_model("api", "Comment")
+
+    live_posts = Post._base_manager.filter(deleted_at__isnull=True)
+    UserProfile.objects.update(
+        posts_count=Coalesce(Subquery(
+            live_posts.filter(user=OuterRef("user_id"))
+            .order_by().values("user").annotate(n=Count("pk")).values("n")
+        ), Value(0)),
+        followers_count=_count(Follower, "followed", "user_id"),
+        following_count=_count(Follower, "follower", "user_id"),
+    )
+    Post._base_manager.update(
+        likes_count=_count(Like, "post", "pk"),
+        comments_count=_count(Comment, "post", "pk"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_post_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='followers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='posts_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='purgejob',
+            name='kind',
+            field=models.CharField(choices=[('post', 'Post'), ('account', 'Account')], max_length=10),
+        ),
+    ]
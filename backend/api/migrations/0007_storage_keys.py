@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _key_from_url(url):
+    """Storage key of one of our Supabase public URLs; foreign URLs are kept as-is."""
+    marker = f"/{settings.SUPABASE_BUCKET}/"
+    if not url or marker not in url:
+        return url
+    return url.split(marker, 1)[-1]
+
+
+def _strip_urls(item):
+    if not item:
+        return item
+    item.pop("url", None)
+    for variant in (item.get("variants") or {}).values():
+        variant.pop("url", None)
+    return item
+
+
+def forwards(apps, schema_editor):
+    Post = apps.get_model("api", "Post")
+    Story = apps.get_model("api", "Story")
+    Message = apps.get_model("api", "Message")
+    UserProfile = apps.get_model("api", "UserProfile")
+    MediaObject = apps.get_model("api", "MediaObject")
+
+    for post in Post._base_manager.only("id", "media").iterator(chunk_size=500):
+        post.media = [_strip_urls(item) for item in post.media or []]
+        post.save(update_fields=["media"])
+
+    for story in Story.objects.only("id", "media").iterator(chunk_size=500):
+        story.media = _strip_urls(story.media)
+        story.save(update_fields=["media"])
+
+    for obj in MediaObject.objects.only("id", "meta").iterator(chunk_size=500):
+        for variant in (obj.meta.get("variants") or {}).values():
+            variant.pop("url", None)
+        obj.save(update_fields=["meta"])
+
+    for msg in Message.objects.exclude(media_path__isnull=True).exclude(media_path="").only("id", "media_path").iterator(chunk_size=500):
+        msg.media_path = _key_from_url(msg.media_path)
+        msg.save(update_fields=["media_path"])
+
+    for profile in UserProfile.objects.exclude(profile_pic_path__isnull=True).exclude(profile_pic_path="").only("id", "profile_pic_path").iterator(chunk_size=500):
+        profile.profile_pic_path = _key_from_url(profile.profile_pic_path)
+        profile.save(update_fields=["profile_pic_path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_denormalized_counters"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="message",
+            old_name="media_url",
+            new_name="media_path",
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="media_path",
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.RenameField(
+            model_name="userprofile",
+            old_name="profile_pic",
+            new_name="profile_pic_path",
+        ),
+        migrations.AlterField(
+            model_name="userprofile",
+            name="profile_pic_path",
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        # Media items keep keys only; URLs come from the storage backend
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# The SQL is frozen here as it was when this migration was written;
+# api/search.py has the live copy its post_migrate repair hook uses.
+POSTGRES_DDL = [
+    """ALTER TABLE api_post ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(caption, ''))) STORED""",
+    """ALTER TABLE api_comment ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS api_post_search_gin ON api_post USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS api_comment_search_gin ON api_comment USING GIN (search_vector)",
+]
+POSTGRES_DROP = [
+    "ALTER TABLE api_post DROP COLUMN IF EXISTS search_vector",
+    "ALTER TABLE api_comment DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_post_fts USING fts5(caption, content='api_post', content_rowid='rowid')",
+    """CREATE TRIGGER IF NOT EXISTS api_post_fts_ai AFTER INSERT ON api_post BEGIN
+        INSERT INTO api_post_fts(rowid, caption) VALUES (new.rowid, new.caption);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_post_fts_ad AFTER DELETE ON api_post BEGIN
+        INSERT INTO api_post_fts(api_post_fts, rowid, caption) VALUES ('delete', old.rowid, old.caption);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_post_fts_au AFTER UPDATE OF caption ON api_post BEGIN
+        INSERT INTO api_post_fts(api_post_fts, rowid, caption) VALUES ('delete', old.rowid, old.caption);
+        INSERT INTO api_post_fts(rowid, caption) VALUES (new.rowid, new.caption);
+    END""",
+    "INSERT INTO api_post_fts(api_post_fts) VALUES ('rebuild')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_comment_fts USING fts5(text, content='api_comment', content_rowid='rowid')",
+    """CREATE TRIGGER IF NOT EXISTS api_comment_fts_ai AFTER INSERT ON api_comment BEGIN
+        INSERT INTO api_comment_fts(rowid, text) VALUES (new.rowid, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_comment_fts_ad AFTER DELETE ON api_comment BEGIN
+        INSERT INTO api_comment_fts(api_comment_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_comment_fts_au AFTER UPDATE OF text ON api_comment BEGIN
+        INSERT INTO api_comment_fts(api_comment_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+        INSERT INTO api_comment_fts(rowid, text) VALUES (new.rowid, new.text);
+    END""",
+    "INSERT INTO api_comment_fts(api_comment_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    "DROP TABLE IF EXISTS api_post_fts",
+    "DROP TABLE IF EXISTS api_comment_fts",
+]
+
+
+def _run(schema_editor, statements):
+    vendor = schema_editor.connection.vendor
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql, params=None)
+
+
+def install_index(apps, schema_editor):
+    _run(schema_editor, {"postgresql": POSTGRES_DDL, "sqlite": SQLITE_DDL})
+
+
+def uninstall_index(apps, schema_editor):
+    _run(schema_editor, {"postgresql": POSTGRES_DROP, "sqlite": SQLITE_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_hashtags_mentions'),
+    ]
+
+    operations = [
+        # tsvector + GIN on PostgreSQL, FTS5 tables + triggers on SQLite
+        migrations.RunPython(install_index, uninstall_index),
+    ]
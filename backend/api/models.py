@@ -14,8 +14,13 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     full_name = models.CharField(max_length=100, blank=True)
     bio = models.TextField(max_length=500, blank=True)
-    profile_pic = models.URLField(blank=True, null=True)
+    # Storage key (api/utils/storage.py); the API exposes it as the `profile_pic` URL
+    profile_pic_path = models.CharField(max_length=500, blank=True, null=True)
     is_private = models.BooleanField(default=False)
+    # Denormalized counters, maintained by api/counters.py
+    posts_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
 
     def __str__(self):
         return self.user.username
@@ -45,12 +50,25 @@ class FriendRequest(models.Model):
         indexes = [models.Index(fields=["receiver", "status"])]
 
 # 3. Posts
+class PostManager(models.Manager):
+    """Hides tombstoned posts (deleted, waiting for the background purge)."""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Post(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     caption = models.TextField(blank=True)
-    media_urls = models.JSONField(default=list)  # list of URLs
+    media = models.JSONField(default=list)  # list of media items (see api/media.py)
     created_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Denormalized counters, maintained by api/counters.py
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+
+    objects = PostManager()
+    all_objects = models.Manager()  # includes tombstoned posts (purge jobs only)
 
     class Meta:
         ordering = ["-created_at"]
@@ -67,7 +85,10 @@ class Like(models.Model):
 
     class Meta:
         unique_together = ("post", "user")
-        indexes = [models.Index(fields=["post"])]
+        indexes = [
+            models.Index(fields=["post"]),
+            models.Index(fields=["created_at"]),  # windowed explore aggregation
+        ]
 
 
 class Comment(models.Model):
@@ -81,7 +102,10 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        indexes = [models.Index(fields=["post", "-created_at"])]
+        indexes = [
+            models.Index(fields=["post", "-created_at"]),
+            models.Index(fields=["created_at"]),  # windowed explore aggregation
+        ]
 
 
 # 5. Direct Messages
@@ -94,7 +118,7 @@ class Message(models.Model):
         User, on_delete=models.CASCADE, related_name="received_messages"
     )
     text = models.TextField(blank=True)
-    media_url = models.URLField(blank=True, null=True)
+    media_path = models.CharField(max_length=500, blank=True, null=True)  # storage key
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -103,6 +127,7 @@ class Message(models.Model):
         indexes = [
             models.Index(fields=["sender", "-created_at"]),
             models.Index(fields=["receiver", "-created_at"]),
+            models.Index(fields=["-created_at"]),  # admin changelist / archival scans
         ]
 
 
@@ -110,7 +135,7 @@ class Message(models.Model):
 class Story(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="stories")
-    media_url = models.URLField()
+    media = models.JSONField(default=dict)  # single media item (see api/media.py)
     media_type = models.CharField(
         max_length=10, choices=[("image", "Image"), ("video", "Video")]
     )
@@ -132,3 +157,194 @@ class StoryView(models.Model):
     class Meta:
         unique_together = ("story", "viewer")
 
+
+
+# 7. Stored media blobs (content-addressed, reference counted)
+class MediaObject(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=512, db_index=True)  # bucket path of the original
+    size = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    # width / height / blurhash / variants, filled in once by the media worker
+    meta = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} refs)"
+
+
+# 8. Resumable (chunked) uploads
+class UploadSession(models.Model):
+    PURPOSE_CHOICES = [
+        ("post", "Post"),
+        ("story", "Story"),
+        ("message", "Message"),
+    ]
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("complete", "Complete"),   # stored, waiting to be attached
+        ("attached", "Attached"),   # used by a Post / Story / Message
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="uploads")
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    length = models.BigIntegerField()            # declared total size in bytes
+    offset = models.BigIntegerField(default=0)   # bytes received so far
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="uploading")
+    media = models.JSONField(default=dict, blank=True)  # media item once complete
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def save(self, *args, **kwargs):
+        if not self.expires_at:
+            self.expires_at = timezone.now() + timedelta(hours=24)
+        super().save(*args, **kwargs)
+
+
+# 9. Background purge jobs (post / account deletion)
+class PurgeJob(models.Model):
+    KIND_CHOICES = [
+        ("post", "Post"),
+        ("account", "Account"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    target_id = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    progress = models.JSONField(default=dict, blank=True)  # rows deleted per table, stage
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "updated_at"])]
+
+
+# 10. Explore ranking (rebuilt periodically by explore.refresh_explore)
+class ExploreRanking(models.Model):
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name="explore_rank")
+    rank = models.PositiveIntegerField(unique=True)  # 1 = top
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["rank"]
+
+    def __str__(self):
+        return f"#{self.rank} post {self.post_id} ({self.score:.2f})"
+
+
+# 11. Hashtags & mentions (inverted indexes filled on write by tags.py)
+class Hashtag(models.Model):
+    name = models.CharField(max_length=100, unique=True)  # lowercase, without '#'
+    post_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # LIKE 'prefix%' autocomplete on PostgreSQL
+            models.Index(fields=["name"], name="api_hashtag_name_like", opclasses=["varchar_pattern_ops"]),
+        ]
+
+    def __str__(self):
+        return f"#{self.name}"
+
+
+class PostHashtag(models.Model):
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name="posts")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="hashtags")
+    created_at = models.DateTimeField()  # the post's, so tag feeds page in post order
+
+    class Meta:
+        unique_together = ("hashtag", "post")
+        indexes = [models.Index(fields=["hashtag", "-created_at", "-id"])]
+
+
+class Mention(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="mentions")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="mentions")
+    comment = models.ForeignKey(Comment, null=True, blank=True, on_delete=models.CASCADE, related_name="mentions")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "-created_at"])]
+
+
+class HashtagTrend(models.Model):
+    """New uses of a hashtag per hour; trending = sum over the last hours."""
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name="trend")
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("hashtag", "hour")
+        indexes = [models.Index(fields=["hour"])]
+
+
+# 12. "Download your data" exports (built by exports.build_export)
+class DataExport(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="exports")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    path = models.CharField(max_length=500, blank=True)  # storage key of the ZIP
+    size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "-created_at"])]
+
+
+# 13. Blocks & mutes (enforced in queries by blocks.py)
+class Block(models.Model):
+    """blocker and blocked no longer see each other's content or profile."""
+    blocker = models.ForeignKey(User, on_delete=models.CASCADE, related_name="blocking")
+    blocked = models.ForeignKey(User, on_delete=models.CASCADE, related_name="blocked_by")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("blocker", "blocked")
+        indexes = [models.Index(fields=["blocked"])]
+
+
+class Mute(models.Model):
+    """muter's feed and story tray skip muted; nothing else changes."""
+    muter = models.ForeignKey(User, on_delete=models.CASCADE, related_name="muting")
+    muted = models.ForeignKey(User, on_delete=models.CASCADE, related_name="muted_by")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("muter", "muted")
+
+
+# 14. Archived direct messages (packed into storage by archive.py)
+class MessageSegment(models.Model):
+    """One compressed blob of a conversation's old messages; user_low has the lower id."""
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    path = models.CharField(max_length=500, unique=True)  # storage key
+    codec = models.CharField(max_length=8)  # "gzip" or "zstd"
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+    message_count = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user_low", "user_high", "-last_at"])]
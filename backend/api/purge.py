@@ -0,0 +1,291 @@
+# backend/api/purge.py
+"""
+Background purges for deleted content.
+
+Deleting a post only tombstones it in the request (Post.deleted_at); a
+PurgeJob then removes its dependents in bounded primary-key batches, each
+batch in its own short transaction, releases its media in one storage call
+and finally drops the row. Jobs record per-table progress so a retried or
+restarted job resumes instead of starting over.
+
+Account erasure works the same way: the account is deactivated at once,
+then ACCOUNT_STAGES purge every related table in batches, adjust the
+counters of the *other* users and posts involved, and bulk-remove the
+user's storage prefixes.
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import archive, counters, jobs, tags
+from .models import (
+    Follower, FriendRequest, Post, Like, Comment, Message,
+    Story, StoryView, MediaObject, UploadSession, PurgeJob,
+)
+from .media import release_media, media_paths
+from .uploads import abort as abort_upload
+from .utils.storage import get_storage
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 30  # seconds, doubled per attempt
+
+
+def batches(queryset, *fields, batch_size=BATCH_SIZE):
+    """
+    Yield pk-ordered batches of (pk, *fields) rows until the queryset is
+    empty. The caller must delete (or otherwise exclude) each batch.
+    """
+    while True:
+        rows = list(queryset.order_by("pk").values_list("pk", *fields)[:batch_size])
+        if not rows:
+            return
+        yield rows
+
+
+def record(job, label, count):
+    job.progress[label] = job.progress.get(label, 0) + count
+    job.save(update_fields=["progress", "updated_at"])
+
+
+def delete_in_batches(queryset, job, label, batch_size=BATCH_SIZE):
+    """
+    Delete queryset rows `batch_size` at a time (one short transaction each),
+    counting progress on the job under `label`.
+    """
+    model = queryset.model
+    for rows in batches(queryset, batch_size=batch_size):
+        with transaction.atomic():
+            model._base_manager.filter(pk__in=[row[0] for row in rows]).delete()
+            record(job, label, len(rows))
+
+
+def purge_post_rows(post_id, job, label="posts"):
+    """Delete one (tombstoned) post: likes and comments in batches, then the row and its media."""
+    tags.unlink_post(post_id)
+    delete_in_batches(Like.objects.filter(post_id=post_id), job, "likes")
+    # Replies before top-level comments, so each batch cascades to nothing
+    delete_in_batches(Comment.objects.filter(post_id=post_id, parent__isnull=False), job, "replies")
+    delete_in_batches(Comment.objects.filter(post_id=post_id), job, "comments")
+
+    with transaction.atomic():
+        post = Post.all_objects.select_for_update().filter(id=post_id).only("id", "media").first()
+        if post is None:
+            return
+        items = post.media or []
+        post.delete()
+        record(job, label, 1)
+        # Row gone first, so a retried job can never release the media twice
+        transaction.on_commit(lambda items=items: release_media(items))
+
+
+def purge_post(job):
+    purge_post_rows(job.target_id, job)
+
+
+# -------------------------------------------------------------------
+# Account erasure
+# -------------------------------------------------------------------
+def _hide_account(user_id, job):
+    """Tombstone posts and expire stories so the content disappears right away."""
+    now = timezone.now()
+    for rows in batches(Post.objects.filter(user_id=user_id)):
+        Post.all_objects.filter(pk__in=[r[0] for r in rows]).update(deleted_at=now)
+    for rows in batches(Story.objects.filter(user_id=user_id, expires_at__gt=now)):
+        Story.objects.filter(pk__in=[r[0] for r in rows]).update(expires_at=now)
+
+
+def _erase_stories(user_id, job):
+    delete_in_batches(StoryView.objects.filter(viewer_id=user_id), job, "story_views")
+    delete_in_batches(StoryView.objects.filter(story__user_id=user_id), job, "story_views")
+    for rows in batches(Story.objects.filter(user_id=user_id), "media"):
+        with transaction.atomic():
+            Story.objects.filter(pk__in=[r[0] for r in rows]).delete()
+            record(job, "stories", len(rows))
+            items = [r[1] for r in rows]
+            transaction.on_commit(lambda items=items: release_media(items))
+
+
+def _erase_likes(user_id, job):
+    for rows in batches(Like.objects.filter(user_id=user_id), "post_id"):
+        with transaction.atomic():
+            Like.objects.filter(pk__in=[r[0] for r in rows]).delete()
+            counters.adjust_posts("likes_count", [r[1] for r in rows])
+            record(job, "likes", len(rows))
+
+
+def _erase_comments(user_id, job):
+    # Other people's replies to these comments cascade, so recount the posts
+    # and release the tags only the deleted comments used
+    for rows in batches(Comment.objects.filter(user_id=user_id), "post_id"):
+        with transaction.atomic():
+            ids = [r[0] for r in rows]
+            used = {}  # post id -> tags of the comments going
+            doomed = Comment.objects.filter(Q(pk__in=ids) | Q(parent_id__in=ids))
+            for post_id, text in doomed.values_list("post_id", "text"):
+                used.setdefault(post_id, set()).update(tags.parse_hashtags(text))
+            Comment.objects.filter(pk__in=ids).delete()
+            counters.recompute_posts(set(used))
+            tagged = Post.all_objects.filter(pk__in=[p for p, names in used.items() if names])
+            for post in tagged.only("id", "caption"):
+                tags.release_hashtags(post, used[post.pk])
+            record(job, "comments", len(rows))
+
+
+def _erase_posts(user_id, job):
+    for rows in batches(Post.all_objects.filter(user_id=user_id)):
+        for (post_id,) in rows:
+            purge_post_rows(post_id, job)
+
+
+def _erase_messages(user_id, job):
+    qs = Message.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id))
+    for rows in batches(qs, "media_path"):
+        with transaction.atomic():
+            Message.objects.filter(pk__in=[r[0] for r in rows]).delete()
+            record(job, "messages", len(rows))
+            items = [{"path": r[1]} for r in rows if r[1]]
+            transaction.on_commit(lambda items=items: release_media(items))
+    # Archived conversations (archive.py) live in storage
+    record(job, "message_segments", archive.drop_segments(archive.segments_of(user_id)))
+
+
+def _erase_relationships(user_id, job):
+    for rows in batches(Follower.objects.filter(follower_id=user_id), "followed_id"):
+        with transaction.atomic():
+            Follower.objects.filter(pk__in=[r[0] for r in rows]).delete()
+            counters.adjust_profiles("followers_count", {r[1]: -1 for r in rows})
+            record(job, "following", len(rows))
+    for rows in batches(Follower.objects.filter(followed_id=user_id), "follower_id"):
+        with transaction.atomic():
+            Follower.objects.filter(pk__in=[r[0] for r in rows]).delete()
+            counters.adjust_profiles("following_count", {r[1]: -1 for r in rows})
+            record(job, "followers", len(rows))
+    delete_in_batches(
+        FriendRequest.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)),
+        job, "friend_requests",
+    )
+
+
+def _erase_storage(user_id, job):
+    """Bulk-remove whatever is left under the user's prefixes, keeping blobs others still reference."""
+    for prefix in STORAGE_PREFIXES:
+        paths = get_storage().list(f"{prefix}/{user_id}")
+        shared = set()
+        for obj in MediaObject.objects.filter(path__startswith=f"{prefix}/{user_id}/", ref_count__gt=0):
+            shared.update(media_paths({"path": obj.path, **obj.meta}))
+        leftover = [p for p in paths if p not in shared]
+        for i in range(0, len(leftover), STORAGE_BATCH_SIZE):
+            get_storage().delete(leftover[i:i + STORAGE_BATCH_SIZE])
+        record(job, "storage_objects", len(leftover))
+
+
+def _erase_user(user_id, job):
+    for session in UploadSession.objects.filter(user_id=user_id).exclude(status="attached"):
+        abort_upload(session)
+    User.objects.filter(id=user_id).delete()
+
+
+# Ordered; each stage is idempotent, finished ones are skipped on retry
+ACCOUNT_STAGES = [
+    ("hide", _hide_account),
+    ("stories", _erase_stories),
+    ("likes", _erase_likes),
+    ("comments", _erase_comments),
+    ("posts", _erase_posts),
+    ("messages", _erase_messages),
+    ("relationships", _erase_relationships),
+    ("storage", _erase_storage),
+    ("user", _erase_user),
+]
+STORAGE_PREFIXES = ["posts", "stories", "messages", "profiles", "exports"]
+STORAGE_BATCH_SIZE = 1000
+
+
+def purge_account(job):
+    user_id = int(job.target_id)
+    done = job.progress.setdefault("stages_done", [])
+    for name, stage in ACCOUNT_STAGES:
+        if name in done:
+            continue
+        job.progress["stage"] = name
+        job.save(update_fields=["progress", "updated_at"])
+        stage(user_id, job)
+        done.append(name)
+        job.save(update_fields=["progress", "updated_at"])
+
+
+def erase_account(user):
+    """Deactivate the account now and erase everything it owns in the background."""
+    with transaction.atomic():
+        User.objects.filter(id=user.id).update(is_active=False)
+        return start_purge("account", user.id)
+
+
+PURGE_HANDLERS = {
+    "post": purge_post,
+    "account": purge_account,
+}
+
+
+@jobs.job("cleanup")
+def run_purge_job(job_id):
+    job = PurgeJob.objects.filter(id=job_id).exclude(status="done").first()
+    if job is None:
+        return
+
+    job.status = "running"
+    job.attempts += 1
+    job.save(update_fields=["status", "attempts", "updated_at"])
+
+    try:
+        PURGE_HANDLERS[job.kind](job)
+    except Exception as e:
+        job.last_error = str(e)
+        job.status = "failed" if job.attempts >= MAX_ATTEMPTS else "pending"
+        # Saved before the retry is queued, so a retry that runs right away
+        # (eager jobs, a free worker) can't be overwritten by this attempt
+        job.save(update_fields=["status", "last_error", "updated_at"])
+        print(f"[PURGE ERROR] {job.kind} {job.target_id} attempt {job.attempts}: {e}")
+        if job.status == "pending":
+            jobs.enqueue(
+                run_purge_job, job.id,
+                delay=RETRY_BASE_DELAY * 2 ** (job.attempts - 1),
+                dedup_key=f"purge:{job.id}",
+            )
+        return
+
+    job.status = "done"
+    job.progress["finished_at"] = timezone.now().isoformat()
+    job.save(update_fields=["status", "progress", "updated_at"])
+
+
+def start_purge(kind, target_id):
+    """Create a purge job and run it once the current transaction commits."""
+    job = PurgeJob.objects.create(kind=kind, target_id=str(target_id))
+    jobs.enqueue(run_purge_job, job.id, dedup_key=f"purge:{job.id}")
+    return job
+
+
+def delete_post(post):
+    """Tombstone a post (hidden everywhere at once) and purge it in the background."""
+    with transaction.atomic():
+        Post.all_objects.filter(id=post.id).update(deleted_at=timezone.now())
+        counters.post_added(post.user_id, -1)
+        return start_purge("post", post.id)
+
+
+@jobs.periodic(every=10 * 60)
+def resume_purge_jobs():
+    """Re-queue jobs interrupted by a restart (pending, or running with no recent progress)."""
+    stale = timezone.now() - timedelta(minutes=10)
+    for job_id in PurgeJob.objects.filter(status="pending").values_list("id", flat=True):
+        # Jobs already waiting for a retry keep their dedup key and are skipped
+        jobs.enqueue(run_purge_job, job_id, dedup_key=f"purge:{job_id}")
+    for job_id in PurgeJob.objects.filter(status="running", updated_at__lt=stale).values_list("id", flat=True):
+        jobs.enqueue(run_purge_job, job_id, dedup_key=f"purge:{job_id}")
@@ -0,0 +1,179 @@
+# backend/api/search.py
+"""
+Full-text search over Post.caption and Comment.text (GET /search/content/?q=).
+
+The index lives in the database and follows every write:
+- PostgreSQL: a generated `search_vector tsvector` column on api_post and
+  api_comment (to_tsvector('simple', ...), STORED) with a GIN index.
+- SQLite: FTS5 external-content tables api_post_fts / api_comment_fts kept
+  in sync by AFTER INSERT/UPDATE/DELETE triggers.
+Neither is declared on the models; migration 0010 installs them.
+
+A search ranks posts by their caption match (weighted CAPTION_WEIGHT) plus
+their matching comments, and filters deleted posts and private accounts the
+viewer doesn't follow, and authors blocked either way, in the same SQL
+statement.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from . import blocks, visibility
+from .models import Post
+
+CONFIG = "simple"  # no stemming: captions mix languages, hashtags and names
+CAPTION_WEIGHT = 2.0
+
+POSTGRES_DDL = [
+    f"""ALTER TABLE api_post ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{CONFIG}', coalesce(caption, ''))) STORED""",
+    f"""ALTER TABLE api_comment ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{CONFIG}', coalesce(text, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS api_post_search_gin ON api_post USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS api_comment_search_gin ON api_comment USING GIN (search_vector)",
+]
+POSTGRES_DROP = [
+    "ALTER TABLE api_post DROP COLUMN IF EXISTS search_vector",
+    "ALTER TABLE api_comment DROP COLUMN IF EXISTS search_vector",
+]
+
+# (table, indexed column)
+SQLITE_TABLES = [("api_post", "caption"), ("api_comment", "text")]
+
+
+def _sqlite_ddl(table, column):
+    fts = f"{table}_fts"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column}, content='{table}', content_rowid='rowid')",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+            INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column});
+        END""",
+    ]
+
+
+def install(conn):
+    with conn.cursor() as cursor:
+        if conn.vendor == "postgresql":
+            for sql in POSTGRES_DDL:
+                cursor.execute(sql)
+        elif conn.vendor == "sqlite":
+            for table, column in SQLITE_TABLES:
+                for sql in _sqlite_ddl(table, column):
+                    cursor.execute(sql)
+                cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def uninstall(conn):
+    with conn.cursor() as cursor:
+        if conn.vendor == "postgresql":
+            for sql in POSTGRES_DROP:
+                cursor.execute(sql)
+        elif conn.vendor == "sqlite":
+            for table, _ in SQLITE_TABLES:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+
+
+def repair_sqlite_index(using="default", **kwargs):
+    """
+    post_migrate hook: SQLite ALTERs rebuild api_post / api_comment as new
+    tables, which drops the triggers and renumbers rowids. Reinstall and
+    rebuild the FTS tables when that happened.
+    """
+    from django.db import connections
+
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'api_%_fts_a_'")
+        installed = cursor.fetchone()[0]
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'api_post_fts'")
+        migrated = cursor.fetchone()[0]
+    if migrated and installed < 3 * len(SQLITE_TABLES):
+        print("[SEARCH] rebuilding SQLite FTS index")
+        install(conn)
+
+
+# -------------------------------------------------------------------
+# Query
+# -------------------------------------------------------------------
+def _fts5_query(q):
+    # Every word as a quoted FTS5 string (implicit AND); the last one as a prefix
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words) + "*"
+
+
+def _hits_sql(vendor):
+    if vendor == "postgresql":
+        return f"""
+            SELECT p.id AS post_id, {CAPTION_WEIGHT} * ts_rank(p.search_vector, q) AS rank
+              FROM api_post p, plainto_tsquery('{CONFIG}', %s) q
+             WHERE p.search_vector @@ q
+            UNION ALL
+            SELECT c.post_id, ts_rank(c.search_vector, q)
+              FROM api_comment c, plainto_tsquery('{CONFIG}', %s) q
+             WHERE c.search_vector @@ q
+        """
+    return f"""
+        SELECT p.id AS post_id, -{CAPTION_WEIGHT} * bm25(api_post_fts) AS rank
+          FROM api_post_fts JOIN api_post p ON p.rowid = api_post_fts.rowid
+         WHERE api_post_fts MATCH %s
+        UNION ALL
+        SELECT c.post_id, -bm25(api_comment_fts)
+          FROM api_comment_fts JOIN api_comment c ON c.rowid = api_comment_fts.rowid
+         WHERE api_comment_fts MATCH %s
+    """
+
+
+def search_post_ids(user, q, limit=20, offset=0):
+    """Ids of posts visible to `user` matching `q`, best match first."""
+    vendor = connection.vendor
+    if vendor == "postgresql":
+        term = q
+    elif vendor == "sqlite":
+        term = _fts5_query(q)
+    else:
+        return _search_post_ids_fallback(user, q, limit, offset)
+    if not term:
+        return []
+
+    hidden = blocks.hidden_ids(user.id)
+    not_hidden = f"AND p.user_id NOT IN ({', '.join(['%s'] * len(hidden))})" if hidden else ""
+    sql = f"""
+        SELECT h.post_id, SUM(h.rank) AS score, MAX(p.created_at) AS created_at
+          FROM ({_hits_sql(vendor)}) h
+          JOIN api_post p ON p.id = h.post_id
+          JOIN api_userprofile up ON up.user_id = p.user_id
+         WHERE p.deleted_at IS NULL
+           -- visibility.visible_q(), spelled out in SQL
+           AND (up.is_private = %s OR p.user_id = %s OR EXISTS (
+                SELECT 1 FROM api_follower f WHERE f.follower_id = %s AND f.followed_id = p.user_id))
+           {not_hidden}
+         GROUP BY h.post_id
+         ORDER BY score DESC, created_at DESC
+         LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [term, term, False, user.id, user.id, *hidden, limit, offset])
+        rows = cursor.fetchall()
+    return [Post._meta.pk.to_python(row[0]) for row in rows]
+
+
+def _search_post_ids_fallback(user, q, limit, offset):
+    # Other databases: unindexed LIKE scan, same visibility rules
+    return list(
+        visibility.posts(user)
+        .filter(Q(caption__icontains=q) | Q(comments__text__icontains=q))
+        .distinct().order_by("-created_at")
+        .values_list("id", flat=True)[offset:offset + limit]
+    )
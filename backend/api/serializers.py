@@ -8,9 +8,32 @@ from .models import (
     Message,
     Story, StoryView,
 )
+from .media import SIZE_CLASSES, DEFAULT_SIZE, variant_url
+from .utils.storage import get_storage
 
 User = get_user_model()
 
+
+def requested_size(context):
+    """Size class asked for via ?size=thumbnail|feed|full (defaults to feed)."""
+    request = context.get('request')
+    # DRF Request or a plain HttpRequest (async views)
+    params = getattr(request, 'query_params', None) or getattr(request, 'GET', {})
+    size = params.get('size')
+    return size if size in SIZE_CLASSES else DEFAULT_SIZE
+
+
+def public_media_item(item, size):
+    """Media item as exposed by the API: chosen variant URL + layout hints."""
+    return {
+        'type': item.get('type'),
+        'url': variant_url(item, size),
+        'width': item.get('width'),
+        'height': item.get('height'),
+        'blurhash': item.get('blurhash'),
+        'status': item.get('status'),
+    }
+
 # 1️⃣ User Serializer
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -24,11 +47,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
     
     # 🌟 ADD THIS FIELD:
     is_requested = serializers.SerializerMethodField()
+    profile_pic = serializers.SerializerMethodField()
     
-    # 🌟 ADDED: Fields to calculate and display the counts
-    posts_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
@@ -43,7 +63,18 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'posts_count', 'followers_count', 'following_count'
         ]
 
+    def get_profile_pic(self, obj):
+        return get_storage().url(obj.profile_pic_path)
+
+    def _known_relationship(self, obj):
+        # Views that already resolved the viewer relationship pass it in as
+        # context['relationship'] = {user_id: {'is_following': ..., 'is_requested': ...}}
+        return self.context.get('relationship', {}).get(obj.user_id)
+
     def get_is_following(self, obj):
+        known = self._known_relationship(obj)
+        if known is not None:
+            return known['is_following']
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
@@ -51,6 +82,9 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     # 🌟 ADD THIS METHOD - CHECKS FOR PENDING FRIEND REQUEST:
     def get_is_requested(self, obj):
+        known = self._known_relationship(obj)
+        if known is not None:
+            return known['is_requested']
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
@@ -60,17 +94,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
             status='pending'
         ).exists()
 
-    # 🌟 NEW METHOD: Get number of posts for this user
-    def get_posts_count(self, obj):
-        return Post.objects.filter(user=obj.user).count()
-
-    # 🌟 NEW METHOD: Get number of users following this user
-    def get_followers_count(self, obj):
-        return Follower.objects.filter(followed=obj.user).count()
-
-    # 🌟 NEW METHOD: Get number of users this user is following
-    def get_following_count(self, obj):
-        return Follower.objects.filter(follower=obj.user).count()
+    # posts_count / followers_count / following_count are denormalized
+    # columns on UserProfile (see api/counters.py), so no COUNT queries here.
 
     
 # 3️⃣ Friend Request Serializer
@@ -94,20 +119,32 @@ class FriendRequestSerializer(serializers.ModelSerializer):
 # 4️⃣ Post Serializer
 class PostSerializer(serializers.ModelSerializer):
     user = UserProfileSerializer(source='user.profile', read_only=True)  # <-- Updated
-    likes_count = serializers.IntegerField(source='likes.count', read_only=True)
-    comments_count = serializers.IntegerField(source='comments.count', read_only=True)
+    likes_count = serializers.IntegerField(read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
     has_liked = serializers.SerializerMethodField()
 
+    # Media resolved to the requested size class (?size=thumbnail|feed|full)
+    media = serializers.SerializerMethodField()
+    media_urls = serializers.SerializerMethodField()
+
     # Check if the requesting user has liked this post
     has_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = [
-            'id', 'user', 'caption', 'media_urls',
+            'id', 'user', 'caption', 'media', 'media_urls',
             'likes_count', 'comments_count', 'has_liked', 'created_at'
         ]
 
+    def get_media(self, obj):
+        size = requested_size(self.context)
+        return [public_media_item(item, size) for item in obj.media or []]
+
+    def get_media_urls(self, obj):
+        size = requested_size(self.context)
+        return [variant_url(item, size) for item in obj.media or []]
+
     def get_has_liked(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
@@ -133,6 +170,9 @@ class CommentSerializer(serializers.ModelSerializer):
     def get_replies(self, obj):
         # Prevent infinite recursion by only returning non-null replies
         replies = obj.replies.all() 
+        hidden = self.context.get('hidden_user_ids')
+        if hidden:
+            replies = replies.exclude(user__in=hidden)
         # Pass context for nested serializers
         return CommentSerializer(replies, many=True, context=self.context).data
 
@@ -142,11 +182,15 @@ class MessageSerializer(serializers.ModelSerializer):
     """Serializer for direct messages."""
     sender = UserSerializer(read_only=True)
     receiver = UserSerializer(read_only=True)
+    media_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
         fields = ['id', 'sender', 'receiver', 'text', 'media_url', 'is_read', 'created_at']
 
+    def get_media_url(self, obj):
+        return get_storage().url(obj.media_path)
+
 
 # 7️⃣ Story Serializer
 class StorySerializer(serializers.ModelSerializer):
@@ -154,13 +198,23 @@ class StorySerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     # Checks if the requesting user has viewed this story
     is_viewed = serializers.SerializerMethodField() 
+    media = serializers.SerializerMethodField()
+    media_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Story
         fields = [
-            'id', 'user', 'media_url', 'media_type',
+            'id', 'user', 'media', 'media_url', 'media_type',
             'created_at', 'expires_at', 'is_viewed'
         ]
+        # Taken from the file or the claimed upload (StoryViewSet.perform_create)
+        read_only_fields = ['media_type']
+
+    def get_media(self, obj):
+        return public_media_item(obj.media or {}, requested_size(self.context))
+
+    def get_media_url(self, obj):
+        return variant_url(obj.media, requested_size(self.context))
 
     def get_is_viewed(self, obj):
         request = self.context.get('request')
@@ -1,16 +1,26 @@
 # backend/api/services.py
-from .utils import supabase
+from django.db import transaction
 from django.utils import timezone
+from .jobs import periodic
 from .models import Story
-import os
+from .media import release_media
 
+CLEANUP_BATCH_SIZE = 500
+
+@periodic(every=60 * 60)
 def cleanup_expired_stories():
-    bucket = os.getenv("SUPABASE_BUCKET", "files")  
-    expired = Story.objects.filter(expires_at__lt=timezone.now())
-    for s in expired:
-        path = f"stories/{s.user.id}/{s.id}"
-        try:
-            supabase.storage.from_(bucket).remove([path])
-        except Exception as e:
-            print(f"Failed to delete {path}: {e}")
-    expired.delete()
\ No newline at end of file
+    cutoff = timezone.now()
+    while True:
+        with transaction.atomic():
+            # Locked rows belong to a concurrent run, which releases their media
+            rows = list(
+                Story.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lt=cutoff).order_by("pk")
+                .values_list("id", "media")[:CLEANUP_BATCH_SIZE]
+            )
+            if not rows:
+                return
+            # The same ids are deleted and released, once. Blobs shared with
+            # other posts, stories or messages stay until their last reference goes
+            Story.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+            release_media([media for _, media in rows])
@@ -0,0 +1,184 @@
+# backend/api/tags.py
+"""
+#hashtag and @mention indexes.
+
+Captions and comments are parsed when they are written:
+- every #tag links the post in PostHashtag (tag -> post, stamped with the
+  post's created_at) and bumps the tag's post_count and its HashtagTrend
+  bucket for the current hour;
+- every @username of an existing user (other than the author) gets a
+  Mention row (-> user, post, comment).
+
+Tag feeds, autocomplete and trending tags then read those tables by index
+instead of scanning caption/text with LIKE '%...%'. A post stays linked to
+a tag while its caption or any of its comments uses it: release_hashtags()
+unlinks (and counts down) the tags an edited caption or a deleted comment
+gave up, and unlink_post() drops all of a post's links before it is purged.
+"""
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .jobs import periodic
+from .models import Comment, Hashtag, HashtagTrend, Mention, PostHashtag
+
+User = get_user_model()
+
+HASHTAG_RE = re.compile(r"(?<![\w#])#(\w{1,100})")
+MENTION_RE = re.compile(r"(?<![\w@])@([\w.]{1,150})")
+
+TREND_RETENTION_HOURS = 7 * 24
+TRENDING_CACHE_TTL = 60
+
+
+def parse_hashtags(text):
+    """Unique lowercase tag names, in order of appearance."""
+    return list(dict.fromkeys(m.lower() for m in HASHTAG_RE.findall(text or "")))
+
+
+def parse_mentions(text):
+    return list(dict.fromkeys(m.rstrip(".") for m in MENTION_RE.findall(text or "")))
+
+
+def _hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+# -------------------------------------------------------------------
+# Write path
+# -------------------------------------------------------------------
+def link_hashtags(post, names):
+    """Index `post` under each tag in `names` it isn't linked to yet."""
+    if not names:
+        return
+    Hashtag.objects.bulk_create([Hashtag(name=n) for n in names], ignore_conflicts=True)
+    tag_ids = list(Hashtag.objects.filter(name__in=names).values_list("id", flat=True))
+    linked = set(
+        PostHashtag.objects.filter(post=post, hashtag_id__in=tag_ids).values_list("hashtag_id", flat=True)
+    )
+    new_ids = [i for i in tag_ids if i not in linked]
+    if not new_ids:
+        return
+
+    PostHashtag.objects.bulk_create(
+        [PostHashtag(hashtag_id=i, post=post, created_at=post.created_at) for i in new_ids],
+        ignore_conflicts=True,
+    )
+    Hashtag.objects.filter(id__in=new_ids).update(post_count=F("post_count") + 1)
+
+    hour = _hour(timezone.now())
+    HashtagTrend.objects.bulk_create(
+        [HashtagTrend(hashtag_id=i, hour=hour) for i in new_ids], ignore_conflicts=True
+    )
+    HashtagTrend.objects.filter(hashtag_id__in=new_ids, hour=hour).update(count=F("count") + 1)
+
+
+def hashtags_of(comments):
+    """Tags used by a queryset of comments."""
+    return {name for text in comments.values_list("text", flat=True) for name in parse_hashtags(text)}
+
+
+def _unlink(links):
+    tag_ids = list(links.values_list("hashtag_id", flat=True))
+    links.delete()
+    Hashtag.objects.filter(id__in=tag_ids, post_count__gt=0).update(post_count=F("post_count") - 1)
+
+
+def unlink_hashtags(post, names):
+    if names:
+        _unlink(PostHashtag.objects.filter(post=post, hashtag__name__in=names))
+
+
+def unlink_post(post_id):
+    """Drop every tag link of a post that is about to be purged."""
+    _unlink(PostHashtag.objects.filter(post_id=post_id))
+
+
+def _still_used(post, names):
+    """The tags among `names` the post's caption or one of its comments still uses."""
+    used = set(parse_hashtags(post.caption)) & names
+    rest = names - used
+    if rest:
+        # Only comments that can contain one of the tags are parsed
+        contains = Q()
+        for name in rest:
+            contains |= Q(text__icontains=f"#{name}")
+        for text in Comment.objects.filter(contains, post_id=post.pk).values_list("text", flat=True):
+            used.update(set(parse_hashtags(text)) & rest)
+    return used
+
+
+def release_hashtags(post, names):
+    """A caption edit or comment delete stopped using `names`: unlink those nothing else uses."""
+    names = set(names)
+    if names:
+        unlink_hashtags(post, names - _still_used(post, names))
+
+
+def record_mentions(author, post, text, comment=None):
+    names = parse_mentions(text)
+    if not names:
+        return
+    user_ids = User.objects.filter(username__in=names).exclude(id=author.id).values_list("id", flat=True)
+    Mention.objects.bulk_create([Mention(user_id=i, post=post, comment=comment) for i in user_ids])
+
+
+def index_post(post):
+    link_hashtags(post, parse_hashtags(post.caption))
+    record_mentions(post.user, post, post.caption)
+
+
+def reindex_post(post, old_caption):
+    """Caption edited: move the caption's tags and mentions over to the new text."""
+    old, new = set(parse_hashtags(old_caption)), set(parse_hashtags(post.caption))
+    # Dropped tags stay linked while a comment still uses them
+    release_hashtags(post, old - new)
+    link_hashtags(post, [t for t in parse_hashtags(post.caption) if t not in old])
+    Mention.objects.filter(post=post, comment__isnull=True).delete()
+    record_mentions(post.user, post, post.caption)
+
+
+def index_comment(comment):
+    link_hashtags(comment.post, parse_hashtags(comment.text))
+    record_mentions(comment.user, comment.post, comment.text, comment=comment)
+
+
+# -------------------------------------------------------------------
+# Read path
+# -------------------------------------------------------------------
+def autocomplete(prefix, limit=10):
+    prefix = prefix.lstrip("#").lower()
+    if not prefix:
+        return []
+    return list(
+        Hashtag.objects.filter(name__startswith=prefix)
+        .order_by("-post_count", "name")
+        .values("name", "post_count")[:limit]
+    )
+
+
+def trending(hours=24, limit=20):
+    key = f"tags:trending:{hours}:{limit}"
+    tags = cache.get(key)
+    if tags is None:
+        since = _hour(timezone.now()) - timedelta(hours=hours - 1)
+        tags = list(
+            HashtagTrend.objects.filter(hour__gte=since)
+            .values("hashtag__name")
+            .annotate(uses=Sum("count"))
+            .order_by("-uses", "hashtag__name")[:limit]
+        )
+        tags = [{"name": t["hashtag__name"], "uses": t["uses"]} for t in tags]
+        cache.set(key, tags, TRENDING_CACHE_TTL)
+    return tags
+
+
+@periodic(every=60 * 60)
+def prune_hashtag_trends():
+    cutoff = _hour(timezone.now()) - timedelta(hours=TREND_RETENTION_HOURS)
+    deleted, _ = HashtagTrend.objects.filter(hour__lt=cutoff).delete()
+    print(f"[TAGS] pruned {deleted} trend buckets")
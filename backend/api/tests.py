@@ -1,3 +1,2072 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import archive, batch, blocks, counters, explore, jobs, purge, ranking, services, tags, visibility
+from .models import (
+    Comment, DataExport, ExploreRanking, Follower, FriendRequest, Hashtag, Like, MediaObject, Message,
+    MessageSegment, Post, PostHashtag, PurgeJob, Story, StoryView, UploadSession, UserProfile,
+)
+from .throttling import consume
+from .utils.fake_storage import FakeStorage
+from .utils.storage import LocalStorage, MemoryStorage, get_storage
+from .utils.storage_gateway import CircuitBreaker, CircuitOpenError, StorageError, StorageGateway
+
+User = get_user_model()
+
+
+class ApiTestCase(TestCase):
+    """DB-backed endpoint tests; clients log in with X-Session-ID like the app."""
+
+    def setUp(self):
+        cache.clear()  # throttle buckets, block lists, profile versions
+
+    def make_user(self, username, private=False):
+        user = User.objects.create_user(username, f"{username}@example.com", "pw")
+        UserProfile.objects.create(user=user, is_private=private)
+        return user
+
+    def client_for(self, user):
+        session = SessionStore()
+        session["_auth_user_id"] = str(user.pk)
+        session.create()
+        return APIClient(HTTP_X_SESSION_ID=session.session_key)
+
+    def memory_storage(self):
+        """A fresh MemoryStorage as the storage backend for the rest of the test."""
+        self.enterContext(override_settings(STORAGE_BACKEND="memory"))
+        get_storage.reset()
+        self.addCleanup(get_storage.reset)
+        return get_storage()
+
+
+class StorageGatewayTests(SimpleTestCase):
+    def setUp(self):
+        self.storage = FakeStorage().start()
+        self.addCleanup(self.storage.stop)
+
+    def gateway(self, **kwargs):
+        kwargs.setdefault("backoff_base", 0.01)
+        return StorageGateway(self.storage.url, "key", "files", **kwargs)
+
+    def test_upload_download_list_remove(self):
+        gw = self.gateway()
+        url = gw.upload("posts/1/a.jpg", b"jpeg", "image/jpeg")
+        self.assertEqual(url, f"{self.storage.url}/storage/v1/object/public/files/posts/1/a.jpg")
+        self.assertEqual(gw.download("posts/1/a.jpg"), b"jpeg")
+        self.assertEqual([f["name"] for f in gw.list("posts/1")], ["a.jpg"])
+        gw.remove(["posts/1/a.jpg"])
+        self.assertEqual(gw.list("posts/1"), [])
+
+    def test_signed_urls(self):
+        gw = self.gateway()
+        gw.upload("exports/1/a.zip", b"zip", "application/zip")
+        url = gw.sign("exports/1/a.zip", 60)
+        self.assertTrue(url.startswith(f"{self.storage.url}/storage/v1/object/sign/files/exports/1/a.zip?token="))
+        with self.assertRaises(StorageError):
+            gw.sign("exports/1/missing.zip", 60)
+
+    def test_retries_transient_errors(self):
+        self.storage.fail_next = [503, 429]
+        self.gateway(max_retries=2).upload("a.jpg", b"x", "image/jpeg")
+        self.assertIn("files/a.jpg", self.storage.objects)
+
+    def test_upload_whose_response_was_lost_succeeds_on_retry(self):
+        gw = self.gateway(max_retries=2)
+        self.storage.drop_next = 1  # stored, but the client never hears back
+        gw.upload("a.jpg", b"x", "image/jpeg")
+        self.assertEqual(self.storage.requests, [("POST", "/storage/v1/object/files/a.jpg")] * 2)
+        self.assertEqual(self.storage.objects["files/a.jpg"][0], b"x")
+
+        async def lost_async_upload():
+            self.storage.drop_next = 1
+            await gw.aupload("b.jpg", b"y", "image/jpeg")
+
+        asyncio.run(lost_async_upload())
+        self.assertIn("files/b.jpg", self.storage.objects)
+
+    def test_client_errors_are_not_retried(self):
+        gw = self.gateway()
+        gw.upload("a.jpg", b"x", "image/jpeg")
+        with self.assertRaises(StorageError):
+            gw.upload("a.jpg", b"y", "image/jpeg")
+        self.assertEqual(len(self.storage.requests), 2)
+
+    def test_deadline_bounds_slow_calls(self):
+        self.storage.delay = 0.5
+        with self.assertRaises(StorageError):
+            self.gateway(max_retries=0).download("missing", deadline=0.1)
+
+    def test_breaker_fails_fast_then_recovers(self):
+        gw = self.gateway(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+        self.storage.fail_next = [500, 500]
+        for _ in range(2):
+            with self.assertRaises(StorageError):
+                gw.upload("a.jpg", b"x", "image/jpeg")
+        with self.assertRaises(CircuitOpenError):
+            gw.upload("a.jpg", b"x", "image/jpeg")
+        self.assertEqual(len(self.storage.requests), 2)
+
+        gw.breaker._opened_at -= 0.2  # let the reset timeout pass
+        gw.upload("a.jpg", b"x", "image/jpeg")
+        self.assertEqual(gw.breaker.state, "closed")
+
+    def half_open(self, gw):
+        gw.breaker._opened_at = time.monotonic() - gw.breaker.reset_timeout
+        self.assertEqual(gw.breaker.state, "half-open")
+
+    def test_half_open_trial_is_not_stranded(self):
+        gw = self.gateway(max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+
+        def broken_body():
+            raise OSError("temp file gone")
+
+        self.half_open(gw)
+        with self.assertRaises(OSError):
+            gw.upload("a.jpg", broken_body, "image/jpeg")
+        with mock.patch.object(gw.client, "request", side_effect=RuntimeError("bug")), self.assertRaises(RuntimeError):
+            gw.upload("a.jpg", b"x", "image/jpeg")
+
+        # Cancelled mid-request (e.g. the client went away)
+        self.storage.delay = 0.5
+
+        async def cancelled_upload():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(gw.aupload("a.jpg", b"x", "image/jpeg"), 0.05)
+
+        asyncio.run(cancelled_upload())
+        self.storage.delay = 0
+
+        # Each of those gave the trial back, so the next call still gets to close the circuit
+        gw.upload("a.jpg", b"x", "image/jpeg", upsert=True)
+        self.assertEqual(gw.breaker.state, "closed")
+
+
+class StorageBackendTests(SimpleTestCase):
+    def backends(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        return [LocalStorage(root.name), MemoryStorage()]
+
+    def test_put_get_list_delete(self):
+        for storage in self.backends():
+            self.assertTrue(storage.put("posts/1/a.jpg", BytesIO(b"a")))
+            self.assertFalse(storage.put("posts/1/a.jpg", BytesIO(b"b")))
+            self.assertTrue(storage.put("posts/1/a.jpg", BytesIO(b"c"), upsert=True))
+            storage.put("posts/1/nested/b.jpg", BytesIO(b"b"))
+            self.assertEqual(storage.get("posts/1/a.jpg"), b"c")
+            self.assertEqual(storage.list("posts/1"), ["posts/1/a.jpg"])
+            storage.delete(["posts/1/a.jpg", "posts/1/missing.jpg"])
+            self.assertIsNone(storage.get("posts/1/a.jpg"))
+
+    def test_urls(self):
+        storage = MemoryStorage()
+        self.assertEqual(storage.url("posts/1/a.jpg"), "/media/posts/1/a.jpg")
+        self.assertEqual(storage.url("https://cdn.example.com/a.jpg"), "https://cdn.example.com/a.jpg")
+        self.assertIsNone(storage.url(None))
+
+    def test_local_paths_stay_under_root(self):
+        storage = self.backends()[0]
+        self.assertFalse(storage.put("../escape.txt", BytesIO(b"x")))
+        self.assertIsNone(storage.get("../../etc/passwd"))
+
+
+class ThrottleTests(SimpleTestCase):
+    def test_token_bucket_refills_and_reports_wait(self):
+        now = time.time()
+        self.assertEqual(consume("test:bucket", 6, capacity=10, rate=2, now=now), 0)
+        self.assertEqual(consume("test:bucket", 4, capacity=10, rate=2, now=now), 0)
+        # Empty: 3 tokens take 1.5 s at 2 tokens/s
+        self.assertAlmostEqual(consume("test:bucket", 3, capacity=10, rate=2, now=now), 1.5)
+        self.assertEqual(consume("test:bucket", 3, capacity=10, rate=2, now=now + 1.5), 0)
+
+    def test_cost_above_capacity_still_passes_on_a_full_bucket(self):
+        self.assertEqual(consume("test:big", 50, capacity=10, rate=1), 0)
+
+    def test_concurrent_requests_cannot_overspend(self):
+        import threading
+
+        now, allowed = time.time(), []
+        barrier = threading.Barrier(8)
+
+        def spend():
+            barrier.wait()
+            allowed.append(consume("test:race", 3, capacity=10, rate=0.001, now=now) == 0)
+
+        threads = [threading.Thread(target=spend) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(allowed.count(True), 3)
+
+    @override_settings(REDIS_URL="redis://cache:6379/0")
+    def test_redis_script_and_fallback(self):
+        from . import throttling
+
+        script = mock.Mock(return_value=b"1.5")
+        with mock.patch.object(throttling, "_redis_take", return_value=script):
+            self.assertEqual(consume("test:redis", 3, capacity=10, rate=2, now=100), 1.5)
+        script.assert_called_once_with(keys=["throttle:test:redis"], args=[10, 2, 100, 3, 6])
+
+        # Redis down: a per-process bucket still limits
+        with mock.patch.object(throttling, "_redis_take", side_effect=ConnectionError("down")):
+            self.assertEqual(consume("test:redis", 8, capacity=10, rate=2, now=100), 0)
+            self.assertEqual(consume("test:redis", 4, capacity=10, rate=2, now=100), 1.0)
+
+    def test_client_ident_ignores_spoofed_forwarded_for(self):
+        from django.test import RequestFactory
+        from . import throttling
+
+        request = RequestFactory().get("/", HTTP_X_FORWARDED_FOR="6.6.6.6, 10.0.0.7", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(throttling.client_ident(request), "ip:10.0.0.1")
+        # Behind one proxy: the hop it appended, not the one the client sent
+        with mock.patch("rest_framework.throttling.api_settings.NUM_PROXIES", 1):
+            self.assertEqual(throttling.client_ident(request), "ip:10.0.0.7")
+
+
+ran = []
+
+
+@jobs.job("cleanup")
+def slow_cleanup(tag):
+    time.sleep(0.05)
+    ran.append(tag)
+
+
+@jobs.job("uploads")
+def record_upload(tag):
+    ran.append(tag)
+
+
+class JobsTests(SimpleTestCase):
+    databases = {"default"}  # enqueue() hooks into transaction.on_commit
+
+    def setUp(self):
+        ran.clear()
+
+    def wait_for(self, count, timeout=2):
+        deadline = time.monotonic() + timeout
+        while len(ran) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        jobs.enqueue(record_upload, "now")
+        self.assertEqual(ran, ["now"])
+
+    def test_priorities_dedup_and_delay(self):
+        backend = jobs.InProcessBackend(workers=1)
+        with self.settings(JOBS_EAGER=False), \
+                mock.patch.object(jobs, "backend", lambda: backend):
+            jobs.enqueue(slow_cleanup, "busy")  # occupies the only worker
+            time.sleep(0.01)
+            jobs.enqueue(slow_cleanup, "cleanup")
+            jobs.enqueue(record_upload, "later", delay=0.2)
+            jobs.enqueue(record_upload, "upload", dedup_key="upload-1")
+            jobs.enqueue(record_upload, "duplicate", dedup_key="upload-1")
+            self.wait_for(4)
+        self.assertEqual(ran, ["busy", "upload", "cleanup", "later"])
+        self.assertEqual(jobs.stats()["api.tests.record_upload"]["failures"], 0)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_arguments_must_be_json(self):
+        # What RedisBackend.push would reject; eager mode rejects it too
+        with self.assertRaises(TypeError):
+            jobs.enqueue(record_upload, timezone.now())
+        self.assertEqual(ran, [])
+
+    def test_unregistered_functions_are_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue(print, "x")
+
+
+class RankingTests(SimpleTestCase):
+    def test_engagement_affinity_and_recency(self):
+        now = timezone.now()
+        hours = lambda h: now - timezone.timedelta(hours=h)
+        rows = [
+            (1, 10, 0, 0, hours(1)),     # fresh, no engagement
+            (2, 10, 50, 10, hours(2)),   # fresh and popular
+            (3, 11, 0, 0, hours(1)),     # fresh, favourite author
+            (4, 10, 50, 10, hours(72)),  # popular but old
+        ]
+        scores = ranking.score(rows, {11: 20}, now=now)
+        self.assertGreater(scores[1], scores[0])
+        self.assertGreater(scores[2], scores[0])
+        self.assertGreater(scores[0], scores[3])
+
+    def test_scores_a_thousand_candidates_quickly(self):
+        now = timezone.now()
+        rows = [(i, i % 50, i % 97, i % 13, now - timezone.timedelta(minutes=i)) for i in range(1000)]
+        affinity = {a: a % 7 for a in range(50)}
+        ranking.score(rows, affinity, now=now)  # warm up the NumPy import
+        start = time.perf_counter()
+        ranking.score(rows, affinity, now=now)
+        self.assertLess((time.perf_counter() - start) * 1000, 10)
+
+
+class TagParsingTests(SimpleTestCase):
+    def test_hashtags(self):
+        text = "Sunset #Beach #beach at #golden_hour, not a#tag or ##double. #"
+        self.assertEqual(tags.parse_hashtags(text), ["beach", "golden_hour"])
+
+    def test_mentions(self):
+        text = "with @anna.k and @bob. email me@example.com @anna.k"
+        self.assertEqual(tags.parse_mentions(text), ["anna.k", "bob"])
+
+
+class BatchValidationTests(SimpleTestCase):
+    def test_limits_and_paths(self):
+        specs, error = batch._parse([{"path": "/api/auth/me/"}, {"id": "x", "method": "post", "path": "/api/posts/"}])
+        self.assertIsNone(error)
+        self.assertEqual([(s["id"], s["method"]) for s in specs], [(0, "GET"), ("x", "POST")])
+
+        with override_settings(BATCH_MAX_REQUESTS=2):
+            self.assertIsNotNone(batch._parse([{"path": "/api/auth/me/"}] * 3)[1])
+        for bad in ([], [{"path": "/admin/"}], [{"path": "/api/batch/"}], [{"method": "TRACE", "path": "/api/x/"}]):
+            self.assertIsNotNone(batch._parse(bad)[1], bad)
+
+
+class BlockFilterTests(SimpleTestCase):
+    def test_exclusion_is_in_the_list_query(self):
+        posts = Post.objects.filter(caption="x")
+        self.assertIs(blocks.exclude_users(posts, []), posts)
+        sql = str(blocks.exclude_users(posts, [7, 9]).query)
+        self.assertIn("NOT (", sql)
+        self.assertIn("IN (7, 9)", sql)
+
+    def test_anonymous_has_no_lists(self):
+        self.assertEqual(blocks.feed_excluded_ids(None), [])
+
+
+class VisibilityTests(SimpleTestCase):
+    def test_one_statement(self):
+        viewer = mock.Mock(id=3)
+        with mock.patch.object(blocks, "hidden_ids", return_value=[8]):
+            sql = str(visibility.posts(viewer).query)
+        # owner OR public OR followed (subquery), minus blocked, no extra queries
+        self.assertIn('"api_post"."user_id" = 3', sql)
+        self.assertIn('"api_userprofile"."is_private"', sql)
+        self.assertIn('FROM "api_follower"', sql)
+        self.assertIn("IN (8)", sql)
+
+
+class MessageArchiveTests(SimpleTestCase):
+    def test_segment_round_trip(self):
+        import json
+        import uuid
+        from types import SimpleNamespace
+
+        storage = MemoryStorage()
+        rows = [{"id": str(uuid.uuid4()), "sender_id": 1, "receiver_id": 2, "text": "hé",
+                 "media_path": None, "is_read": True, "created_at": str(timezone.now())}]
+        storage.put("messages/archive/1-2/a.json.gz", BytesIO(archive._compress(json.dumps(rows).encode(), "gzip")))
+        segment = SimpleNamespace(path="messages/archive/1-2/a.json.gz", codec="gzip")
+        with mock.patch.object(archive, "get_storage", return_value=storage):
+            [row] = archive.read_segment(segment)
+            self.assertEqual(archive.read_segment(SimpleNamespace(path="gone", codec="gzip"), missing_ok=True), [])
+        self.assertEqual(row["id"], uuid.UUID(rows[0]["id"]))
+        self.assertEqual((row["text"], row["created_at"].tzinfo is not None), ("hé", True))
+
+    def test_conversation_key_and_cursor(self):
+        from types import SimpleNamespace
+        from django.core import signing
+
+        self.assertEqual(archive.conversation("9", 3), (3, 9))
+        with self.assertRaises(signing.BadSignature):
+            archive.chat_page(SimpleNamespace(id=3), SimpleNamespace(id=9), cursor="forged")
+
+
+class BatchEndpointTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        self.client = self.client_for(self.alice)
+
+    def batch(self, *requests, **extra):
+        return self.client.post("/api/batch/", {"requests": list(requests), **extra}, format="json")
+
+    def test_async_view_in_batch(self):
+        response = self.batch({"id": "bob", "method": "GET", "path": "/api/async/profiles/bob/"})
+        self.assertEqual(response.status_code, 200)
+        [item] = response.json()["responses"]
+        self.assertEqual((item["id"], item["status"]), ("bob", 200))
+        self.assertEqual(item["body"]["user"]["username"], "bob")
+
+    def test_sub_requests_authenticate_with_the_session(self):
+        response = self.batch({"method": "GET", "path": "/api/profiles/me/"})
+        self.assertEqual(response.json()["responses"][0]["body"]["user"]["username"], "alice")
+        self.client.credentials(HTTP_X_SESSION_ID="expired")
+        self.assertEqual(self.batch({"method": "GET", "path": "/api/profiles/me/"}).status_code, 403)
+
+    def test_atomic_batch_rolls_back(self):
+        response = self.batch(
+            {"method": "POST", "path": f"/api/followers/{self.bob.id}/follow/"},
+            {"method": "GET", "path": "/api/nope/"},
+            atomic=True,
+        )
+        self.assertEqual(response.json()["committed"], False)
+        self.assertEqual([r["status"] for r in response.json()["responses"]][1], 404)
+        self.assertFalse(self.alice.following.exists())
+
+    def test_rejects_bad_specs(self):
+        self.assertEqual(self.batch({"method": "GET", "path": "/api/batch/"}).status_code, 400)
+        self.assertEqual(self.batch({"method": "TRACE", "path": "/api/auth/me/"}).status_code, 400)
+
+
+class BlockEndpointTests(ApiTestCase):
+    """bob blocks alice; carol is a bystander both of them can see."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = (self.make_user(n) for n in ("alice", "bob", "carol"))
+        self.as_alice, self.as_bob = self.client_for(self.alice), self.client_for(self.bob)
+        self.bob_post = Post.objects.create(user=self.bob, caption="bob's")
+        self.carol_post = Post.objects.create(user=self.carol, caption="carol's")
+        Like.objects.create(post=self.carol_post, user=self.bob)
+        Comment.objects.create(post=self.carol_post, user=self.bob, text="from bob")
+        self.alice_story = Story.objects.create(user=self.alice, media={}, media_type="image")
+        StoryView.objects.create(story=self.alice_story, viewer=self.bob)
+        self.bob_story = Story.objects.create(user=self.bob, media={}, media_type="image")
+        self.as_alice.post(f"/api/followers/{self.bob.id}/follow/")
+        # Block lists are re-read after commit (blocks._invalidate)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.as_bob.post("/api/profiles/alice/block/").status_code, 200)
+
+    def test_messages_are_refused(self):
+        drf = self.as_alice.post("/api/messages/", {"receiver": self.bob.id, "text": "hi"})
+        async_ = self.as_alice.post("/api/async/messages/", {"receiver": self.bob.id, "text": "hi"})
+        self.assertEqual((drf.status_code, async_.status_code), (403, 403))
+        self.assertFalse(Message.objects.exists())
+
+    def test_profile_is_gone(self):
+        for path in ("/api/profiles/bob/", "/api/profiles/bob/screen/", "/api/async/profiles/bob/"):
+            self.assertEqual(self.as_alice.get(path).status_code, 404, path)
+        self.assertEqual(self.as_bob.get("/api/async/profiles/alice/").status_code, 404)
+
+    def test_content_is_hidden(self):
+        self.assertEqual(self.as_alice.get(f"/api/posts/{self.bob_post.id}/").status_code, 404)
+        self.assertEqual(self.as_alice.get("/api/posts/feed/").json()["count"], 0)
+        self.assertEqual(self.as_alice.get(f"/api/likes/{self.carol_post.id}/list_likes/").json(), [])
+        comments = self.as_alice.get(f"/api/comments/?post_id={self.carol_post.id}").json()
+        self.assertEqual(comments["count"], 0)
+
+    def test_stories_are_hidden(self):
+        self.assertEqual(self.as_alice.post(f"/api/stories/{self.bob_story.id}/mark_viewed/").status_code, 404)
+        self.assertEqual(self.as_alice.get(f"/api/stories/{self.alice_story.id}/views/").json(), [])
+        self.assertEqual(self.as_bob.get(f"/api/stories/{self.alice_story.id}/").status_code, 404)
+
+    def test_unblock_restores_access(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.as_bob.post("/api/profiles/alice/unblock/")
+        self.assertEqual(self.as_alice.get("/api/async/profiles/bob/").status_code, 200)
+        self.assertEqual(len(self.as_alice.get(f"/api/likes/{self.carol_post.id}/list_likes/").json()), 1)
+
+
+class ExtraDatabasesMixin:
+    """
+    Adds `extra_databases` as throwaway, migrated SQLite files for one test
+    class. Declared in setUpClass: the runner checks class-level aliases
+    before they exist.
+    """
+    extra_databases = ()
+
+    @classmethod
+    def setUpClass(cls):
+        from django.db import connections
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        for alias in cls.extra_databases:
+            settings.DATABASES[alias] = {
+                **settings.DATABASES["default"], "ENGINE": "django.db.backends.sqlite3",
+                "NAME": os.path.join(cls.tmp.name, f"{alias}.sqlite3"), "TEST": {},
+            }
+            connections.configure_settings(settings.DATABASES)  # fills in the defaults
+            cls.migrate(alias)
+        cls.databases = {"default", *cls.extra_databases}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        from django.db import connections
+
+        super().tearDownClass()
+        for alias in cls.extra_databases:
+            connections[alias].close()
+            del connections[alias]
+            del settings.DATABASES[alias]
+        cls.tmp.cleanup()
+
+    @classmethod
+    def migrate(cls, alias):
+        from django.core.management import call_command
+
+        call_command("migrate", database=alias, verbosity=0, skip_checks=True)
+
+
+class CounterTests(ApiTestCase):
+    """Denormalized counters (counters.py) on the write paths that keep them."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        self.post = Post.objects.create(user=self.bob, caption="hi")
+
+    def test_follow_and_unfollow(self):
+        client = self.client_for(self.alice)
+        version = counters.profile_version(self.bob.id)
+        self.assertEqual(client.post(f"/api/followers/{self.bob.id}/follow/").status_code, 200)
+        self.assertEqual(UserProfile.objects.get(user=self.alice).following_count, 1)
+        self.assertEqual(client.get("/api/profiles/bob/").json()["followers_count"], 1)
+        self.assertNotEqual(counters.profile_version(self.bob.id), version)
+
+        client.post(f"/api/followers/{self.bob.id}/unfollow/")
+        self.assertEqual(UserProfile.objects.get(user=self.bob).followers_count, 0)
+
+    def test_likes_and_comments(self):
+        client = self.client_for(self.alice)
+        client.post(f"/api/likes/{self.post.id}/toggle/")
+        created = client.post("/api/comments/", {"post": str(self.post.id), "text": "top"}, format="json").json()
+        client.post("/api/comments/", {"post": str(self.post.id), "text": "re", "parent": created["id"]}, format="json")
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 2))
+
+        # Unlike; deleting the top comment takes its reply with it
+        client.post(f"/api/likes/{self.post.id}/toggle/")
+        self.assertEqual(client.delete(f"/api/comments/{created['id']}/").status_code, 204)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+
+    def test_bulk_adjust_and_recompute(self):
+        other = Post.objects.create(user=self.bob)
+        Post.objects.filter(pk__in=[self.post.pk, other.pk]).update(likes_count=5)
+        counters.adjust_posts("likes_count", [self.post.pk, self.post.pk, other.pk])
+        self.assertEqual(
+            dict(Post.objects.values_list("id", "likes_count")), {self.post.pk: 3, other.pk: 4}
+        )
+
+        Like.objects.create(post=self.post, user=self.alice)
+        counters.recompute_posts()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes_count, 1)
+        UserProfile.objects.filter(user=self.bob).update(posts_count=9, followers_count=9)
+        counters.recompute_profiles([self.bob.id])
+        profile = UserProfile.objects.get(user=self.bob)
+        self.assertEqual((profile.posts_count, profile.followers_count), (2, 0))
+
+    def test_deactivated_accounts_cannot_authenticate(self):
+        client = self.client_for(self.alice)
+        User.objects.filter(pk=self.alice.pk).update(is_active=False)
+        self.assertEqual(client.get("/api/profiles/me/").status_code, 403)
+
+
+@override_settings(JOBS_EAGER=True)
+class AccountErasureTests(ApiTestCase):
+    """delete-account -> purge.purge_account stages -> erasure-status."""
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+        from .media import store_upload
+
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        for a, b in ((self.alice, self.bob), (self.bob, self.alice)):
+            Follower.objects.create(follower=a, followed=b)
+            counters.follow_added(a.id, b.id)
+
+        def upload(data, prefix):
+            return store_upload(ContentFile(data, name="a.jpg"), prefix, "image")
+
+        mine = Post.objects.create(user=self.alice, media=[upload(b"shared", f"posts/{self.alice.id}")])
+        Like.objects.create(post=mine, user=self.bob)
+        # Bob re-posted the same bytes: the blob stays under alice's prefix
+        self.theirs = Post.objects.create(user=self.bob, media=[upload(b"shared", f"posts/{self.alice.id}")])
+        Like.objects.create(post=self.theirs, user=self.alice)
+        top = Comment.objects.create(post=self.theirs, user=self.alice, text="first")
+        Comment.objects.create(post=self.theirs, user=self.bob, text="reply", parent=top)
+        Post.objects.filter(pk=self.theirs.pk).update(likes_count=1, comments_count=2)
+
+        story = Story.objects.create(user=self.alice, media=upload(b"story", f"stories/{self.alice.id}"), media_type="image")
+        StoryView.objects.create(story=story, viewer=self.bob)
+        Message.objects.create(sender=self.alice, receiver=self.bob, text="hey")
+        self.storage.put(f"profiles/{self.alice.id}/pic.jpg", BytesIO(b"pic"))
+        self.storage.put(f"posts/{self.bob.id}/own.jpg", BytesIO(b"own"))
+
+    def erase(self):
+        client = self.client_for(self.alice)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/auth/delete-account/", {"password": "pw"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        return client, response.json()["status_token"]
+
+    def test_wrong_password_changes_nothing(self):
+        response = self.client_for(self.alice).post("/api/auth/delete-account/", {"password": "nope"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(User.objects.get(pk=self.alice.pk).is_active)
+
+    def test_erases_everything_and_fixes_other_counters(self):
+        client, token = self.erase()
+
+        self.assertFalse(User.objects.filter(pk=self.alice.pk).exists())
+        self.assertEqual(client.get("/api/profiles/me/").status_code, 403)  # session dropped
+        for model in (Post.all_objects, Like.objects, Comment.objects, Story.objects,
+                      StoryView.objects, Message.objects, Follower.objects):
+            self.assertEqual(model.exclude(pk=self.theirs.pk).count(), 0, model.model.__name__)
+
+        profile = UserProfile.objects.get(user=self.bob)
+        self.assertEqual((profile.followers_count, profile.following_count), (0, 0))
+        theirs = Post.objects.get(pk=self.theirs.pk)
+        self.assertEqual((theirs.likes_count, theirs.comments_count), (0, 0))
+
+        # Only blobs still referenced by someone else survive
+        [shared] = self.theirs.media
+        self.assertEqual(sorted(self.storage.objects), sorted([shared["path"], f"posts/{self.bob.id}/own.jpg"]))
+
+        status = APIClient().get("/api/auth/erasure-status/", {"token": token}).json()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["stages_done"], [name for name, _ in purge.ACCOUNT_STAGES])
+        self.assertEqual(status["progress"]["likes"], 2)  # hers, and bob's on her post
+        self.assertEqual(APIClient().get("/api/auth/erasure-status/", {"token": "forged"}).status_code, 400)
+
+    def test_failed_stage_resumes_where_it_stopped(self):
+        real = archive.drop_segments
+        calls = []
+
+        def flaky(segments):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("storage down")
+            return real(segments)
+
+        hide = mock.Mock(wraps=purge._hide_account)
+        stages = [(name, hide if name == "hide" else fn) for name, fn in purge.ACCOUNT_STAGES]
+        with mock.patch.object(archive, "drop_segments", flaky), mock.patch.object(purge, "ACCOUNT_STAGES", stages):
+            _, token = self.erase()
+
+        job = PurgeJob.objects.get(kind="account")
+        self.assertEqual((job.status, job.attempts, job.last_error), ("done", 2, "storage down"))
+        self.assertEqual(hide.call_count, 1)  # finished stages aren't repeated
+        self.assertEqual(job.progress["messages"], 1)
+        self.assertFalse(User.objects.filter(pk=self.alice.pk).exists())
+
+
+@override_settings(JOBS_EAGER=True)
+class DataExportTests(ApiTestCase):
+    """POST /exports/ -> build_export ZIP -> signed download -> cleanup_expired_exports."""
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+        from .media import store_upload
+
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        Follower.objects.create(follower=self.bob, followed=self.alice)
+
+        def upload(data, prefix):
+            return store_upload(ContentFile(data, name="a.jpg"), f"{prefix}/{self.alice.id}", "image")
+
+        # The same photo posted twice is one blob, one key
+        self.photo = upload(b"photo", "posts")
+        first = Post.objects.create(user=self.alice, caption="one", media=[self.photo])
+        Post.objects.create(user=self.alice, caption="two", media=[upload(b"photo", "posts")])
+        Story.objects.create(user=self.alice, media=upload(b"story", "stories"), media_type="image",
+                             expires_at=timezone.now() + timedelta(hours=1))
+        Comment.objects.create(post=first, user=self.alice, text="nice")
+        Like.objects.create(post=first, user=self.alice)
+
+        # An old conversation moved to the archive, with the photo attached, and a live message
+        old = Message.objects.create(sender=self.alice, receiver=self.bob, text="archived",
+                                     media_path=self.photo["path"])
+        Message.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        low, high = archive.conversation(self.alice.id, self.bob.id)
+        archive.archive_conversation(low, high, (timezone.now() - timedelta(days=365)).isoformat())
+        self.assertFalse(Message.objects.exists())
+        Message.objects.create(sender=self.bob, receiver=self.alice, text="live")
+        self.as_alice = self.client_for(self.alice)
+
+    def export(self):
+        response = self.as_alice.post("/api/exports/")
+        self.assertEqual(response.status_code, 202)
+        return self.as_alice.get(f"/api/exports/{response.data['id']}/").data
+
+    def download(self, url, **headers):
+        # The signed link is the only credential
+        response = APIClient().get(url, **headers)
+        if response.status_code in (200, 206):
+            return response, b"".join(response.streaming_content)
+        return response, None
+
+    def ndjson(self, zf, name):
+        return [json.loads(line) for line in zf.read(name).splitlines()]
+
+    def test_zip_contents(self):
+        import zipfile
+
+        data = self.export()
+        self.assertEqual(data["status"], "ready")
+        response, body = self.download(data["download_url"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body), data["size"])
+
+        zf = zipfile.ZipFile(BytesIO(body))
+        names = zf.namelist()
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(
+            sorted(n for n in names if not n.startswith("media/")),
+            sorted(["profile.json", "posts.ndjson", "comments.ndjson", "likes.ndjson", "stories.ndjson",
+                    "messages.ndjson", "followers.ndjson", "following.ndjson"]),
+        )
+        profile = json.loads(zf.read("profile.json"))
+        self.assertEqual((profile["username"], profile["email"]), ("alice", "alice@example.com"))
+
+        self.assertEqual([p["caption"] for p in self.ndjson(zf, "posts.ndjson")], ["one", "two"])
+        self.assertEqual([c["text"] for c in self.ndjson(zf, "comments.ndjson")], ["nice"])
+        self.assertEqual(len(self.ndjson(zf, "likes.ndjson")), 1)
+        self.assertEqual(len(self.ndjson(zf, "stories.ndjson")), 1)
+        self.assertEqual(self.ndjson(zf, "followers.ndjson")[0]["follower__username"], "bob")
+        self.assertEqual(self.ndjson(zf, "following.ndjson"), [])
+        # Archived rows come first, then the live table
+        messages = self.ndjson(zf, "messages.ndjson")
+        self.assertEqual([m["text"] for m in messages], ["archived", "live"])
+        self.assertEqual(
+            (messages[0]["sender__username"], messages[0]["receiver__username"], messages[0]["media_path"]),
+            ("alice", "bob", self.photo["path"]),
+        )
+
+        # One member per stored original, however many rows point at it
+        story = Story.objects.get().media["path"]
+        self.assertEqual(sorted(n for n in names if n.startswith("media/")),
+                         sorted([f"media/{self.photo['path']}", f"media/{story}"]))
+        self.assertEqual(zf.read(f"media/{self.photo['path']}"), b"photo")
+
+    def test_signed_link(self):
+        data = self.export()
+        url = data["download_url"]
+        self.assertIn("?token=", url)
+        response, body = self.download(url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual((response.status_code, len(body)), (206, 10))
+        self.assertEqual(response["Content-Range"], f"bytes 0-9/{data['size']}")
+
+        self.assertEqual(self.download(url + "x")[0].status_code, 403)
+        # A valid token only opens its own export
+        other = DataExport.objects.create(user=self.bob)
+        self.assertEqual(self.download(url.replace(data["id"], str(other.id)))[0].status_code, 403)
+        with override_settings(EXPORT_LINK_TTL=-1):
+            self.assertEqual(self.download(url)[0].status_code, 403)
+
+    def test_cleanup_expired_exports(self):
+        from . import exports
+
+        data = self.export()
+        kept = DataExport.objects.create(user=self.bob)
+        path = DataExport.objects.get(pk=data["id"]).path
+        self.assertIn(path, self.storage.objects)
+
+        exports.cleanup_expired_exports()  # not expired yet
+        self.assertEqual(DataExport.objects.count(), 2)
+
+        DataExport.objects.filter(pk=data["id"]).update(expires_at=timezone.now() - timedelta(minutes=1))
+        exports.cleanup_expired_exports()
+        self.assertEqual(list(DataExport.objects.all()), [kept])
+        self.assertNotIn(path, self.storage.objects)
+        self.assertEqual(self.download(data["download_url"])[0].status_code, 403)
+
+
+class RankedFeedTests(ApiTestCase):
+    """GET /posts/feed/?mode=ranked: cursors walk one ranking snapshot."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        Follower.objects.create(follower=self.alice, followed=self.bob)
+        now = timezone.now()
+        self.posts = []
+        for i in range(25):
+            author = self.alice if i % 5 == 0 else self.bob
+            # Engagement and age both vary, so the ranking isn't simply newest first
+            post = Post.objects.create(user=author, likes_count=(i * 7) % 11, comments_count=i % 3)
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(hours=i))
+            self.posts.append(post.id)
+        self.stranger = str(Post.objects.create(user=self.make_user("carol")).id)
+        self.as_alice = self.client_for(self.alice)
+
+    def get(self, next_url=None):
+        response = self.as_alice.get(next_url) if next_url else \
+            self.as_alice.get("/api/posts/feed/", {"mode": "ranked"})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_two_pages_without_duplicates_or_gaps(self):
+        first = self.get()
+        self.assertEqual(len(first["results"]), 20)
+        ranked = [str(post_id) for post_id in ranking.rank(self.alice)]
+        self.assertNotEqual(ranked, [str(post_id) for post_id in self.posts])  # not simply newest first
+
+        # Scores drift and a new post appears between the two requests
+        Post.objects.filter(pk=ranked[-1]).update(likes_count=1000, comments_count=1000)
+        Post.objects.create(user=self.bob)
+
+        second = self.get(first["next"])
+        self.assertIsNone(second["next"])
+        ids = [p["id"] for p in first["results"] + second["results"]]
+        # Both pages come from the snapshot taken for the first one
+        self.assertEqual(ids, ranked)
+        self.assertEqual(sorted(ids), sorted(str(post_id) for post_id in self.posts))
+        self.assertNotIn(self.stranger, ids)
+
+    def test_expired_snapshot_continues_at_the_same_position(self):
+        first = self.get()
+        cache.clear()
+        second = self.get(first["next"])
+        ids = [p["id"] for p in first["results"] + second["results"]]
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+
+    def test_bad_cursors_are_rejected(self):
+        first = self.get()
+        bob = self.client_for(self.bob)
+        self.assertEqual(bob.get(first["next"]).status_code, 400)
+        self.assertEqual(self.as_alice.get("/api/posts/feed/", {"mode": "ranked", "cursor": "nope"}).status_code, 400)
+
+
+class MediaProcessingTests(ApiTestCase):
+    """process_post_media / generate_variants: WebP size classes, blurhash, shared per blob."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice = self.make_user("alice")
+        self.client = self.client_for(self.alice)
+
+    def jpeg(self, size=(600, 400), color=(200, 80, 40)):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buf = BytesIO()
+        Image.new("RGB", size, color).save(buf, "JPEG")
+        return SimpleUploadedFile("photo.jpg", buf.getvalue(), content_type="image/jpeg")
+
+    def create_post(self, *files):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/posts/", {"caption": "hi", "media": list(files)}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.get(pk=response.data["id"])
+
+    @override_settings(JOBS_EAGER=True)
+    def test_post_media_gets_webp_variants(self):
+        from PIL import Image
+        from .media import SIZE_CLASSES, variant_url
+
+        post = self.create_post(self.jpeg())
+        [item] = post.media
+        self.assertEqual((item["status"], item["width"], item["height"]), ("ready", 600, 400))
+        self.assertIsInstance(item["blurhash"], str)
+        self.assertTrue(item["blurhash"])
+
+        self.assertEqual(list(item["variants"]), list(SIZE_CLASSES))
+        # Scaled to the size class's longest edge, never upscaled
+        expected = {"thumbnail": (320, 213), "feed": (600, 400), "full": (600, 400)}
+        for size, variant in item["variants"].items():
+            self.assertTrue(variant["path"].endswith(f"_{size}.webp"))
+            with Image.open(BytesIO(self.storage.objects[variant["path"]])) as stored:
+                self.assertEqual(stored.format, "WEBP")
+                self.assertEqual(stored.size, expected[size])
+            self.assertEqual((variant["width"], variant["height"]), expected[size])
+        self.assertEqual(variant_url(item, "thumbnail"), f"/media/{item['variants']['thumbnail']['path']}")
+
+        # Stored once per blob, so the same bytes posted again reuse the variants
+        obj = MediaObject.objects.get(sha256=item["sha256"])
+        self.assertEqual(obj.meta["variants"], item["variants"])
+        with mock.patch("api.media.generate_variants") as generate:
+            again = self.create_post(self.jpeg())
+        generate.assert_not_called()
+        self.assertEqual(again.media[0]["variants"], item["variants"])
+        self.assertEqual(again.media[0]["status"], "ready")
+
+    @override_settings(JOBS_EAGER=True)
+    def test_unreadable_image_is_marked_failed(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        post = self.create_post(SimpleUploadedFile("broken.jpg", b"not a jpeg", content_type="image/jpeg"))
+        [item] = post.media
+        self.assertEqual((item["status"], item["variants"]), ("failed", {}))
+        self.assertEqual(len(self.storage.objects), 1)  # just the original
+        self.assertEqual(MediaObject.objects.get().meta, {})
+
+
+class PostPurgeTests(ApiTestCase):
+    """DELETE /posts/<id>/ tombstones the post; run_purge_job removes it in batches and retries."""
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+        from .media import store_upload
+
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+
+        def upload(data):
+            return store_upload(ContentFile(data, name="a.jpg"), f"posts/{self.alice.id}", "image")
+
+        self.post = Post.objects.create(user=self.alice, media=[upload(b"mine"), upload(b"shared")])
+        counters.post_added(self.alice.id)
+        self.other = Post.objects.create(user=self.bob, media=[upload(b"shared")])
+        Like.objects.create(post=self.post, user=self.bob)
+        top = Comment.objects.create(post=self.post, user=self.bob, text="first")
+        Comment.objects.create(post=self.post, user=self.alice, text="reply", parent=top)
+
+    def delete(self):
+        # Not eager and outside captureOnCommitCallbacks: the job is only queued
+        response = self.client_for(self.alice).delete(f"/api/posts/{self.post.id}/")
+        self.assertEqual(response.status_code, 204)
+        return PurgeJob.objects.get(kind="post", target_id=str(self.post.id))
+
+    def test_tombstone_then_purge(self):
+        job = self.delete()
+        self.assertEqual(job.status, "pending")
+        # Gone for readers at once, purged later
+        self.assertEqual(self.client_for(self.bob).get(f"/api/posts/{self.post.id}/").status_code, 404)
+        self.assertEqual(UserProfile.objects.get(user=self.alice).posts_count, 0)
+        self.assertTrue(Post.all_objects.filter(pk=self.post.pk).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.run_purge_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("done", 1))
+        self.assertEqual(
+            {k: job.progress[k] for k in ("likes", "replies", "comments", "posts")},
+            {"likes": 1, "replies": 1, "comments": 1, "posts": 1},
+        )
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Like.objects.exists() or Comment.objects.exists())
+        # The blob another post shares loses one reference; the other one is removed
+        [shared] = MediaObject.objects.all()
+        self.assertEqual(shared.ref_count, 1)
+        self.assertEqual(list(self.storage.objects), [shared.path])
+
+        purge.run_purge_job(job.id)  # a duplicate delivery is a no-op
+        self.assertEqual(PurgeJob.objects.get(pk=job.pk).attempts, 1)
+
+    def test_failed_batch_is_retried_and_resumes(self):
+        job = self.delete()
+        real = purge.delete_in_batches
+        failed = []
+
+        def replies_fail_once(queryset, job, label, **kwargs):
+            if label == "replies" and not failed:
+                failed.append(label)
+                raise RuntimeError("db hiccup")
+            return real(queryset, job, label, **kwargs)
+
+        with mock.patch.object(purge, "delete_in_batches", replies_fail_once), \
+                mock.patch.object(jobs, "enqueue") as enqueue:
+            purge.run_purge_job(job.id)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.last_error), ("pending", 1, "db hiccup"))
+            self.assertEqual(job.progress["likes"], 1)
+            self.assertTrue(Post.all_objects.filter(pk=self.post.pk).exists())
+            # The retry is queued with backoff under the same dedup key
+            enqueue.assert_called_once_with(
+                purge.run_purge_job, job.id, delay=purge.RETRY_BASE_DELAY, dedup_key=f"purge:{job.id}"
+            )
+
+            with self.captureOnCommitCallbacks(execute=True):
+                purge.run_purge_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("done", 2))
+        self.assertEqual(job.progress["likes"], 1)  # deleted rows aren't counted twice
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+
+    def test_gives_up_after_max_attempts(self):
+        job = self.delete()
+        with mock.patch.object(purge, "purge_post_rows", side_effect=RuntimeError("still down")), \
+                mock.patch.object(jobs, "enqueue") as enqueue:
+            for _ in range(purge.MAX_ATTEMPTS):
+                purge.run_purge_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", purge.MAX_ATTEMPTS))
+        self.assertEqual(enqueue.call_count, purge.MAX_ATTEMPTS - 1)
+        self.assertEqual(
+            [c.kwargs["delay"] for c in enqueue.call_args_list],
+            [purge.RETRY_BASE_DELAY * 2 ** i for i in range(purge.MAX_ATTEMPTS - 1)],
+        )
+
+    def test_resume_requeues_interrupted_jobs(self):
+        job = self.delete()
+        PurgeJob.objects.filter(pk=job.pk).update(status="running")
+        with self.settings(JOBS_EAGER=True):
+            purge.resume_purge_jobs()  # recently updated: still considered in progress
+            self.assertTrue(Post.all_objects.filter(pk=self.post.pk).exists())
+
+            PurgeJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=11))
+            with self.captureOnCommitCallbacks(execute=True):
+                purge.resume_purge_jobs()
+        self.assertEqual(PurgeJob.objects.get(pk=job.pk).status, "done")
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+
+
+class PostUploadTests(ApiTestCase):
+    """POST /posts/ and /async/posts/: content-addressed originals, no post on failed uploads."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice = self.make_user("alice")
+        self.client = self.client_for(self.alice)
+
+    def upload(self, *contents, path="/api/posts/"):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        files = [SimpleUploadedFile(f"{i}.jpg", data, content_type="image/jpeg") for i, data in enumerate(contents)]
+        return self.client.post(path, {"caption": "hi", "media": files}, format="multipart")
+
+    def test_identical_files_share_one_blob(self):
+        self.assertEqual(self.upload(b"same").status_code, 201)
+        self.assertEqual(self.upload(b"same", path="/api/async/posts/").status_code, 201)
+        [obj] = MediaObject.objects.all()
+        self.assertEqual(obj.ref_count, 2)
+        self.assertEqual(list(self.storage.objects), [obj.path])
+        self.assertEqual({p.media[0]["path"] for p in Post.objects.all()}, {obj.path})
+
+    def test_failed_upload_creates_no_post(self):
+        real_put = self.storage.put
+        puts = []
+
+        def second_fails(path, file_obj, upsert=False):
+            puts.append(path)
+            return len(puts) < 2 and real_put(path, file_obj, upsert)
+
+        for path in ("/api/posts/", "/api/async/posts/"):
+            puts.clear()
+            with mock.patch.object(self.storage, "put", second_fails):
+                self.assertEqual(self.upload(b"one", b"two", path=path).status_code, 502)
+            # The original that did go up is released again
+            self.assertFalse(Post.objects.exists())
+            self.assertFalse(MediaObject.objects.exists())
+            self.assertEqual(self.storage.objects, {})
+
+    @override_settings(JOBS_EAGER=True)
+    def test_media_jobs_get_json_arguments(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        with mock.patch("api.media.process_media_item", side_effect=lambda item: item) as process:
+            for path in ("/api/posts/", "/api/async/posts/"):
+                self.assertEqual(self.upload(b"one", path=path).status_code, 201)
+            for path in ("/api/stories/", "/api/async/stories/"):
+                story = SimpleUploadedFile("s.jpg", b"story", content_type="image/jpeg")
+                self.assertEqual(self.client.post(path, {"file": story}, format="multipart").status_code, 201)
+        self.assertEqual(process.call_count, 4)
+
+    def test_empty_file_is_rejected(self):
+        for path in ("/api/posts/", "/api/async/posts/"):
+            self.assertEqual(self.upload(b"", path=path).status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+
+class ResumableUploadTests(ApiTestCase):
+    """tus-style /uploads/: offsets, resuming after a dropped chunk, finalize and claim."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(RESUMABLE_UPLOAD_DIR=tmp.name))
+        self.storage = self.memory_storage()
+        self.alice = self.make_user("alice")
+        self.client = self.client_for(self.alice)
+
+    def start(self, length=10, purpose="story"):
+        response = self.client.post("/api/uploads/", {
+            "purpose": purpose, "filename": "clip.mp4", "content_type": "video/mp4", "length": length,
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Upload-Offset"], "0")
+        return f"/api/uploads/{response.json()['id']}/"
+
+    def patch(self, url, offset, body):
+        return self.client.generic("PATCH", url, body, content_type="application/offset+octet-stream",
+                                   HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_resume_after_dropped_chunk(self):
+        url = self.start()
+        self.assertEqual(self.patch(url, 0, b"01234")["Upload-Offset"], "5")
+        # The client lost the response and retries from 0: told where to resume
+        conflict = self.patch(url, 0, b"01234")
+        self.assertEqual((conflict.status_code, conflict["Upload-Offset"]), (409, "5"))
+        self.assertEqual(self.client.head(url)["Upload-Offset"], "5")
+        self.assertEqual(self.client.post(f"{url}finalize/").status_code, 400)  # incomplete
+
+        self.assertEqual(self.patch(url, 5, b"56789extra").status_code, 204)
+        finalized = self.client.post(f"{url}finalize/").json()
+        self.assertEqual((finalized["status"], finalized["offset"]), ("complete", 10))
+        [blob] = self.storage.objects.values()
+        self.assertEqual(blob, b"0123456789")  # bytes past the length are dropped
+        self.assertEqual(os.listdir(settings.RESUMABLE_UPLOAD_DIR), [])
+        self.assertEqual(self.patch(url, 10, b"x").status_code, 400)  # finalized
+
+    def test_claim_attaches_once(self):
+        url = self.start(length=3)
+        self.patch(url, 0, b"abc")
+        upload_id = self.client.post(f"{url}finalize/").json()["upload_id"]
+
+        bob = self.client_for(self.make_user("bob"))
+        self.assertEqual(bob.get(url).status_code, 404)
+        self.assertEqual(bob.post("/api/stories/", {"upload_id": upload_id}).status_code, 400)
+
+        self.assertEqual(self.client.post("/api/stories/", {"upload_id": upload_id}).status_code, 201)
+        self.assertEqual(Story.objects.get().media["path"], next(iter(self.storage.objects)))
+        self.assertEqual(self.client.post("/api/stories/", {"upload_id": upload_id}).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 400)  # attached
+
+    def test_chunk_streams_without_the_lock(self):
+        from . import uploads
+
+        url = self.start()
+        session_id = url.split("/")[-2]
+
+        class RacingStream(BytesIO):
+            """Another request appends at the same offset while this body is still arriving."""
+            def read(inner, size=-1):
+                if not inner.tell():
+                    uploads.append_chunk(session_id, self.alice, 0, BytesIO(b"01234"))
+                return super().read(size)
+
+        with self.assertRaises(uploads.OffsetMismatch) as raised:
+            uploads.append_chunk(session_id, self.alice, 0, RacingStream(b"xxxxx"))
+        self.assertEqual(raised.exception.offset, 5)
+        with open(uploads.temp_path(UploadSession.objects.get()), "rb") as fh:
+            self.assertEqual(fh.read(), b"01234")
+        self.assertEqual(os.listdir(settings.RESUMABLE_UPLOAD_DIR), [f"{session_id}.part"])
+
+    def test_concurrent_finalize_stores_once(self):
+        from . import media, uploads
+
+        url = self.start(length=3)
+        self.patch(url, 0, b"abc")
+        session_id = url.split("/")[-2]
+        store_upload = media.store_upload
+
+        def racing_store(*args):
+            # The storage upload runs unlocked; another finalize completes meanwhile
+            with mock.patch("api.uploads.store_upload", store_upload):
+                uploads.finalize(session_id, self.alice)
+            return store_upload(*args)
+
+        with mock.patch("api.uploads.store_upload", side_effect=racing_store):
+            session = uploads.finalize(session_id, self.alice)
+        self.assertEqual(session.status, "complete")
+        self.assertEqual(MediaObject.objects.get().ref_count, 1)
+        self.assertEqual(len(self.storage.objects), 1)
+
+    def test_message_claim_rolls_back_with_the_send(self):
+        url = self.start(length=3, purpose="message")
+        self.patch(url, 0, b"abc")
+        upload_id = self.client.post(f"{url}finalize/").json()["upload_id"]
+        bob = self.make_user("bob")
+
+        with mock.patch("api.serializers.MessageSerializer.save", side_effect=DatabaseError("down")), \
+                self.assertRaises(DatabaseError):
+            self.client.post("/api/messages/", {"receiver": bob.id, "upload_id": upload_id})
+        self.assertEqual(UploadSession.objects.get().status, "complete")  # can be sent again
+
+        response = self.client.post("/api/messages/", {"receiver": bob.id, "upload_id": upload_id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Message.objects.get().media_path, next(iter(self.storage.objects)))
+        self.assertEqual(UploadSession.objects.get().status, "attached")
+
+    def test_failed_message_upload_is_rejected(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        bob = self.make_user("bob")
+        with mock.patch.object(self.storage, "put", return_value=False):
+            for path in ("/api/messages/", "/api/async/messages/"):
+                response = self.client.post(path, {
+                    "receiver": bob.id, "text": "hi", "media": SimpleUploadedFile("notes.pdf", b"pdf"),
+                }, format="multipart")
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Message.objects.exists())
+
+    def test_abort_and_limits(self):
+        url = self.start()
+        self.patch(url, 0, b"01")
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.head(url).status_code, 404)
+        self.assertEqual(os.listdir(settings.RESUMABLE_UPLOAD_DIR), [])
+
+        for data in ({"purpose": "avatar", "filename": "a.jpg", "length": 1},
+                     {"purpose": "post", "filename": "a.txt", "length": 1},
+                     {"purpose": "post", "filename": "a.jpg", "length": settings.RESUMABLE_UPLOAD_MAX_SIZE + 1}):
+            self.assertEqual(self.client.post("/api/uploads/", data, format="json").status_code, 400)
+
+
+class StoryCleanupTests(ApiTestCase):
+    """services.cleanup_expired_stories: batched delete + one release per story."""
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+        from .media import store_upload
+
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice = self.make_user("alice")
+
+        def story(data, hours):
+            item = store_upload(ContentFile(data, name="s.jpg"), f"stories/{self.alice.id}", "image")
+            return Story.objects.create(user=self.alice, media=item, media_type="image",
+                                        expires_at=timezone.now() + timedelta(hours=hours))
+
+        self.shared = [story(b"shared", -2), story(b"shared", -1)]
+        # The same bytes are also a live post
+        Post.objects.create(user=self.alice, media=[
+            store_upload(ContentFile(b"shared", name="p.jpg"), f"posts/{self.alice.id}", "image")
+        ])
+        self.unique = story(b"unique", -1)
+        self.live = story(b"live", 5)
+
+    def test_releases_each_expired_story_once(self):
+        with mock.patch("api.services.CLEANUP_BATCH_SIZE", 2):
+            services.cleanup_expired_stories()
+        services.cleanup_expired_stories()  # nothing left: no second release
+
+        self.assertEqual(list(Story.objects.all()), [self.live])
+        shared = MediaObject.objects.get(path=self.shared[0].media["path"])
+        self.assertEqual(shared.ref_count, 1)  # the post's reference
+        self.assertFalse(MediaObject.objects.filter(path=self.unique.media["path"]).exists())
+        self.assertEqual(
+            sorted(self.storage.objects), sorted([shared.path, self.live.media["path"]])
+        )
+
+
+class BulkFollowRequestTests(ApiTestCase):
+    """accept_bulk / reject_bulk (follow_requests.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = self.make_user("alice", private=True)
+        self.senders = [self.make_user(name) for name in ("bob", "carol", "dave")]
+        self.requests = [FriendRequest.objects.create(sender=u, receiver=self.alice) for u in self.senders]
+        self.client = self.client_for(self.alice)
+
+    def follows(self):
+        return set(Follower.objects.values_list("follower__username", "followed__username"))
+
+    def test_reject_some_accept_the_rest(self):
+        dave_request = self.requests[2]
+        response = self.client.post("/api/friend-requests/reject_bulk/", {"ids": [dave_request.id]}, format="json")
+        self.assertEqual(response.json()["rejected"], 1)
+
+        response = self.client.post("/api/friend-requests/accept_bulk/", {"all": True}, format="json")
+        self.assertEqual(response.json()["accepted"], 2)
+        self.assertEqual(self.follows(), {
+            ("bob", "alice"), ("alice", "bob"), ("carol", "alice"), ("alice", "carol"),
+        })
+        profile = UserProfile.objects.get(user=self.alice)
+        self.assertEqual((profile.followers_count, profile.following_count), (2, 2))
+
+        # Answered requests are left alone
+        response = self.client.post("/api/friend-requests/accept_bulk/", {"ids": [dave_request.id]}, format="json")
+        self.assertEqual(response.json()["accepted"], 0)
+        self.assertNotIn(("dave", "alice"), self.follows())
+
+    def test_batch_skips_requests_answered_meanwhile(self):
+        from . import follow_requests
+
+        rows = [(r.id, r.sender_id) for r in self.requests]
+        FriendRequest.objects.filter(pk=self.requests[0].pk).update(status="rejected")  # after rows were read
+        self.assertEqual(follow_requests._accept_batch(self.alice.id, rows), 2)
+        self.assertFalse({("bob", "alice"), ("alice", "bob")} & self.follows())
+        self.assertEqual(UserProfile.objects.get(user=self.senders[0]).following_count, 0)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_large_accept_all_is_queued(self):
+        with mock.patch("api.follow_requests.BATCH_SIZE", 2):
+            response = self.client.post("/api/friend-requests/accept_bulk/", {"all": True}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(FriendRequest.objects.filter(status="pending").exists())
+        self.assertEqual(len(self.follows()), 6)
+
+    def test_only_own_requests_and_valid_ids(self):
+        bob = self.client_for(self.senders[0])
+        response = bob.post("/api/friend-requests/accept_bulk/", {"ids": [self.requests[1].id]}, format="json")
+        self.assertEqual(response.json()["accepted"], 0)
+        for body in ({}, {"ids": []}, {"ids": ["x"]}, {"all": "yes"}):
+            self.assertEqual(self.client.post("/api/friend-requests/reject_bulk/", body, format="json").status_code, 400)
+        self.assertEqual(FriendRequest.objects.filter(status="pending").count(), 3)
+
+
+class ReplicaRoutingTests(ExtraDatabasesMixin, ApiTestCase):
+    """ReplicaRouter + ReplicaRoutingMiddleware with a primary and one (lagging) replica file."""
+    extra_databases = ("replica_0",)
+
+    @classmethod
+    def migrate(cls, alias):
+        from .db_routing import ReplicaRouter
+
+        # Real replicas copy the primary and are never migrated; this one is a
+        # plain file, so create the schema (data migrations have nothing to do)
+        def schema_only(self, db, app_label, model_name=None, **hints):
+            return model_name is not None
+
+        with mock.patch.object(ReplicaRouter, "allow_migrate", schema_only):
+            super().migrate(alias)
+
+    def setUp(self):
+        from . import db_routing
+
+        super().setUp()
+        db_routing._health.clear()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        for obj in (self.alice, self.bob, self.alice.profile, self.bob.profile):
+            obj.save(using="replica_0")
+        # The replica hasn't caught up with bob's last edit yet
+        UserProfile.objects.filter(user=self.bob).update(bio="new")
+        UserProfile.objects.using("replica_0").filter(user=self.bob).update(bio="old")
+
+    def bio(self, client):
+        return client.get("/api/profiles/bob/").json()["bio"]
+
+    def test_router(self):
+        from django.contrib.sessions.models import Session
+        from .db_routing import ReplicaRouter, use_replicas
+
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(UserProfile), "default")  # jobs, commands
+        with use_replicas():
+            self.assertEqual(router.db_for_read(UserProfile), "replica_0")
+            self.assertEqual(router.db_for_read(Session), "default")
+            self.assertEqual(router.db_for_write(UserProfile), "default")
+
+    def test_reads_your_writes(self):
+        from .db_routing import PIN_COOKIE
+
+        client = self.client_for(self.alice)
+        self.assertEqual(self.bio(client), "old")
+        self.assertEqual(client.post(f"/api/followers/{self.bob.id}/follow/").status_code, 200)
+        self.assertIn(PIN_COOKIE, client.cookies)
+        self.assertEqual(self.bio(client), "new")
+
+        # The app sends no cookies: pinned by its X-Session-ID
+        app = APIClient(HTTP_X_SESSION_ID=client.defaults["HTTP_X_SESSION_ID"])
+        self.assertEqual(self.bio(app), "new")
+        self.assertEqual(self.bio(self.client_for(self.bob)), "old")  # others aren't pinned
+
+        cache.clear()  # the pin expired
+        self.assertEqual(self.bio(app), "old")
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        from django.db import OperationalError, connections
+        from . import db_routing
+
+        router, client = db_routing.ReplicaRouter(), self.client_for(self.alice)
+        with mock.patch.object(connections["replica_0"], "ensure_connection",
+                               side_effect=OperationalError("down")) as check:
+            with db_routing.use_replicas():
+                self.assertEqual(router.db_for_read(UserProfile), "default")
+                self.assertEqual(router.db_for_read(UserProfile), "default")
+            self.assertEqual(self.bio(client), "new")
+        self.assertEqual(check.call_count, 1)  # not re-checked during the cool-down
+
+        # Checked again once the cool-down is over, and back in rotation
+        db_routing._health["replica_0"] = (False, time.monotonic() - settings.REPLICA_HEALTH_CHECK_INTERVAL)
+        with db_routing.use_replicas():
+            self.assertEqual(router.db_for_read(UserProfile), "replica_0")
+
+
+@override_settings(MESSAGE_SEGMENT_SIZE=4, MESSAGE_ARCHIVE_AFTER_DAYS=30)
+class MessageArchiveEndpointTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice = self.make_user("alice")
+        self.bob = self.make_user("bob")
+        self.low, self.high = archive.conversation(self.alice.id, self.bob.id)
+        self.cutoff = timezone.now() - timedelta(days=30)
+
+    def chat(self, old=15, live=10):
+        """`old` messages from before the cutoff and `live` after it, one minute apart."""
+        now = timezone.now()
+        texts = []
+        for i in range(old + live):
+            sender, receiver = (self.alice, self.bob) if i % 2 else (self.bob, self.alice)
+            msg = Message.objects.create(sender=sender, receiver=receiver, text=f"m{i}")
+            age = timedelta(days=60) if i < old else timedelta(days=1)
+            Message.objects.filter(pk=msg.pk).update(created_at=now - age + timedelta(minutes=i))
+            texts.append(msg.text)
+        return texts
+
+    def run_archive(self):
+        return archive.archive_conversation(self.low, self.high, self.cutoff.isoformat())
+
+    def archived_texts(self):
+        segments = MessageSegment.objects.filter(user_low=self.low, user_high=self.high).order_by("first_at")
+        return [row["text"] for segment in segments for row in archive.read_segment(segment)]
+
+    def test_old_messages_are_packed_into_segments(self):
+        texts = self.chat()
+        self.assertEqual(self.run_archive(), 15)
+
+        segments = MessageSegment.objects.order_by("first_at")
+        self.assertEqual([s.message_count for s in segments], [4, 4, 4, 3])
+        for segment in segments:
+            self.assertTrue(segment.path.startswith(f"messages/archive/{self.low}-{self.high}/"))
+            self.assertIn(segment.path, self.storage.objects)
+            self.assertLessEqual(segment.first_at, segment.last_at)
+        self.assertEqual(self.archived_texts(), texts[:15])
+        self.assertEqual(
+            list(Message.objects.order_by("created_at").values_list("text", flat=True)), texts[15:]
+        )
+
+    @override_settings(JOBS_EAGER=True)
+    def test_periodic_run_archives_every_old_conversation(self):
+        self.chat(old=3, live=1)
+        carol = self.make_user("carol")
+        Message.objects.filter(pk=Message.objects.create(sender=carol, receiver=self.alice, text="hi").pk).update(
+            created_at=timezone.now() - timedelta(days=90)
+        )
+        archive.archive_old_messages()
+        self.assertEqual(MessageSegment.objects.count(), 2)
+        self.assertEqual(Message.objects.count(), 1)
+
+    def test_rerun_is_a_noop(self):
+        texts = self.chat()
+        self.run_archive()
+        paths = set(MessageSegment.objects.values_list("path", flat=True))
+
+        self.assertEqual(self.run_archive(), 0)
+        self.assertEqual(set(MessageSegment.objects.values_list("path", flat=True)), paths)
+        self.assertEqual(self.archived_texts(), texts[:15])
+
+    def test_rerun_after_a_failed_delete_does_not_duplicate(self):
+        texts = self.chat()
+        real_delete = QuerySet.delete
+        calls = []
+
+        def flaky_delete(queryset):
+            calls.append(queryset.model)
+            if len(calls) == 2:
+                raise RuntimeError("connection lost")
+            return real_delete(queryset)
+
+        with mock.patch.object(QuerySet, "delete", flaky_delete):
+            with self.assertRaises(RuntimeError):
+                self.run_archive()
+        # The second segment was uploaded and indexed but its rows are still live
+        self.assertEqual(MessageSegment.objects.count(), 2)
+        self.assertEqual(Message.objects.count(), 21)
+
+        self.assertEqual(self.run_archive(), 11)
+        self.assertEqual([s.message_count for s in MessageSegment.objects.order_by("first_at")], [4, 4, 4, 3])
+        self.assertEqual(self.archived_texts(), texts[:15])
+        self.assertEqual(Message.objects.count(), 10)
+
+    def test_rerun_after_a_failed_upload_picks_up_where_it_stopped(self):
+        texts = self.chat()
+        real_put = self.storage.put
+        uploads = []
+
+        def flaky_put(path, content, **kwargs):
+            uploads.append(path)
+            return len(uploads) != 2 and real_put(path, content, **kwargs)
+
+        with mock.patch.object(self.storage, "put", flaky_put):
+            with self.assertRaises(RuntimeError):
+                self.run_archive()
+        self.assertEqual(MessageSegment.objects.count(), 1)
+        self.assertEqual(Message.objects.count(), 21)
+
+        self.assertEqual(self.run_archive(), 11)
+        self.assertEqual(self.archived_texts(), texts[:15])
+
+    def test_chat_pages_back_across_the_archive(self):
+        texts = self.chat()
+        self.run_archive()
+        client = self.client_for(self.alice)
+
+        first = client.get(f"/api/messages/chat/{self.bob.id}/")
+        self.assertEqual(first.status_code, 200)
+        # Oldest first within the page: ten archived messages, then the ten live ones
+        self.assertEqual([m["text"] for m in first.data["results"]], texts[5:])
+        self.assertIn("cursor=", first.data["next"])
+
+        second = client.get(first.data["next"])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual([m["text"] for m in second.data["results"]], texts[:5])
+        self.assertIsNone(second.data["next"])
+
+    def test_chat_page_cursor_at_the_boundary(self):
+        texts = self.chat()
+        self.run_archive()
+        seen, cursor = [], None
+        while True:
+            page, cursor = archive.chat_page(self.alice, self.bob, cursor=cursor, page_size=10)
+            seen = [m.text for m in page] + seen
+            if not cursor:
+                break
+        # The first page ends exactly on the last live row
+        self.assertEqual(seen, texts)
+
+    def test_tampered_cursor_is_rejected(self):
+        self.chat(old=0, live=1)
+        response = self.client_for(self.alice).get(f"/api/messages/chat/{self.bob.id}/", {"cursor": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTests(ApiTestCase):
+    """/api/async/...: the ASGI twins answer like the DRF endpoints they mirror."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = self.memory_storage()
+        self.alice = self.make_user("alice")
+        self.bob = self.make_user("bob", private=True)
+        self.as_alice = self.client_for(self.alice)
+
+    def image(self, name="a.jpg", data=b"jpeg"):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return SimpleUploadedFile(name, data, content_type="image/jpeg")
+
+    def test_session_is_required(self):
+        for path in ("/api/async/posts/", "/api/async/messages/", "/api/async/stories/"):
+            self.assertEqual(APIClient().post(path).status_code, 401)
+        self.assertEqual(APIClient(HTTP_X_SESSION_ID="nope").get("/api/async/profiles/bob/").status_code, 401)
+
+    def test_wrong_method(self):
+        self.assertEqual(self.as_alice.get("/api/async/posts/").status_code, 405)
+        self.assertEqual(self.as_alice.post("/api/async/profiles/bob/").status_code, 405)
+
+    def test_create_story(self):
+        response = self.as_alice.post("/api/async/stories/", {"file": self.image()}, format="multipart")
+        self.assertEqual(response.status_code, 201)
+        story = Story.objects.get()
+        self.assertEqual((story.user, story.media_type), (self.alice, "image"))
+        self.assertIn(story.media["path"], self.storage.objects)
+        self.assertGreater(story.expires_at, timezone.now() + timedelta(hours=23))
+
+        bad = self.as_alice.post("/api/async/stories/", {"file": self.image("a.txt")}, format="multipart")
+        self.assertEqual(bad.status_code, 400)
+
+    def test_send_message_with_media(self):
+        response = self.as_alice.post(
+            "/api/async/messages/", {"receiver": self.bob.id, "text": "hi", "media": self.image()}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 201)
+        msg = Message.objects.get()
+        self.assertEqual((msg.sender, msg.receiver, msg.text), (self.alice, self.bob, "hi"))
+        self.assertIn(msg.media_path, self.storage.objects)
+        self.assertEqual(response.json()["receiver"]["username"], "bob")
+
+    def test_send_message_validation(self):
+        self.assertEqual(self.as_alice.post("/api/async/messages/", {"text": "hi"}).status_code, 400)
+        missing = self.as_alice.post("/api/async/messages/", {"receiver": 999999, "text": "hi"})
+        self.assertEqual(missing.status_code, 404)
+        self.assertFalse(Message.objects.exists())
+
+    def test_upload_profile_picture(self):
+        version = counters.profile_version(self.alice.id)
+        response = self.as_alice.post(
+            "/api/async/profiles/upload-picture/", {"profile_pic": self.image("me.png")}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 200)
+        path = UserProfile.objects.get(user=self.alice).profile_pic_path
+        self.assertEqual(path, f"profiles/{self.alice.id}/profile_pic.png")
+        self.assertIn(path, self.storage.objects)
+        self.assertNotEqual(counters.profile_version(self.alice.id), version)
+
+        video = self.as_alice.post(
+            "/api/async/profiles/upload-picture/", {"profile_pic": self.image("me.mp4")}, format="multipart"
+        )
+        self.assertEqual(video.status_code, 400)
+
+    def test_profile_detail_matches_drf(self):
+        Post.objects.create(user=self.bob, caption="private")
+        drf = self.as_alice.get("/api/profiles/bob/").json()
+        response = self.as_alice.get("/api/async/profiles/bob/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data) - {"recent_posts"}, set(drf))
+        # Private and not followed: no posts
+        self.assertEqual(data["recent_posts"], [])
+        self.assertEqual(self.as_alice.get("/api/async/profiles/nobody/").status_code, 404)
+
+    def test_profile_detail_recent_posts_when_following(self):
+        Post.objects.create(user=self.bob, caption="one")
+        Post.objects.create(user=self.bob, caption="two")
+        Follower.objects.create(follower=self.alice, followed=self.bob)
+        data = self.as_alice.get("/api/async/profiles/bob/").json()
+        self.assertEqual([p["caption"] for p in data["recent_posts"]], ["two", "one"])
+
+    @override_settings(THROTTLE_CAPACITY=4)
+    def test_throttled(self):
+        # Sending costs 2 units, so the third message in a burst is refused
+        codes = [self.as_alice.post("/api/async/messages/", {"receiver": self.bob.id}).status_code for _ in range(3)]
+        self.assertEqual(codes, [201, 201, 429])
+
+
+class ExploreRankingTests(ApiTestCase):
+    """explore.compute_scores / refresh_explore and GET /posts/explore/."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        self.fans = [self.make_user(f"fan{i}") for i in range(4)]
+        self.now = timezone.now()
+
+    def engage(self, post, hours_ago, likes=0, comments=0):
+        at = self.now - timedelta(hours=hours_ago)
+        for fan in self.fans[:likes]:
+            Like.objects.filter(pk=Like.objects.create(post=post, user=fan).pk).update(created_at=at)
+        for fan in self.fans[:comments]:
+            Comment.objects.filter(pk=Comment.objects.create(post=post, user=fan, text="nice").pk).update(created_at=at)
+
+    def test_recent_engagement_outranks_older(self):
+        fresh, stale = Post.objects.create(user=self.bob), Post.objects.create(user=self.bob)
+        self.engage(fresh, hours_ago=0.5, likes=2)
+        self.engage(stale, hours_ago=100, likes=4)
+        ranked = explore.compute_scores(self.now)
+        self.assertEqual([post_id for post_id, _ in ranked], [fresh.id, stale.id])
+        weights = explore.band_weights()
+        self.assertAlmostEqual(ranked[0][1], 2 * weights[0])
+        self.assertAlmostEqual(ranked[1][1], 4 * weights[4])
+
+    def test_comments_weigh_more_than_likes(self):
+        liked, commented = Post.objects.create(user=self.bob), Post.objects.create(user=self.bob)
+        self.engage(liked, hours_ago=2, likes=3)
+        self.engage(commented, hours_ago=2, comments=2)
+        self.assertEqual([post_id for post_id, _ in explore.compute_scores(self.now)], [commented.id, liked.id])
+
+    def test_old_private_and_deleted_posts_are_left_out(self):
+        carol = self.make_user("carol", private=True)
+        old, private, deleted = (Post.objects.create(user=u) for u in (self.bob, carol, self.bob))
+        self.engage(old, hours_ago=200, likes=4)
+        self.engage(private, hours_ago=1, likes=4)
+        self.engage(deleted, hours_ago=1, likes=4)
+        Post.all_objects.filter(pk=deleted.pk).update(deleted_at=self.now)
+        self.assertEqual(explore.compute_scores(self.now), [])
+
+    def test_refresh_replaces_the_table(self):
+        post = Post.objects.create(user=self.bob)
+        self.engage(post, hours_ago=1, likes=1)
+        explore.refresh_explore()
+        explore.refresh_explore()
+        [row] = ExploreRanking.objects.all()
+        self.assertEqual((row.post_id, row.rank), (post.id, 1))
+
+    def test_endpoint_pages_by_rank_and_filters(self):
+        carol = self.make_user("carol")
+        top, second, by_carol = (Post.objects.create(user=u, caption=c) for u, c in (
+            (self.bob, "top"), (self.bob, "second"), (carol, "carol's"),
+        ))
+        self.engage(top, hours_ago=1, likes=4)
+        self.engage(second, hours_ago=1, likes=2)
+        self.engage(by_carol, hours_ago=1, likes=3)
+        explore.refresh_explore()
+        as_alice = self.client_for(self.alice)
+
+        response = as_alice.get("/api/posts/explore/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p["caption"] for p in response.data["results"]], ["top", "carol's", "second"])
+
+        # Going private, being deleted or blocking applies before the next refresh
+        UserProfile.objects.filter(user=carol).update(is_private=True)
+        Post.all_objects.filter(pk=second.pk).update(deleted_at=timezone.now())
+        self.assertEqual([p["caption"] for p in as_alice.get("/api/posts/explore/").data["results"]], ["top"])
+        with self.captureOnCommitCallbacks(execute=True):
+            blocks.block(self.bob.id, self.alice.id)
+        self.assertEqual(as_alice.get("/api/posts/explore/").data["results"], [])
+
+
+class ContentSearchTests(ApiTestCase):
+    """GET /search/content/ over the FTS index that migration 0010 installs."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        self.as_alice = self.client_for(self.alice)
+
+    def search(self, q, **params):
+        response = self.as_alice.get("/api/search/content/", {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def captions(self, q):
+        return [p["caption"] for p in self.search(q).data["results"]]
+
+    def test_caption_and_comment_matches(self):
+        Post.objects.create(user=self.bob, caption="sunset at the beach")
+        commented = Post.objects.create(user=self.bob, caption="no words")
+        Comment.objects.create(post=commented, user=self.alice, text="what a sunset")
+        Post.objects.create(user=self.bob, caption="mountains")
+        # A caption match weighs more than a comment match
+        self.assertEqual(self.captions("sunset"), ["sunset at the beach", "no words"])
+        self.assertEqual(self.captions("sunset beach"), ["sunset at the beach"])
+        # The last word is a prefix: search-as-you-type
+        self.assertEqual(self.captions("mount"), ["mountains"])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(user=self.bob, caption="old words")
+        comment = Comment.objects.create(post=post, user=self.bob, text="kitten")
+        post.caption = "new words"
+        post.save()
+        self.assertEqual(self.captions("old"), [])
+        self.assertEqual(self.captions("new"), ["new words"])
+        comment.delete()
+        self.assertEqual(self.captions("kitten"), [])
+
+    def test_visibility(self):
+        carol = self.make_user("carol", private=True)
+        dave = self.make_user("dave", private=True)
+        Follower.objects.create(follower=self.alice, followed=dave)
+        for user in (self.alice, self.bob, carol, dave):
+            Post.objects.create(user=user, caption=f"hello from {user.username}")
+        Post.objects.create(user=self.bob, caption="hello deleted", deleted_at=timezone.now())
+        self.assertEqual(sorted(self.captions("hello")), ["hello from alice", "hello from bob", "hello from dave"])
+        with self.captureOnCommitCallbacks(execute=True):
+            blocks.block(self.bob.id, self.alice.id)
+        self.assertEqual(sorted(self.captions("hello")), ["hello from alice", "hello from dave"])
+
+    def test_paging(self):
+        for i in range(21):
+            Post.objects.create(user=self.bob, caption=f"cat {i}")
+        first = self.search("cat")
+        self.assertEqual(len(first.data["results"]), 20)
+        self.assertIn("page=2", first.data["next"])
+        second = self.as_alice.get(first.data["next"])
+        self.assertEqual(len(second.data["results"]), 1)
+        self.assertIsNone(second.data["next"])
+        seen = {p["id"] for p in first.data["results"] + second.data["results"]}
+        self.assertEqual(len(seen), 21)
+
+    def test_short_or_odd_queries(self):
+        Post.objects.create(user=self.bob, caption="a cat")
+        self.assertEqual(self.search("c").data, {"next": None, "results": []})
+        # FTS5 syntax is quoted away rather than passed through
+        self.assertEqual(self.captions('cat*" ('), ["a cat"])
+        self.assertEqual(self.captions("!!"), [])
+        self.assertEqual(self.as_alice.get("/api/search/content/", {"q": "cat", "page": "x"}).status_code, 400)
+
+    def test_repair_after_table_rebuild(self):
+        from django.db import connection
+        from . import search
+
+        Post.objects.create(user=self.bob, caption="before")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER api_post_fts_ai")
+        search.repair_sqlite_index()
+        Post.objects.create(user=self.bob, caption="after")
+        self.assertEqual(self.captions("before"), ["before"])
+        self.assertEqual(self.captions("after"), ["after"])
+
+
+class ProfileScreenTests(ApiTestCase):
+    """GET /profiles/<username>/screen/: header, relationship, story ring and first grid page."""
+
+    def setUp(self):
+        super().setUp()
+        self.memory_storage()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        self.as_alice = self.client_for(self.alice)
+
+    def screen(self, username="bob", client=None):
+        response = (client or self.as_alice).get(f"/api/profiles/{username}/screen/")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_public_profile(self):
+        for i in range(21):
+            Post.objects.create(user=self.bob, caption=f"p{i}", media=[{"path": f"posts/{i}.jpg", "type": "image"}])
+        Follower.objects.create(follower=self.bob, followed=self.alice)
+        data = self.screen()
+
+        self.assertEqual(data["profile"]["user"]["username"], "bob")
+        self.assertEqual(data["relationship"], {
+            "is_self": False, "is_following": False, "is_requested": False, "follows_you": True,
+        })
+        self.assertEqual(data["story"], {"active": False, "unseen": False})
+        self.assertTrue(data["posts"]["visible"])
+        self.assertEqual(len(data["posts"]["results"]), 20)
+        first = data["posts"]["results"][0]
+        self.assertEqual((first["media_count"], first["thumbnail"]["type"]), (1, "image"))
+        self.assertIn(f"/api/posts/user/{self.bob.id}/?page=2&size=thumbnail", data["posts"]["next"])
+
+    def test_private_profile(self):
+        carol = self.make_user("carol", private=True)
+        Post.objects.create(user=carol, caption="hidden")
+        data = self.screen("carol")
+        self.assertEqual(data["posts"], {"visible": False, "next": None, "results": []})
+        # Her own screen shows everything
+        own = self.screen("carol", client=self.client_for(carol))
+        self.assertTrue(own["relationship"]["is_self"])
+        self.assertEqual(len(own["posts"]["results"]), 1)
+
+    def test_story_ring(self):
+        story = Story.objects.create(user=self.bob, media={}, media_type="image")
+        Story.objects.create(user=self.bob, media={}, media_type="image", expires_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.screen()["story"], {"active": True, "unseen": True})
+        self.assertEqual(self.as_alice.post(f"/api/stories/{story.id}/mark_viewed/").status_code, 200)
+        self.assertEqual(self.screen()["story"], {"active": True, "unseen": False})
+
+    def test_cache_follows_profile_changes(self):
+        self.assertFalse(self.screen()["relationship"]["is_following"])
+        with self.assertNumQueries(2):  # only the session lookup: the screen comes from the cache
+            self.screen()
+
+        self.assertEqual(self.as_alice.post(f"/api/followers/{self.bob.id}/follow/").status_code, 200)
+        data = self.screen()
+        self.assertTrue(data["relationship"]["is_following"])
+        self.assertEqual(data["profile"]["followers_count"], 1)
+
+        Post.objects.create(user=self.bob, caption="new")
+        counters.post_added(self.bob.id)
+        self.assertEqual(len(self.screen()["posts"]["results"]), 1)
+
+    def test_unknown_profile(self):
+        self.assertEqual(self.as_alice.get("/api/profiles/nobody/screen/").status_code, 404)
+
+
+class AdminTests(ApiTestCase):
+    """Changelists that stay cheap on large tables, and the queued bulk actions."""
+
+    MODELS = ("userprofile", "follower", "friendrequest", "post", "comment", "like", "message", "story", "storyview")
+
+    def setUp(self):
+        super().setUp()
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin_user)
+        self.users = [self.make_user(f"u{i}") for i in range(3)]
+
+    def populate(self, n):
+        for i in range(n):
+            author, fan = self.users[i % 3], self.users[(i + 1) % 3]
+            post = Post.objects.create(user=author, caption=f"p{i}")
+            Like.objects.create(post=post, user=fan)
+            Comment.objects.create(post=post, user=fan, text="hi")
+            Message.objects.create(sender=author, receiver=fan, text="hi")
+            story = Story.objects.create(user=author, media={}, media_type="image")
+            StoryView.objects.create(story=story, viewer=fan)
+        Follower.objects.get_or_create(follower=self.users[0], followed=self.users[1])
+        FriendRequest.objects.get_or_create(sender=self.users[1], receiver=self.users[2])
+
+    def changelist_queries(self, model):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/admin/api/{model}/")
+        self.assertEqual(response.status_code, 200, model)
+        return len(ctx)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.populate(2)
+        few = {model: self.changelist_queries(model) for model in self.MODELS}
+        self.populate(6)
+        self.assertEqual({model: self.changelist_queries(model) for model in self.MODELS}, few)
+
+    def test_estimated_count(self):
+        from django.db import connection
+        from .admin import EstimatedCountPaginator
+
+        self.populate(2)
+        posts = Post.objects.order_by("-created_at")
+        self.assertEqual(EstimatedCountPaginator(posts, 50).count, 2)  # SQLite: exact
+        with mock.patch.object(connection, "vendor", "postgresql"):
+            with mock.patch("api.admin.planner_estimate", return_value=2_000_000):
+                self.assertEqual(EstimatedCountPaginator(posts, 50).count, 2_000_000)
+            # Small tables are counted exactly
+            with mock.patch("api.admin.planner_estimate", return_value=12):
+                self.assertEqual(EstimatedCountPaginator(posts, 50).count, 2)
+
+    def action(self, model, name, ids):
+        return self.client.post(f"/admin/api/{model}/", {"action": name, "_selected_action": [str(i) for i in ids]})
+
+    def test_post_delete_selected_is_replaced_by_purge(self):
+        self.populate(1)
+        post = Post.objects.get()
+        response = self.client.get("/admin/api/post/")
+        actions = [name for name, _ in response.context["action_form"].fields["action"].choices]
+        self.assertIn("delete_and_purge", actions)
+        self.assertNotIn("delete_selected", actions)
+
+        self.assertEqual(self.action("post", "delete_and_purge", [post.id]).status_code, 302)
+        self.assertIsNotNone(Post.all_objects.get(pk=post.pk).deleted_at)
+        self.assertTrue(PurgeJob.objects.filter(target_id=str(post.id)).exists())
+        # Tombstoned posts stay listed until purged
+        self.assertContains(self.client.get("/admin/api/post/"), str(post.id))
+
+    @override_settings(JOBS_EAGER=True)
+    def test_recompute_actions_run_as_jobs(self):
+        self.populate(1)
+        post = Post.objects.get()
+        profile = UserProfile.objects.get(user=post.user)
+        with mock.patch("api.admin.enqueue", wraps=jobs.enqueue) as enqueue:
+            self.action("post", "recompute_counters", [post.id])
+            self.action("userprofile", "recompute_counters", [profile.id])
+        self.assertEqual(enqueue.call_count, 2)
+        post.refresh_from_db()
+        profile.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count), (1, 1))
+        self.assertEqual(profile.posts_count, 1)
+
+    def test_purge_expired_stories_is_queued(self):
+        story = Story.objects.create(user=self.users[0], media={}, media_type="image")
+        with mock.patch("api.admin.enqueue") as enqueue:
+            self.action("story", "purge_expired", [story.id])
+        enqueue.assert_called_once_with(services.cleanup_expired_stories, dedup_key="admin:cleanup_expired_stories")
+
+
+@override_settings(JOBS_EAGER=True)
+class HashtagEndpointTests(ApiTestCase):
+    """/hashtags/: feed, autocomplete, trending, and the counts kept by edits and deletes."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = self.make_user("alice"), self.make_user("bob")
+        self.as_alice, self.as_bob = self.client_for(self.alice), self.client_for(self.bob)
+
+    def post(self, caption, user=None):
+        post = Post.objects.create(user=user or self.bob, caption=caption)
+        tags.index_post(post)
+        return post
+
+    def comment(self, post, text, parent=None):
+        data = {"post": str(post.id), "text": text}
+        if parent:
+            data["parent"] = str(parent)
+        response = self.as_alice.post("/api/comments/", data)
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def count(self, name):
+        return self.as_alice.get(f"/api/hashtags/{name}/").data["post_count"]
+
+    def test_feed_pages_newest_first_and_applies_privacy(self):
+        carol = self.make_user("carol", private=True)
+        posts = [self.post(f"#cats {i}") for i in range(25)]
+        self.post("#cats hidden", user=carol)
+        Post.objects.filter(pk=posts[0].pk).update(deleted_at=timezone.now())
+
+        first = self.as_alice.get("/api/hashtags/Cats/posts/")
+        self.assertEqual(first.status_code, 200)
+        second = self.as_alice.get(first.data["next"])
+        self.assertIsNone(second.data["next"])
+        captions = [p["caption"] for p in first.data["results"] + second.data["results"]]
+        self.assertEqual(captions, [f"#cats {i}" for i in range(24, 0, -1)])
+        self.assertEqual(self.as_alice.get("/api/hashtags/dogs/posts/").status_code, 404)
+
+    def test_autocomplete_by_post_count(self):
+        self.post("#cat #catnip")
+        self.post("#catnip")
+        self.post("#dog")
+        response = self.as_alice.get("/api/hashtags/autocomplete/", {"q": "#Cat"})
+        self.assertEqual(response.data, [{"name": "catnip", "post_count": 2}, {"name": "cat", "post_count": 1}])
+        self.assertEqual(self.as_alice.get("/api/hashtags/autocomplete/", {"q": "#"}).data, [])
+
+    def test_trending(self):
+        self.post("#sun #sea")
+        self.post("#sun")
+        self.assertEqual(self.as_alice.get("/api/hashtags/trending/").data, [
+            {"name": "sun", "uses": 2}, {"name": "sea", "uses": 1},
+        ])
+        self.assertEqual(self.as_alice.get("/api/hashtags/trending/", {"hours": "x"}).status_code, 400)
+
+    def test_caption_edit_reindexes(self):
+        post = self.post("#old #kept")
+        response = self.as_bob.patch(f"/api/posts/{post.id}/", {"caption": "#kept #new"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((self.count("old"), self.count("kept"), self.count("new")), (0, 1, 1))
+        self.assertEqual(self.as_alice.get("/api/hashtags/old/posts/").data["results"], [])
+
+    def test_caption_edit_keeps_tags_a_comment_uses(self):
+        post = self.post("#shared")
+        self.comment(post, "love this #shared")
+        self.as_bob.patch(f"/api/posts/{post.id}/", {"caption": "no tags"})
+        self.assertEqual(self.count("shared"), 1)
+        self.assertEqual(len(self.as_alice.get("/api/hashtags/shared/posts/").data["results"]), 1)
+
+    def test_comment_delete_releases_its_tags(self):
+        post = self.post("#caption")
+        top = self.comment(post, "#fromcomment #caption")
+        self.comment(post, "reply #fromreply", parent=top)
+        self.assertEqual((self.count("fromcomment"), self.count("fromreply")), (1, 1))
+
+        self.assertEqual(self.as_alice.delete(f"/api/comments/{top}/").status_code, 204)
+        self.assertEqual(
+            (self.count("caption"), self.count("fromcomment"), self.count("fromreply")), (1, 0, 0)
+        )
+        self.assertFalse(PostHashtag.objects.filter(hashtag__name="fromcomment").exists())
+
+    def test_purge_unlinks_the_post(self):
+        post = self.post("#gone")
+        self.comment(post, "#alsogone")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.as_bob.delete(f"/api/posts/{post.id}/").status_code, 204)
+        self.assertEqual(PurgeJob.objects.get().status, "done")
+        self.assertEqual((self.count("gone"), self.count("alsogone")), (0, 0))
+        self.assertFalse(PostHashtag.objects.exists())
+
+    def test_account_erasure_releases_comment_tags(self):
+        self.memory_storage()
+        post = self.post("#bobs")
+        self.comment(post, "#alices")
+        purge.erase_account(self.alice)
+        counts = dict(Hashtag.objects.values_list("name", "post_count"))
+        self.assertEqual((counts["bobs"], counts["alices"]), (1, 0))
+        self.assertEqual(list(post.hashtags.values_list("hashtag__name", flat=True)), ["bobs"])
+
+
+class ColdStartTests(SimpleTestCase):
+    """Web process boot (settings + URLconf) must stay cheap; see api/utils/lazy.py."""
+
+    # Generous for slow CI boxes; tighten locally with IMPORT_TIME_BUDGET_MS
+    BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", 1000))
+    # Heavy or rarely needed modules that must load on first use, not at boot
+    DEFERRED_MODULES = ("httpx", "supabase", "PIL", "numpy", "blurhash", "api.purge", "api.utils.storage_gateway")
+    BOOT = "import django; django.setup(); import instagram.urls"
+
+    def profile_boot(self):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "instagram.settings"}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", self.BOOT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            # Nested imports are indented; top-level cumulatives add up to the total
+            modules[name.strip()] = (int(cumulative), not name.startswith("  "))
+        return modules
+
+    def test_boot_import_time(self):
+        modules = self.profile_boot()
+        total_ms = sum(us for us, top_level in modules.values() if top_level) / 1000
+        slowest = sorted(((us, name) for name, (us, top) in modules.items() if top), reverse=True)[:5]
+        self.assertLessEqual(total_ms, self.BUDGET_MS, f"boot imports took {total_ms:.0f} ms; slowest: {slowest}")
+
+    def test_heavy_modules_are_deferred(self):
+        modules = self.profile_boot()
+        eager = [name for name in self.DEFERRED_MODULES if name in modules]
+        self.assertEqual(eager, [], "imported at boot; import them where they are used instead")
@@ -0,0 +1,130 @@
+# backend/api/throttling.py
+"""
+Weighted token-bucket rate limiting.
+
+Every client (session user, or IP for anonymous calls) owns a bucket of
+THROTTLE_CAPACITY tokens refilled at THROTTLE_REFILL_PER_SECOND. A request
+spends its endpoint's cost: views declare `throttle_costs = {action: cost}`
+(or `throttle_cost` for plain API views); anything else costs
+THROTTLE_DEFAULT_COSTS['read' | 'write']. An empty bucket answers 429 with
+Retry-After set to when enough tokens will be back.
+
+With REDIS_URL set, buckets live in Redis and are updated by one Lua script,
+so all web processes enforce one limit and concurrent requests can't both
+spend the same tokens. Otherwise the cache is per-process memory and a lock
+does the same job. If Redis is unreachable, a per-process table takes over
+instead of failing the request.
+
+Anonymous clients are told apart by REMOTE_ADDR, or by the X-Forwarded-For
+hop the last REST_FRAMEWORK['NUM_PROXIES'] trusted proxies saw (env
+THROTTLE_TRUSTED_PROXIES); hops a client wrote itself are ignored.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .utils.lazy import lazy
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_local_buckets = {}  # fallback when Redis is down
+_local_lock = threading.Lock()
+
+# KEYS[1] bucket; ARGV capacity, rate, now, cost, ttl. Returns the wait as a
+# string (Lua numbers come back truncated to integers).
+TAKE_SCRIPT = """
+local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local cost, ttl = tonumber(ARGV[4]), tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('EXPIRE', KEYS[1], ttl)
+return tostring(wait)
+"""
+
+
+@lazy
+def _redis_take():
+    import redis  # only deployments with REDIS_URL need the client
+
+    return redis.Redis.from_url(settings.REDIS_URL).register_script(TAKE_SCRIPT)
+
+
+def _take(state, cost, capacity, rate, now):
+    """(new bucket state, seconds to wait or 0 if the tokens were taken)."""
+    tokens, updated_at = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    if tokens >= cost:
+        return (tokens - cost, now), 0
+    return (tokens, now), (cost - tokens) / rate
+
+
+def consume(ident, cost, capacity=None, rate=None, now=None):
+    """
+    Take `cost` tokens from ident's bucket. Returns 0 if allowed, otherwise
+    the seconds to wait until the request would fit.
+    """
+    capacity = capacity or settings.THROTTLE_CAPACITY
+    rate = rate or settings.THROTTLE_REFILL_PER_SECOND
+    now = now or time.time()
+    cost = min(cost, capacity)
+    key = f"throttle:{ident}"
+    # A full bucket needs capacity / rate seconds to refill; keep it that long
+    ttl = int(capacity / rate) + 1
+
+    if settings.REDIS_URL:
+        try:
+            return float(_redis_take()(keys=[key], args=[capacity, rate, now, cost, ttl]))
+        except Exception as e:
+            print(f"[THROTTLE REDIS DOWN] {e}")
+            with _local_lock:
+                _local_buckets[key], wait = _take(_local_buckets.get(key), cost, capacity, rate, now)
+            return wait
+
+    # Per-process cache: the lock makes read-modify-write atomic
+    with _local_lock:
+        state, wait = _take(cache.get(key), cost, capacity, rate, now)
+        cache.set(key, state, ttl)
+    return wait
+
+
+def client_ident(request, user=None):
+    user = user or getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    # DRF's NUM_PROXIES rule; works for plain Django requests too (async views)
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def request_cost(request, view=None):
+    costs = getattr(view, "throttle_costs", {})
+    action = getattr(view, "action", None)
+    if action in costs:
+        return costs[action]
+    if getattr(view, "throttle_cost", None) is not None:
+        return view.throttle_cost
+    return settings.THROTTLE_DEFAULT_COSTS["read" if request.method in SAFE_METHODS else "write"]
+
+
+class WeightedRateThrottle(BaseThrottle):
+    """DRF throttle over the shared token buckets (DEFAULT_THROTTLE_CLASSES)."""
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        self._wait = consume(client_ident(request), request_cost(request, view))
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait
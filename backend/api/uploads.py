@@ -0,0 +1,193 @@
+# backend/api/uploads.py
+"""
+Resumable (tus-style) uploads.
+
+A client creates an UploadSession with the total length, PATCHes chunks at
+the current offset (any chunk may be retried after a dropped connection),
+then finalizes. Chunks are appended to a temp file with a fixed-size read
+buffer, so memory stays constant regardless of video size; finalize hands the
+temp file to store_upload, which streams it to the bucket.
+
+A finalized session is attached to a Post / Story / Message by passing its
+id as `upload_id` when creating them.
+"""
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .jobs import periodic
+from .models import UploadSession
+from .media import media_type_for, store_upload, release_media
+
+CHUNK_READ_SIZE = 64 * 1024
+
+PURPOSE_PREFIX = {
+    "post": "posts",
+    "story": "stories",
+    "message": "messages",
+}
+
+
+class OffsetMismatch(Exception):
+    """The client's Upload-Offset does not match what the server has stored."""
+
+    def __init__(self, offset):
+        super().__init__(f"Expected offset {offset}")
+        self.offset = offset
+
+
+def temp_path(session) -> str:
+    os.makedirs(settings.RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    return os.path.join(settings.RESUMABLE_UPLOAD_DIR, f"{session.id}.part")
+
+
+def create_session(user, purpose, filename, content_type, length):
+    if purpose not in PURPOSE_PREFIX:
+        raise ValidationError({"purpose": f"Must be one of {', '.join(PURPOSE_PREFIX)}."})
+    if not filename:
+        raise ValidationError({"filename": "filename is required."})
+    try:
+        length = int(length)
+    except (TypeError, ValueError):
+        raise ValidationError({"length": "length (total bytes) is required."})
+    if length <= 0 or length > settings.RESUMABLE_UPLOAD_MAX_SIZE:
+        raise ValidationError({"length": f"Must be between 1 and {settings.RESUMABLE_UPLOAD_MAX_SIZE} bytes."})
+
+    if purpose != "message" and not media_type_for(filename, content_type):
+        raise ValidationError({"filename": "Only image/video allowed."})
+
+    session = UploadSession.objects.create(
+        user=user,
+        purpose=purpose,
+        filename=os.path.basename(filename),
+        content_type=content_type or "application/octet-stream",
+        length=length,
+    )
+    open(temp_path(session), "wb").close()
+    return session
+
+
+def _locked(session_id, user):
+    """The session row, locked until the surrounding transaction ends."""
+    return UploadSession.objects.select_for_update().get(id=session_id, user=user)
+
+
+def _check_offset(session, offset):
+    if session.status != "uploading":
+        raise ValidationError({"upload": "Upload is already finalized."})
+    if offset != session.offset:
+        raise OffsetMismatch(session.offset)
+
+
+def append_chunk(session_id, user, offset, stream):
+    """
+    Append the request body at `offset`. Returns the new offset.
+    Raises OffsetMismatch if the client is out of sync (it should HEAD and resume).
+
+    The body is spooled to a file of its own while no lock is held; the row
+    is locked only to re-check the offset, copy the chunk in and move the
+    offset on, so a slow client never holds a lock (or a transaction).
+    """
+    session = UploadSession.objects.get(id=session_id, user=user)
+    _check_offset(session, offset)
+
+    remaining = session.length - session.offset
+    written = 0
+    spool = f"{temp_path(session)}.{uuid.uuid4().hex}"
+    try:
+        with open(spool, "wb") as fh:
+            while written < remaining:
+                chunk = stream.read(min(CHUNK_READ_SIZE, remaining - written))
+                if not chunk:
+                    break
+                fh.write(chunk)
+                written += len(chunk)
+
+        with transaction.atomic():
+            session = _locked(session_id, user)
+            # Another request may have appended (or finalized) meanwhile
+            _check_offset(session, offset)
+            with open(temp_path(session), "r+b") as fh, open(spool, "rb") as chunk:
+                # Discard anything past the acknowledged offset (a half-written retry)
+                fh.truncate(session.offset)
+                fh.seek(session.offset)
+                shutil.copyfileobj(chunk, fh, CHUNK_READ_SIZE)
+            session.offset += written
+            session.save(update_fields=["offset"])
+    finally:
+        os.remove(spool)
+    return session.offset
+
+
+def finalize(session_id, user):
+    """Store a fully received upload (deduplicated) and mark it ready to attach."""
+    session = UploadSession.objects.get(id=session_id, user=user)
+    if session.status != "uploading":
+        return session
+    if session.offset != session.length:
+        raise ValidationError({"upload": f"Incomplete: {session.offset}/{session.length} bytes received."})
+
+    # A complete file takes no more chunks, so it is stored without holding the lock
+    path = temp_path(session)
+    with open(path, "rb") as fh:
+        upload = File(fh, name=session.filename)
+        upload.content_type = session.content_type
+        item = store_upload(
+            upload,
+            f"{PURPOSE_PREFIX[session.purpose]}/{user.id}",
+            media_type_for(session.filename, session.content_type) or "file",
+        )
+    if not item:
+        raise ValidationError({"upload": "Storage upload failed, retry finalize."})
+
+    with transaction.atomic():
+        session = _locked(session_id, user)
+        stored = session.status == "uploading"
+        if stored:
+            session.media = item
+            session.status = "complete"
+            session.save(update_fields=["media", "status"])
+
+    if not stored:
+        # A concurrent finalize got there first; drop the reference this one took
+        release_media([item])
+        return session
+    os.remove(path)
+    return session
+
+
+def claim_upload(user, upload_id, purpose) -> dict:
+    """Consume a finalized upload and return its media item."""
+    try:
+        updated = UploadSession.objects.filter(
+            id=upload_id, user=user, purpose=purpose, status="complete"
+        ).update(status="attached")
+    except DjangoValidationError:
+        updated = 0
+    if not updated:
+        raise ValidationError({"upload_id": f"No finalized {purpose} upload {upload_id}."})
+    return UploadSession.objects.values_list("media", flat=True).get(id=upload_id)
+
+
+def abort(session):
+    if session.status == "complete":
+        release_media([session.media])
+    if os.path.exists(temp_path(session)):
+        os.remove(temp_path(session))
+    session.delete()
+
+
+@periodic(every=60 * 60)
+def cleanup_stale_uploads():
+    """Drop expired sessions: temp files, and media references never attached."""
+    stale = UploadSession.objects.filter(expires_at__lt=timezone.now()).exclude(status="attached")
+    for session in stale.iterator():
+        abort(session)
+    UploadSession.objects.filter(expires_at__lt=timezone.now(), status="attached").delete()
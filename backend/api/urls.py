@@ -4,10 +4,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
+from .batch import BatchView
+
 from .views import (
     AuthViewSet, ProfileViewSet, PostViewSet, CommentViewSet, LikeViewSet,
     MessageViewSet, FollowerViewSet, FriendRequestViewSet, StoryViewSet,
-    UserSearchView
+    UserSearchView, ContentSearchView, UploadViewSet, HashtagViewSet, ExportViewSet
 )
 
 router = DefaultRouter()
@@ -20,9 +23,24 @@ router.register(r'followers', FollowerViewSet, basename='followers')
 router.register(r'friend-requests', FriendRequestViewSet, basename='friend-requests')
 router.register(r'messages', MessageViewSet, basename='messages')
 router.register(r'stories', StoryViewSet, basename='stories')
+router.register(r'uploads', UploadViewSet, basename='uploads')
+router.register(r'hashtags', HashtagViewSet, basename='hashtags')
+router.register(r'exports', ExportViewSet, basename='exports')
+
+# Async twins of the upload / composite endpoints (serve via instagram/asgi.py)
+async_urlpatterns = [
+    path('posts/', async_views.create_post, name='async-post-create'),
+    path('stories/', async_views.create_story, name='async-story-create'),
+    path('messages/', async_views.send_message, name='async-message-send'),
+    path('profiles/upload-picture/', async_views.upload_profile_picture, name='async-profile-picture'),
+    path('profiles/<str:username>/', async_views.profile_detail, name='async-profile-detail'),
+]
 
 urlpatterns = [
     path('health/', lambda request: JsonResponse({'status': 'ok'}), name='health'),
+    path('batch/', BatchView.as_view(), name='batch'),
     path('search/users/', UserSearchView.as_view(), name='user-search'),
+    path('search/content/', ContentSearchView.as_view(), name='content-search'),
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls)),
 ]
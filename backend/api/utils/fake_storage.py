@@ -0,0 +1,174 @@
+# backend/api/utils/fake_storage.py
+"""
+In-memory stand-in for the Supabase Storage REST API, for tests and local
+runs without a Supabase project:
+
+    python -m api.utils.fake_storage 9000
+    SUPABASE_URL=http://127.0.0.1:9000 SUPABASE_KEY=dev python manage.py runserver
+
+Implements the endpoints StorageGateway uses (upload, download, public and
+signed download, signing, batch delete, list). `fail_next`, `drop_next`
+and `delay` inject errors, lost responses and latency to exercise retries,
+deadlines and the circuit breaker.
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+PREFIX = "/storage/v1/object/"
+
+
+class FakeStorage:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.objects = {}  # "bucket/path" -> (bytes, content_type)
+        self.requests = []  # (method, path)
+        self.fail_next = []  # status codes returned by the next requests
+        self.drop_next = 0  # the next requests are handled but get no response
+        self.delay = 0.0
+        self.lock = threading.RLock()  # replies may be sent while it is held
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=b"", content_type="application/json"):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode()
+                with store.lock:
+                    drop, store.drop_next = store.drop_next > 0, max(store.drop_next - 1, 0)
+                if drop:
+                    self.close_connection = True  # the client sees the connection drop
+                    return
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (deadline tests)
+
+            def _body(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    data = b""
+                    while True:
+                        size = int(self.rfile.readline().strip(), 16)
+                        if not size:
+                            self.rfile.readline()
+                            return data
+                        data += self.rfile.read(size)
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _intercept(self):
+                path = unquote(urlparse(self.path).path)
+                with store.lock:
+                    store.requests.append((self.command, path))
+                    status = store.fail_next.pop(0) if store.fail_next else None
+                if store.delay:
+                    time.sleep(store.delay)
+                if status:
+                    self._body()
+                    self._reply(status, {"error": "injected"})
+                    return None
+                if not path.startswith(PREFIX):
+                    self._reply(404, {"error": "not found"})
+                    return None
+                return path[len(PREFIX):]
+
+            def do_POST(self):
+                rest = self._intercept()
+                if rest is None:
+                    return
+                body = self._body()
+                if rest.startswith("sign/"):
+                    key = rest[len("sign/"):]
+                    with store.lock:
+                        exists = key in store.objects
+                    if not exists:
+                        self._reply(400, {"error": "not_found", "statusCode": "404"})
+                    else:
+                        self._reply(200, {"signedURL": f"/object/sign/{key}?token=fake"})
+                    return
+                if rest.startswith("list/"):
+                    bucket = rest[len("list/"):]
+                    opts = json.loads(body or b"{}")
+                    folder = f"{bucket}/{opts.get('prefix', '').strip('/')}/"
+                    with store.lock:
+                        names = sorted(k[len(folder):] for k in store.objects if k.startswith(folder))
+                    names = [n for n in names if "/" not in n]
+                    offset, limit = opts.get("offset", 0), opts.get("limit", 100)
+                    self._reply(200, [{"id": n, "name": n} for n in names[offset:offset + limit]])
+                    return
+                with store.lock:
+                    if rest in store.objects and self.headers.get("x-upsert") != "true":
+                        self._reply(400, {"error": "Duplicate", "statusCode": "409"})
+                        return
+                    store.objects[rest] = (body, self.headers.get("Content-Type", "application/octet-stream"))
+                self._reply(200, {"Key": rest})
+
+            def do_GET(self):
+                rest = self._intercept()
+                if rest is None:
+                    return
+                if rest.startswith(("public/", "sign/")):
+                    rest = rest.split("/", 1)[1]
+                with store.lock:
+                    obj = store.objects.get(rest)
+                if obj is None:
+                    self._reply(404, {"error": "not found"})
+                else:
+                    self._reply(200, obj[0], obj[1])
+
+            def do_DELETE(self):
+                rest = self._intercept()
+                if rest is None:
+                    return
+                prefixes = json.loads(self._body() or b"{}").get("prefixes", [])
+                removed = []
+                with store.lock:
+                    for p in prefixes:
+                        if store.objects.pop(f"{rest}/{p}", None) is not None:
+                            removed.append({"name": p})
+                self._reply(200, removed)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
+    storage = FakeStorage(port=port)
+    print(f"Fake storage listening on {storage.url}")
+    try:
+        storage.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
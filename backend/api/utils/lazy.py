@@ -0,0 +1,38 @@
+# backend/api/utils/lazy.py
+import functools
+import threading
+
+_UNSET = object()
+
+
+def lazy(factory):
+    """
+    Build an expensive object (HTTP client, thread pool, storage backend) on
+    first use instead of at import time, exactly once even when several
+    threads race for it:
+
+        @lazy
+        def get_client():
+            return Client(...)
+
+    get_client.reset() drops the instance (tests, settings overrides).
+    """
+    lock = threading.Lock()
+    value = _UNSET
+
+    @functools.wraps(factory)
+    def get():
+        nonlocal value
+        if value is _UNSET:
+            with lock:
+                if value is _UNSET:
+                    value = factory()
+        return value
+
+    def reset():
+        nonlocal value
+        with lock:
+            value = _UNSET
+
+    get.reset = reset
+    return get
@@ -0,0 +1,202 @@
+# backend/api/utils/storage.py
+"""
+Pluggable media storage.
+
+Media rows store object keys ("posts/3/<uuid>.jpg"), never URLs; URLs are
+computed by the active backend when serializing, so switching backends
+needs no data migration. STORAGE_BACKEND selects one of:
+
+  * supabase - Supabase Storage via api/utils/supabase.py (production)
+  * local    - files under MEDIA_ROOT, served at MEDIA_URL by
+               api.views.serve_media (sendfile / X-Accel-Redirect)
+  * memory   - a per-process dict, for tests and offline benchmarks
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .lazy import lazy
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class Storage:
+    """Backend interface. Failures are logged and reported as False / None, like the Supabase helpers."""
+
+    def put(self, path: str, file_obj, upsert: bool = False) -> bool:
+        """Stream file_obj to `path`."""
+        raise NotImplementedError
+
+    async def aput(self, path: str, file_obj, upsert: bool = False) -> bool:
+        return await sync_to_async(self.put, thread_sensitive=False)(path, file_obj, upsert)
+
+    def get(self, path: str):
+        """Object bytes, or None if missing."""
+        raise NotImplementedError
+
+    def open(self, path: str):
+        """Seekable binary file object for streaming the object out, or None if missing."""
+        data = self.get(path)
+        return io.BytesIO(data) if data is not None else None
+
+    def delete(self, paths: list):
+        """Remove many objects in one go; missing ones are ignored."""
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> list:
+        """Every object path directly under `prefix`."""
+        raise NotImplementedError
+
+    def public_url(self, path: str) -> str:
+        raise NotImplementedError
+
+    def signed_url(self, path: str, expires_in: int):
+        """Expiring direct-download URL, or None if the app has to serve the object itself."""
+        return None
+
+    def url(self, key):
+        """Public URL for a stored key. Legacy rows may still hold absolute URLs; those pass through."""
+        if not key:
+            return None
+        if key.startswith(("http://", "https://")):
+            return key
+        return self.public_url(key)
+
+
+class SupabaseStorage(Storage):
+    def put(self, path, file_obj, upsert=False):
+        from .supabase import upload_to_supabase
+        return bool(upload_to_supabase(file_obj, path, upsert=upsert))
+
+    async def aput(self, path, file_obj, upsert=False):
+        from .supabase import aupload_to_supabase
+        return bool(await aupload_to_supabase(file_obj, path, upsert=upsert))
+
+    def get(self, path):
+        from .supabase import download_from_supabase
+        return download_from_supabase(path)
+
+    def delete(self, paths):
+        from .supabase import remove_paths
+        remove_paths(paths)
+
+    def list(self, prefix):
+        from .supabase import list_paths
+        return list_paths(prefix)
+
+    def public_url(self, path):
+        from .supabase import public_url
+        return public_url(path)
+
+    def signed_url(self, path, expires_in):
+        from .supabase import signed_url
+        return signed_url(path, expires_in)
+
+
+class _MediaUrlMixin:
+    def public_url(self, path):
+        return f"{settings.MEDIA_URL}{path}"
+
+
+class LocalStorage(_MediaUrlMixin, Storage):
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def full_path(self, path):
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise ValueError(f"Path escapes storage root: {path}")
+        return full
+
+    def put(self, path, file_obj, upsert=False):
+        try:
+            full = self.full_path(path)
+            if not upsert and os.path.exists(full):
+                print(f"[UPLOAD ERROR] {path} already exists")
+                return False
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            file_obj.seek(0)
+            # Write next to the target and rename, so readers never see partial files
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(full), prefix=".upload-")
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(file_obj, out, COPY_CHUNK_SIZE)
+            os.replace(tmp, full)
+            return True
+        except Exception as e:
+            print(f"[UPLOAD ERROR] {path}: {e}")
+            return False
+
+    def get(self, path):
+        try:
+            with open(self.full_path(path), "rb") as fh:
+                return fh.read()
+        except (OSError, ValueError):
+            return None
+
+    def open(self, path):
+        try:
+            return open(self.full_path(path), "rb")
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, paths):
+        for path in paths or []:
+            try:
+                os.remove(self.full_path(path))
+            except (OSError, ValueError):
+                pass
+
+    def list(self, prefix):
+        folder = prefix.strip("/")
+        try:
+            names = sorted(os.listdir(self.full_path(folder)))
+        except (OSError, ValueError):
+            return []
+        return [f"{folder}/{name}" for name in names
+                if not name.startswith(".") and os.path.isfile(self.full_path(f"{folder}/{name}"))]
+
+
+class MemoryStorage(_MediaUrlMixin, Storage):
+    def __init__(self):
+        self.objects = {}  # path -> bytes
+        self._lock = threading.Lock()
+
+    def put(self, path, file_obj, upsert=False):
+        file_obj.seek(0)
+        data = file_obj.read()
+        with self._lock:
+            if not upsert and path in self.objects:
+                print(f"[UPLOAD ERROR] {path} already exists")
+                return False
+            self.objects[path] = data
+        return True
+
+    def get(self, path):
+        return self.objects.get(path)
+
+    def delete(self, paths):
+        with self._lock:
+            for path in paths or []:
+                self.objects.pop(path, None)
+
+    def list(self, prefix):
+        folder = prefix.strip("/") + "/"
+        return sorted(p for p in self.objects if p.startswith(folder) and "/" not in p[len(folder):])
+
+
+BACKENDS = {
+    "supabase": lambda: SupabaseStorage(),
+    "local": lambda: LocalStorage(settings.MEDIA_ROOT),
+    "memory": lambda: MemoryStorage(),
+}
+
+
+@lazy
+def get_storage() -> Storage:
+    """The configured backend (one instance per process)."""
+    return BACKENDS[settings.STORAGE_BACKEND]()
@@ -0,0 +1,329 @@
+# backend/api/utils/storage_gateway.py
+"""
+HTTP gateway to Supabase Storage.
+
+One pooled httpx client per process (sized by STORAGE_POOL_SIZE) with:
+  * per-call deadlines: every call has a total time budget; each attempt's
+    timeout is cut to whatever is left of it,
+  * bounded retries with full-jitter exponential backoff on transport
+    errors, 429 and 5xx; an upload retried after its response was lost and
+    then refused as a duplicate had already landed, and counts as done,
+  * a circuit breaker: after STORAGE_BREAKER_THRESHOLD consecutive failures
+    calls fail fast with CircuitOpenError for STORAGE_BREAKER_RESET seconds,
+    then a single trial call decides whether to close it again.
+
+Public URLs are computed locally, no round-trip.
+api/utils/fake_storage.py serves the same REST endpoints for tests.
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from urllib.parse import quote
+
+import httpx
+from django.conf import settings
+
+from .lazy import lazy
+
+
+class StorageError(Exception):
+    """The storage backend rejected or failed a call."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(StorageError):
+    """The backend is considered down; the call was not attempted."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """An allowed call ended without an outcome (cancelled, bug): let another trial through."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+def _retryable(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+def _duplicate(res):
+    """Storage refused to overwrite an existing object (409, or 400 wrapping one)."""
+    if res.status_code == 409:
+        return True
+    if res.status_code == 400:
+        try:
+            return str(res.json().get("statusCode")) == "409"
+        except ValueError:
+            return False
+    return False
+
+
+def _close(content):
+    if hasattr(content, "close"):
+        content.close()
+
+
+class StorageGateway:
+    def __init__(self, base_url, key, bucket, *, pool_size=10, connect_timeout=3.0,
+                 timeout=10.0, max_retries=3, backoff_base=0.2, backoff_cap=2.0,
+                 breaker=None, transport=None):
+        self.base_url = base_url.rstrip("/")
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.headers = {"Authorization": f"Bearer {key}", "apikey": key}
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.Client(
+            base_url=f"{self.base_url}/storage/v1",
+            headers=self.headers,
+            limits=self.limits,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            transport=transport,
+        )
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+
+    # ---------------------------------------------------------------
+    # URLs
+    # ---------------------------------------------------------------
+    def object_path(self, path):
+        return f"/object/{self.bucket}/{quote(path)}"
+
+    def public_url(self, path: str) -> str:
+        return f"{self.base_url}/storage/v1/object/public/{self.bucket}/{quote(path)}"
+
+    # ---------------------------------------------------------------
+    # Core request loop
+    # ---------------------------------------------------------------
+    def _backoff(self, attempt, remaining):
+        return min(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)), max(remaining, 0))
+
+    def _attempt_timeout(self, remaining):
+        return httpx.Timeout(min(self.timeout, remaining), connect=min(self.connect_timeout, remaining))
+
+    def request(self, method, url, *, deadline=None, body=None, create=False, **kwargs):
+        """
+        Send a request within `deadline` seconds (default STORAGE_TIMEOUT
+        scaled by the retry budget). `body` may be a callable returning fresh
+        content for each attempt (e.g. re-opening a file).
+
+        With `create`, a duplicate error on a retry is a success: an earlier
+        attempt stored the object and only its response was lost. Keys are
+        never reused for other content, so the stored object is this one.
+        """
+        deadline_at = time.monotonic() + (deadline or self.timeout * (self.max_retries + 1))
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            # Built before allow(): a failing body() must not strand the half-open trial
+            content = body() if callable(body) else body
+            if not self.breaker.allow():
+                _close(content)
+                raise CircuitOpenError("Storage circuit is open")
+
+            settled = False
+            try:
+                res = self.client.request(
+                    method, url, content=content, timeout=self._attempt_timeout(remaining), **kwargs
+                )
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                settled = True
+                last_error = StorageError(f"{method} {url}: {e!r}")
+            else:
+                settled = True
+                if not _retryable(res.status_code):
+                    # 2xx / 4xx: the backend is healthy, even if it said no
+                    self.breaker.record_success()
+                    if create and attempt and _duplicate(res):
+                        return res
+                    if res.status_code >= 400:
+                        raise StorageError(f"{method} {url}: {res.status_code} {res.text}", res.status_code)
+                    return res
+                self.breaker.record_failure()
+                last_error = StorageError(f"{method} {url}: {res.status_code} {res.text}", res.status_code)
+            finally:
+                _close(content)
+                if not settled:
+                    self.breaker.release()
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, deadline_at - time.monotonic()))
+
+        raise last_error or StorageError(f"{method} {url}: deadline exceeded")
+
+    # ---------------------------------------------------------------
+    # Operations
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _upload_headers(content_type, upsert, size):
+        headers = {"Content-Type": content_type, "x-upsert": "true" if upsert else "false"}
+        if size is not None:
+            headers["Content-Length"] = str(size)
+        return headers
+
+    def upload(self, path, body, content_type, upsert=False, size=None, deadline=None):
+        self.request(
+            "POST", self.object_path(path), body=body, deadline=deadline, create=not upsert,
+            headers=self._upload_headers(content_type, upsert, size),
+        )
+        return self.public_url(path)
+
+    def download(self, path, deadline=None) -> bytes:
+        return self.request("GET", self.object_path(path), deadline=deadline).content
+
+    def remove(self, paths, deadline=None):
+        if paths:
+            self.request("DELETE", f"/object/{self.bucket}", json={"prefixes": list(paths)}, deadline=deadline)
+
+    def sign(self, path, expires_in, deadline=None) -> str:
+        """Time-limited URL for a private object (Range requests supported)."""
+        res = self.request(
+            "POST", f"/object/sign/{self.bucket}/{quote(path)}", deadline=deadline,
+            json={"expiresIn": int(expires_in)},
+        )
+        return f"{self.base_url}/storage/v1{res.json()['signedURL']}"
+
+    def list(self, prefix, limit=1000, offset=0, deadline=None):
+        res = self.request(
+            "POST", f"/object/list/{self.bucket}", deadline=deadline,
+            json={"prefix": prefix, "limit": limit, "offset": offset,
+                  "sortBy": {"column": "name", "order": "asc"}},
+        )
+        return res.json()
+
+    # ---------------------------------------------------------------
+    # Async (ASGI views); shares the breaker with the sync client
+    # ---------------------------------------------------------------
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                base_url=f"{self.base_url}/storage/v1",
+                headers=self.headers,
+                limits=self.limits,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def arequest(self, method, url, *, deadline=None, body=None, create=False, **kwargs):
+        deadline_at = time.monotonic() + (deadline or self.timeout * (self.max_retries + 1))
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            content = body() if callable(body) else body
+            if not self.breaker.allow():
+                _close(content)
+                raise CircuitOpenError("Storage circuit is open")
+
+            settled = False
+            try:
+                res = await self._async_client().request(
+                    method, url, content=content, timeout=self._attempt_timeout(remaining), **kwargs
+                )
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                settled = True
+                last_error = StorageError(f"{method} {url}: {e!r}")
+            else:
+                settled = True
+                if not _retryable(res.status_code):
+                    self.breaker.record_success()
+                    if create and attempt and _duplicate(res):
+                        return res
+                    if res.status_code >= 400:
+                        raise StorageError(f"{method} {url}: {res.status_code} {res.text}", res.status_code)
+                    return res
+                self.breaker.record_failure()
+                last_error = StorageError(f"{method} {url}: {res.status_code} {res.text}", res.status_code)
+            finally:
+                # Also on cancellation, which would otherwise hold the trial forever
+                _close(content)
+                if not settled:
+                    self.breaker.release()
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, deadline_at - time.monotonic()))
+
+        raise last_error or StorageError(f"{method} {url}: deadline exceeded")
+
+    async def aupload(self, path, body, content_type, upsert=False, size=None, deadline=None):
+        await self.arequest(
+            "POST", self.object_path(path), body=body, deadline=deadline, create=not upsert,
+            headers=self._upload_headers(content_type, upsert, size),
+        )
+        return self.public_url(path)
+
+
+@lazy
+def get_gateway() -> StorageGateway:
+    """The process-wide gateway, built from settings on first use."""
+    if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+        raise StorageError("SUPABASE_URL and SUPABASE_KEY must be set for the supabase storage backend")
+    return StorageGateway(
+        settings.SUPABASE_URL,
+        settings.SUPABASE_KEY,
+        settings.SUPABASE_BUCKET,
+        pool_size=settings.STORAGE_POOL_SIZE,
+        connect_timeout=settings.STORAGE_CONNECT_TIMEOUT,
+        timeout=settings.STORAGE_TIMEOUT,
+        max_retries=settings.STORAGE_MAX_RETRIES,
+        breaker=CircuitBreaker(settings.STORAGE_BREAKER_THRESHOLD, settings.STORAGE_BREAKER_RESET),
+    )
@@ -1,68 +1,141 @@
 # backend/api/utils/supabase.py
+"""
+Supabase Storage helpers. All calls go through the pooled, deadline-bounded
+gateway in storage_gateway.py (retries + circuit breaker); public URLs are
+computed locally.
+"""
 import os
-from supabase import create_client
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "files")
+from .storage_gateway import StorageError, get_gateway
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def upload_to_supabase(file_obj, path: str):
+def _disk_path(file_obj):
+    """Path of the file backing file_obj on local disk, if there is one."""
+    if hasattr(file_obj, "temporary_file_path"):
+        return file_obj.temporary_file_path()
+    name = getattr(getattr(file_obj, "file", file_obj), "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
+def upload_to_supabase(file_obj, path: str, upsert: bool = False):
     try:
         file_obj.seek(0)
-        data = file_obj.read()
-        if not data:
+        disk_path = _disk_path(file_obj)
+        if disk_path:
+            # Large / temp-file uploads are streamed from disk, never buffered;
+            # reopened on every retry attempt
+            size = os.path.getsize(disk_path)
+            body = lambda: open(disk_path, "rb")
+        else:
+            body = file_obj.read()
+            size = len(body)
+        if not size:
             print("[ERROR] File is empty!")
             return None
 
-        content_type = getattr(file_obj, "content_type", "application/octet-stream")
-        print(f"[UPLOAD START] Path: {path} | Size: {len(data)} bytes | Type: {content_type}")
-
-        res = supabase.storage.from_(SUPABASE_BUCKET).upload(
-            path=path,
-            file=data,
-            file_options={"content-type": content_type}
-        )
-
-        print(f"[SUPABASE UPLOAD RESPONSE] {res}")
-
-        if isinstance(res, dict) and res.get("error"):
-            print(f"[UPLOAD ERROR] {res['error']}")
-            return None
-        if hasattr(res, "error") and res.error:
-            print(f"[UPLOAD ERROR] {res.error}")
-            return None
-
-        public_url_res = supabase.storage.from_(SUPABASE_BUCKET).get_public_url(path)
-        print(f"[PUBLIC URL RAW] {public_url_res}")
-
-        if isinstance(public_url_res, dict):
-            url = public_url_res.get("public_url") or public_url_res.get("publicURL")
-        else:
-            url = str(public_url_res)
-
-        if not url or "supabase.co" not in url:
-            print(f"[ERROR] Invalid public URL: {url}")
-            return None
+        content_type = getattr(file_obj, "content_type", None) or "application/octet-stream"
+        print(f"[UPLOAD START] Path: {path} | Size: {size} bytes | Type: {content_type}")
 
+        url = get_gateway().upload(path, body, content_type, upsert=upsert, size=size)
         print(f"[SUCCESS] Final URL: {url}")
         return url
 
+    except StorageError as e:
+        print(f"[UPLOAD ERROR] {path}: {e}")
+        return None
     except Exception as e:
         print(f"[FATAL EXCEPTION] Upload failed for {path}: {e}")
         import traceback
         traceback.print_exc()
         return None
 
+
 def remove_paths(paths: list):
     try:
         if not paths:
             return
         print(f"[DELETE] Removing: {paths}")
-        res = supabase.storage.from_(SUPABASE_BUCKET).remove(paths)
-        print(f"[DELETE RESPONSE] {res}")
+        get_gateway().remove(paths)
     except Exception as e:
         print(f"[DELETE EXCEPTION] {e}")
-        import traceback
-        traceback.print_exc()
\ No newline at end of file
+
+
+def download_from_supabase(path: str):
+    try:
+        data = get_gateway().download(path)
+        print(f"[DOWNLOAD] Path: {path} | Size: {len(data) if data else 0} bytes")
+        return data or None
+    except Exception as e:
+        print(f"[DOWNLOAD EXCEPTION] {path}: {e}")
+        return None
+
+
+def public_url(path: str):
+    """Public URL of an object already in the bucket (no upload needed)."""
+    return get_gateway().public_url(path)
+
+
+def signed_url(path: str, expires_in: int):
+    try:
+        return get_gateway().sign(path, expires_in)
+    except Exception as e:
+        print(f"[SIGN EXCEPTION] {path}: {e}")
+        return None
+
+
+def list_paths(prefix: str, page_size: int = 1000):
+    """Every object path directly under `prefix` (e.g. 'posts/12')."""
+    folder = prefix.strip("/")
+    paths, offset = [], 0
+    try:
+        while True:
+            res = get_gateway().list(folder, limit=page_size, offset=offset)
+            # Folder placeholders come back without an id
+            paths += [f"{folder}/{f['name']}" for f in res or [] if f.get("id")]
+            if not res or len(res) < page_size:
+                return paths
+            offset += page_size
+    except Exception as e:
+        print(f"[LIST EXCEPTION] {prefix}: {e}")
+        raise
+
+
+# -------------------------------------------------------------------
+# Async (used by api/async_views.py under ASGI)
+# -------------------------------------------------------------------
+ASYNC_UPLOAD_CHUNK = 256 * 1024
+
+
+async def _file_chunks(path):
+    with open(path, "rb") as fh:
+        while chunk := fh.read(ASYNC_UPLOAD_CHUNK):
+            yield chunk
+
+
+async def aupload_to_supabase(file_obj, path: str, upsert: bool = False):
+    """Async twin of upload_to_supabase: same contract, awaits the HTTP call."""
+    try:
+        file_obj.seek(0)
+        disk_path = _disk_path(file_obj)
+        if disk_path:
+            size = os.path.getsize(disk_path)
+            body = lambda: _file_chunks(disk_path)
+        else:
+            body = file_obj.read()
+            size = len(body)
+        if not size:
+            print("[ERROR] File is empty!")
+            return None
+
+        content_type = getattr(file_obj, "content_type", None) or "application/octet-stream"
+        print(f"[ASYNC UPLOAD START] Path: {path} | Size: {size} bytes | Type: {content_type}")
+        return await get_gateway().aupload(path, body, content_type, upsert=upsert, size=size)
+
+    except StorageError as e:
+        print(f"[ASYNC UPLOAD ERROR] {path}: {e}")
+        return None
+    except Exception as e:
+        print(f"[FATAL EXCEPTION] Async upload failed for {path}: {e}")
+        return None
@@ -1,36 +1,54 @@
 # backend/api/views.py
+import io
 import os
+import re
 import uuid
 from django.utils import timezone
 from django.db import transaction
 from datetime import timedelta
 from mimetypes import guess_type
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import login, authenticate, get_user_model
 from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
 
 from rest_framework import viewsets, status, generics
 from rest_framework.decorators import action
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.utils.urls import replace_query_param
 
 from .auth import SessionIDAuthentication, get_user_from_session_key
 from .models import (
     UserProfile, Follower, FriendRequest,
     Post, Like, Comment, Message,
-    Story, StoryView,
+    Story, StoryView, UploadSession, PurgeJob, ExploreRanking,
+    Hashtag, PostHashtag, DataExport,
 )
 from .serializers import *
+from .serializers import public_media_item
 from .permissions import IsOwnerOrReadOnly
-from .utils.supabase import upload_to_supabase, remove_paths, SUPABASE_BUCKET
-from .services import cleanup_expired_stories
+from .utils.storage import get_storage
+from .media import (
+    media_type_for, store_upload, release_media,
+    process_post_media, process_story_media,
+)
+from .jobs import enqueue
+from . import archive, blocks, counters, tags, visibility
+from .uploads import (
+    OffsetMismatch, create_session, append_chunk, finalize, claim_upload, abort,
+)
 
 User = get_user_model()
 
+ERASURE_TOKEN_SALT = "api.account-erasure"
+
 
 # ===================================================================
 # 1. Base ViewSet (shared logic)
@@ -51,6 +69,8 @@ class BaseModelViewSet(viewsets.ModelViewSet):
 class AuthViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
     authentication_classes = []
+    # Anonymous, so throttled per IP; makes password guessing expensive
+    throttle_costs = {'login': 5, 'signup': 10, 'delete_account': 10}
 
     @action(detail=False, methods=['post'])
     def signup(self, request):
@@ -129,6 +149,46 @@ class AuthViewSet(viewsets.ViewSet):
             "user":  serializer.data
         })
 
+    @action(detail=False, methods=['post'], url_path='delete-account')
+    def delete_account(self, request):
+        """
+        Deactivates the account immediately and erases all of its data in the
+        background. Returns a token for polling `erasure-status`.
+        """
+        user = get_user_from_session_key(request.headers.get("X-Session-ID"))
+        if not user:
+            return Response({"error": "Invalid or expired session."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        if not user.check_password(request.data.get("password") or ""):
+            return Response({"error": "Password is incorrect."}, status=status.HTTP_400_BAD_REQUEST)
+
+        from .purge import erase_account  # rarely used; keep it out of boot
+        job = erase_account(user)
+        Session.objects.filter(session_key=request.headers.get("X-Session-ID")).delete()
+
+        return Response({
+            "message": "Account deactivated. Your data is being erased.",
+            "status_token": signing.dumps(job.id, salt=ERASURE_TOKEN_SALT),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path='erasure-status')
+    def erasure_status(self, request):
+        """Progress of an account erasure, looked up by the token from delete-account."""
+        try:
+            job_id = signing.loads(request.query_params.get("token", ""), salt=ERASURE_TOKEN_SALT)
+        except signing.BadSignature:
+            return Response({"error": "Invalid token."}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = get_object_or_404(PurgeJob, id=job_id, kind="account")
+        return Response({
+            "status": job.status,
+            "stage": job.progress.get("stage"),
+            "stages_done": job.progress.get("stages_done", []),
+            "progress": {k: v for k, v in job.progress.items() if isinstance(v, int)},
+            "attempts": job.attempts,
+            "updated_at": job.updated_at,
+        })
+
 # ===================================================================
 # 3. Relationships – Follow + Friend Requests (private accounts) + view any user profile
 # ===================================================================
@@ -141,6 +201,8 @@ class FollowerViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    throttle_costs = {'follow': 3, 'unfollow': 3}
+    low_priority_actions = ('followers', 'following')
 
     @action(detail=True, methods=['post'])
     def follow(self, request, pk=None):
@@ -153,6 +215,9 @@ class FollowerViewSet(viewsets.ViewSet):
         if user_to_follow == request.user:
             return Response({'error': 'You cannot follow yourself.'}, status=400)
 
+        if blocks.is_blocked(request.user.id, user_to_follow.id):
+            return Response({'error': 'You cannot follow this user.'}, status=403)
+
         # Pre-check: If already following (e.g., if target account switched from public to private)
         if Follower.objects.filter(follower=request.user, followed=user_to_follow).exists():
              return Response({'sent': False, 'message': 'You are already following this user.'})
@@ -181,20 +246,26 @@ class FollowerViewSet(viewsets.ViewSet):
 
             # Create the new pending follow request
             FriendRequest.objects.create(sender=request.user, receiver=user_to_follow, status='pending')
+            counters.bump_profile_version(user_to_follow.id)
             return Response({'sent': True, 'message': 'Follow request sent (private account).'})
 
         else:
             # --- PUBLIC ACCOUNT LOGIC (Immediate Follow) ---
             obj, created = Follower.objects.get_or_create(follower=request.user, followed=user_to_follow)
+            if created:
+                counters.follow_added(request.user.id, user_to_follow.id)
             return Response({'message': 'Now following' if created else 'Already following'})
 
     @action(detail=True, methods=['post'])
     def unfollow(self, request, pk=None):
         # Delete both the Follower entry and any pending FriendRequest
-        Follower.objects.filter(follower=request.user, followed_id=pk).delete()
+        deleted, _ = Follower.objects.filter(follower=request.user, followed_id=pk).delete()
+        if deleted:
+            counters.follow_removed(request.user.id, pk)
         
         # If the user unfollows, any pending/accepted/rejected request from them to the target should also be cleaned up.
         FriendRequest.objects.filter(sender=request.user, receiver_id=pk).delete()
+        counters.bump_profile_version(pk)
         
         return Response({'message': 'Unfollowed successfully.'})
 
@@ -221,6 +292,8 @@ class ProfileViewSet(viewsets.ModelViewSet):
     serializer_class = UserProfileSerializer
     lookup_field = 'user__username'
     permission_classes = [IsAuthenticated]
+    throttle_costs = {'upload_picture': 10}
+    low_priority_actions = ('list',)
     
     # Allow file uploads only for the dedicated upload_picture action, 
     # but include them here to be available for custom actions.
@@ -230,6 +303,10 @@ class ProfileViewSet(viewsets.ModelViewSet):
     # Standard CRUD Operations (Handles text fields like bio, full_name, is_private)
     # -----------------------------------------------------------
 
+    def get_queryset(self):
+        # Blocked either way: the profile doesn't exist for the viewer
+        return blocks.exclude_users(super().get_queryset(), blocks.hidden_ids(self.request.user.id))
+
     def get_object(self):
         """Override to always return the profile of the current user for standard updates."""
         # For standard update/partial_update (PUT/PATCH), ensure it's the requesting user's profile
@@ -249,6 +326,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
             raise ValidationError("Use the 'upload-picture' endpoint to change the profile photo.")
 
         serializer.save()
+        counters.bump_profile_version(self.request.user.id)
         
     # -----------------------------------------------------------
     # Custom Actions
@@ -276,30 +354,111 @@ class ProfileViewSet(viewsets.ModelViewSet):
         if not mime_type or not mime_type.startswith('image/'):
             return Response({"error": "Only image files are allowed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 2. Upload file to Supabase
+        # 2. Upload file to storage
         try:
             # Generate a unique path using user ID
             ext = os.path.splitext(file.name)[1].lower()
             # It's good practice to use a static name here like 'profile_pic' 
             # if you want to reuse the same URL and overwrite the file on update.
             path = f"profiles/{request.user.id}/profile_pic{ext}" 
-            new_url = upload_to_supabase(file, path)
-            
-            if not new_url:
-                 return Response({"error": "Supabase upload failed."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            if not get_storage().put(path, file, upsert=True):
+                 return Response({"error": "Storage upload failed."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         except Exception as e:
             return Response({"error": f"File upload failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # 3. Update the profile model
         # You can optionally delete the old file here if the path generation changes.
-        profile.profile_pic = new_url
-        profile.save(update_fields=['profile_pic'])
+        profile.profile_pic_path = path
+        profile.save(update_fields=['profile_pic_path'])
+        counters.bump_profile_version(request.user.id)
         
         # 4. Return updated profile data
         return Response(self.get_serializer(profile, context={'request': request}).data, status=status.HTTP_200_OK)
 
 
+    # -----------------------------------------------------------
+    # Profile screen: header + relationship + story ring + first
+    # page of the post grid, in two queries, cached per
+    # (viewer, profile version — see counters.bump_profile_version)
+    # -----------------------------------------------------------
+    SCREEN_CACHE_TTL = 60  # also bounds how long an expired story ring shows
+
+    @staticmethod
+    def screen_cache_key(viewer_id, username):
+        return f"profile_screen:{viewer_id}:{username}"
+
+    @action(detail=True, methods=['get'])
+    def screen(self, request, user__username=None):
+        viewer = request.user
+        cache_key = self.screen_cache_key(viewer.id, user__username)
+        cached = cache.get(cache_key)
+        if cached and cached['version'] == counters.profile_version(cached['user_id']):
+            return Response(cached['data'])
+
+        now = timezone.now()
+        active_stories = Story.objects.filter(user=OuterRef('user_id'), expires_at__gt=now)
+        profile = get_object_or_404(
+            self.get_queryset().annotate(
+                is_following=Exists(Follower.objects.filter(follower=viewer, followed=OuterRef('user_id'))),
+                follows_you=Exists(Follower.objects.filter(follower=OuterRef('user_id'), followed=viewer)),
+                is_requested=Exists(FriendRequest.objects.filter(
+                    sender=viewer, receiver=OuterRef('user_id'), status='pending'
+                )),
+                has_story=Exists(active_stories),
+                has_unseen_story=Exists(active_stories.exclude(views__viewer=viewer)),
+            ),
+            user__username=user__username,
+        )
+        version = counters.profile_version(profile.user_id)
+
+        is_self = profile.user_id == viewer.id
+        can_view = is_self or not profile.is_private or profile.is_following
+        page_size = self.paginator.page_size
+        posts = []
+        if can_view:
+            posts = list(
+                Post.objects.filter(user_id=profile.user_id)
+                .only('id', 'media', 'likes_count', 'comments_count', 'created_at')
+                .order_by('-created_at')[:page_size + 1]
+            )
+
+        next_url = None
+        if len(posts) > page_size:
+            posts = posts[:page_size]
+            next_url = request.build_absolute_uri(
+                reverse('posts-user-posts', kwargs={'user_id': profile.user_id}) + '?page=2&size=thumbnail'
+            )
+
+        relationship = {
+            'is_self': is_self,
+            'is_following': profile.is_following,
+            'is_requested': profile.is_requested,
+            'follows_you': profile.follows_you,
+        }
+        data = {
+            'profile': UserProfileSerializer(profile, context={
+                'request': request,
+                'relationship': {profile.user_id: relationship},
+            }).data,
+            'relationship': relationship,
+            'story': {'active': profile.has_story, 'unseen': profile.has_unseen_story},
+            'posts': {
+                'visible': can_view,
+                'next': next_url,
+                'results': [{
+                    'id': str(post.id),
+                    'thumbnail': public_media_item(post.media[0], 'thumbnail') if post.media else None,
+                    'media_count': len(post.media),
+                    'likes_count': post.likes_count,
+                    'comments_count': post.comments_count,
+                    'created_at': post.created_at,
+                } for post in posts],
+            },
+        }
+        cache.set(cache_key, {'user_id': profile.user_id, 'version': version, 'data': data}, self.SCREEN_CACHE_TTL)
+        return Response(data)
+
     @action(detail=False, methods=['patch'], url_path='privacy')
     def privacy(self, request):
         """Toggle account privacy (is_private)."""
@@ -311,9 +470,50 @@ class ProfileViewSet(viewsets.ModelViewSet):
             
         profile.is_private = bool(is_private)
         profile.save()
-        
+        counters.bump_profile_version(request.user.id)
+
         return Response({'is_private': profile.is_private}, status=status.HTTP_200_OK)
 
+    # -----------------------------------------------------------
+    # Blocks & mutes (see blocks.py)
+    # -----------------------------------------------------------
+    def _target(self, request, username):
+        # Not get_object(): blocked profiles are hidden from the queryset
+        target = get_object_or_404(User, username=username)
+        if target == request.user:
+            raise ValidationError({'error': 'You cannot do that to yourself.'})
+        return target
+
+    @action(detail=True, methods=['post'])
+    def block(self, request, user__username=None):
+        target = self._target(request, user__username)
+        blocks.block(request.user.id, target.id)
+        return Response({'blocked': True})
+
+    @action(detail=True, methods=['post'])
+    def unblock(self, request, user__username=None):
+        target = self._target(request, user__username)
+        return Response({'blocked': False, 'changed': blocks.unblock(request.user.id, target.id)})
+
+    @action(detail=True, methods=['post'])
+    def mute(self, request, user__username=None):
+        target = self._target(request, user__username)
+        blocks.mute(request.user.id, target.id)
+        return Response({'muted': True})
+
+    @action(detail=True, methods=['post'])
+    def unmute(self, request, user__username=None):
+        target = self._target(request, user__username)
+        return Response({'muted': False, 'changed': blocks.unmute(request.user.id, target.id)})
+
+    @action(detail=False, methods=['get'])
+    def blocked(self, request):
+        """Users the current user blocked and muted."""
+        return Response({
+            'blocked': UserSerializer(User.objects.filter(blocked_by__blocker=request.user), many=True).data,
+            'muted': UserSerializer(User.objects.filter(muted_by__muter=request.user), many=True).data,
+        })
+
 class FriendRequestViewSet(viewsets.ModelViewSet):
     """
     Manages the lifecycle of private follow requests (accept, reject, list).
@@ -334,6 +534,9 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+
+        if blocks.is_blocked(request.user.id, serializer.validated_data['receiver'].id):
+            return Response({'error': 'You cannot follow this user.'}, status=403)
         
         # Always set sender as current user
         serializer.save(sender=request.user)
@@ -360,10 +563,14 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
 
         # 3. Follow Back Mechanism (Automatic Mutual Follow)
         # This creates the *follow* relationship for the original sender (Follower -> Followed)
-        Follower.objects.get_or_create(follower=req.sender, followed=req.receiver)
+        _, created = Follower.objects.get_or_create(follower=req.sender, followed=req.receiver)
+        if created:
+            counters.follow_added(req.sender_id, req.receiver_id)
         
         # This creates the *follow back* relationship for the receiver (Followed -> Follower)
-        Follower.objects.get_or_create(follower=req.receiver, followed=req.sender)
+        _, created = Follower.objects.get_or_create(follower=req.receiver, followed=req.sender)
+        if created:
+            counters.follow_added(req.receiver_id, req.sender_id)
 
         return Response({'status': 'accepted', 'message': 'Request accepted, mutual follow established.'})
 
@@ -379,8 +586,41 @@ class FriendRequestViewSet(viewsets.ModelViewSet):
             
         req.status = 'rejected'
         req.save()
+        counters.bump_profile_version(req.sender_id, req.receiver_id)
         return Response({'status': 'rejected'})
 
+    def _bulk_ids(self, request):
+        """{"all": true} -> None, {"ids": [...]} -> ids; raises on anything else."""
+        if request.data.get('all') is True:
+            return None
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError({'error': 'Send {"all": true} or a non-empty "ids" list.'})
+        try:
+            return [int(i) for i in ids]
+        except (TypeError, ValueError):
+            raise ValidationError({'error': 'ids must be request ids.'})
+
+    @action(detail=False, methods=['post'])
+    def accept_bulk(self, request):
+        """Accepts all pending requests, or the given ids, with mutual follows."""
+        from .follow_requests import BATCH_SIZE, accept_requests, pending_for
+
+        ids = self._bulk_ids(request)
+        if ids is None and pending_for(request.user.id).count() > BATCH_SIZE:
+            enqueue(accept_requests, request.user.id, dedup_key=f"accept_requests:{request.user.id}")
+            return Response({'status': 'queued'}, status=202)
+        accepted = accept_requests(request.user.id, ids)
+        return Response({'status': 'accepted', 'accepted': accepted})
+
+    @action(detail=False, methods=['post'])
+    def reject_bulk(self, request):
+        """Rejects all pending requests, or the given ids."""
+        from .follow_requests import reject_requests
+
+        rejected = reject_requests(request.user.id, self._bulk_ids(request))
+        return Response({'status': 'rejected', 'rejected': rejected})
+
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Lists pending requests where the current user is the receiver."""
@@ -411,58 +651,94 @@ class PostViewSet(BaseModelViewSet):
                            .order_by('-created_at')
     serializer_class = PostSerializer
     parser_classes = [MultiPartParser, FormParser]
+    throttle_costs = {'create': 20, 'destroy': 5}
+    low_priority_actions = ('explore',)
+
+    def get_queryset(self):
+        # list / retrieve / update / destroy: only posts the viewer may see
+        # (owners always see theirs; IsOwnerOrReadOnly guards the writes)
+        return visibility.posts(self.request.user, super().get_queryset())
 
     # --------------------------------------------------------
-    # CREATE POST (upload media to Supabase)
+    # CREATE POST (upload media to storage)
     # --------------------------------------------------------
     def create(self, request, *args, **kwargs):
         files = request.FILES.getlist('media')
+        # Finalized resumable uploads (see UploadViewSet) can be attached too
+        upload_ids = request.data.getlist('upload_id')
 
-        if not files:
+        if not files and not upload_ids:
             return Response({"error": "Media files required."},
                             status=400)
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        with transaction.atomic():
-            post = serializer.save(user=request.user, media_urls=[])
-
-        # Upload each media file
         for f in files:
-            ext = os.path.splitext(f.name)[1].lower()
-            path = f"posts/{request.user.id}/{uuid.uuid4()}{ext}"
-            url = upload_to_supabase(f, path)
-            if url:
-                post.media_urls.append(url)
+            if not media_type_for(f.name, getattr(f, 'content_type', None)):
+                return Response({"error": "Only image/video allowed."},
+                                status=400)
+            if not f.size:
+                return Response({"error": f"{f.name} is empty."},
+                                status=400)
+
+        # Upload each original (deduplicated by content hash) before the
+        # post exists, so a failed upload leaves no half-empty post behind;
+        # variants are generated in the background
+        stored = []
+        for f in files:
+            media_type = media_type_for(f.name, getattr(f, 'content_type', None))
+            item = store_upload(f, f"posts/{request.user.id}", media_type)
+            if not item:
+                release_media(stored)
+                return Response({"error": "Could not store the media, please retry."},
+                                status=502)
+            stored.append(item)
 
-        post.save(update_fields=['media_urls'])
+        try:
+            with transaction.atomic():
+                post = serializer.save(user=request.user, media=[])
+                for upload_id in upload_ids:
+                    post.media.append(claim_upload(request.user, upload_id, 'post'))
+                post.media += stored
+                post.save(update_fields=['media'])
+        except ValidationError:
+            release_media(stored)
+            raise
+
+        counters.post_added(request.user.id)
+        tags.index_post(post)
+        enqueue(process_post_media, str(post.id))
         return Response(self.get_serializer(post).data, status=201)
 
+    # --------------------------------------------------------
+    # EDIT CAPTION (re-index hashtags / mentions)
+    # --------------------------------------------------------
+    def perform_update(self, serializer):
+        old_caption = serializer.instance.caption
+        post = serializer.save()
+        if post.caption != old_caption:
+            tags.reindex_post(post, old_caption)
+
     # --------------------------------------------------------
     # DELETE POST
     # --------------------------------------------------------
     def destroy(self, request, *args, **kwargs):
         post = self.get_object()
-        paths = []
-
-        for url in post.media_urls or []:
-            try:
-                path = url.split(f"/{SUPABASE_BUCKET}/")[-1]
-                paths.append(path)
-            except:
-                pass
-
-        if paths:
-            remove_paths(paths)
-
-        return super().destroy(request, *args, **kwargs)
+        # Tombstone now; likes, comments and media are purged in the background
+        from .purge import delete_post
+        delete_post(post)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     # --------------------------------------------------------
     # FEED — posts of people I follow
+    # (?mode=ranked orders them by engagement, see ranking.py)
     # --------------------------------------------------------
     @action(detail=False, methods=['get'])
     def feed(self, request):
+        if request.query_params.get('mode') == 'ranked':
+            return self._ranked_feed(request)
+
         following = Follower.objects.filter(
             follower=request.user
         ).values_list('followed', flat=True)
@@ -471,6 +747,63 @@ class PostViewSet(BaseModelViewSet):
             user_id__in=list(following) + [request.user.id]
         ).select_related('user', 'user__profile') \
          .order_by('-created_at')
+        posts = blocks.exclude_users(posts, blocks.feed_excluded_ids(request.user.id))
+
+        page = self.paginate_queryset(posts)
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
+    def _ranked_feed(self, request):
+        from . import ranking
+        try:
+            ids, next_cursor = ranking.page(
+                request.user,
+                cursor=request.query_params.get('cursor'),
+                page_size=self.paginator.get_page_size(request) or 20,
+            )
+        except (signing.BadSignature, KeyError, TypeError):
+            return Response({"error": "Invalid cursor."}, status=400)
+
+        posts = Post.objects.select_related('user', 'user__profile').in_bulk(ids)
+        # Posts deleted since the ranking was computed are skipped
+        ordered = [posts[i] for i in ids if i in posts]
+
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', next_cursor
+            )
+        return Response({
+            "next": next_url,
+            "results": self.get_serializer(ordered, many=True).data,
+        })
+
+    # --------------------------------------------------------
+    # EXPLORE — precomputed public ranking (see explore.py)
+    # --------------------------------------------------------
+    @action(detail=False, methods=['get'])
+    def explore(self, request):
+        ranked = ExploreRanking.objects.filter(
+            post__deleted_at__isnull=True,
+            post__user__profile__is_private=False,
+        ).select_related('post__user__profile').order_by('rank')
+        ranked = blocks.exclude_users(ranked, blocks.hidden_ids(request.user.id), 'post__user')
+
+        page = self.paginate_queryset(ranked)
+        return self.get_paginated_response(
+            self.get_serializer([r.post for r in page], many=True).data
+        )
+
+    # --------------------------------------------------------
+    # MENTIONS — posts whose caption or comments @mention me
+    # --------------------------------------------------------
+    @action(detail=False, methods=['get'])
+    def mentions(self, request):
+        posts = Post.objects.filter(mentions__user=request.user) \
+            .select_related('user', 'user__profile') \
+            .distinct().order_by('-created_at')
+        posts = blocks.exclude_users(posts, blocks.hidden_ids(request.user.id))
 
         page = self.paginate_queryset(posts)
         return self.get_paginated_response(
@@ -482,8 +815,11 @@ class PostViewSet(BaseModelViewSet):
     # --------------------------------------------------------
     @action(detail=False, methods=['get'], url_path='user/(?P<user_id>[^/.]+)')
     def user_posts(self, request, user_id=None):
-        user = get_object_or_404(User, id=user_id)
-        posts = Post.objects.filter(user=user).order_by('-created_at')
+        user = get_object_or_404(
+            blocks.exclude_users(User.objects.all(), blocks.hidden_ids(request.user.id), 'id'), id=user_id
+        )
+        # Empty for a private account the viewer doesn't follow
+        posts = visibility.posts(request.user).filter(user=user).order_by('-created_at')
 
         page = self.paginate_queryset(posts)
         return self.get_paginated_response(
@@ -496,22 +832,22 @@ class PostViewSet(BaseModelViewSet):
 class LikeViewSet(viewsets.ViewSet):
     authentication_classes = [SessionIDAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_costs = {'toggle': 3}
+    low_priority_actions = ('list_likes',)
 
-    def _is_follower(self, request_user, post_user):
-        return Follower.objects.filter(
-            follower=request_user,
-            followed=post_user
-        ).exists()
+    def _get_post(self, request, pk, message):
+        # One query: 404 if the post doesn't exist, 403 if the viewer can't see it
+        post = get_object_or_404(visibility.annotate(Post.objects.all(), request.user), id=pk)
+        if not post.is_visible:
+            raise PermissionDenied(message)
+        return post
 
     # --------------------------------------------------------
     # LIKE / UNLIKE
     # --------------------------------------------------------
     @action(detail=True, methods=['post'])
     def toggle(self, request, pk=None):
-        post = get_object_or_404(Post, id=pk)
-
-        if post.user != request.user and not self._is_follower(request.user, post.user):
-            raise PermissionDenied("Only followers can like this post.")
+        post = self._get_post(request, pk, "Only followers can like posts of a private account.")
 
         like, created = Like.objects.get_or_create(
             user=request.user,
@@ -520,8 +856,10 @@ class LikeViewSet(viewsets.ViewSet):
 
         if not created:
             like.delete()
+            counters.like_added(post.id, -1)
             return Response({'liked': False})
 
+        counters.like_added(post.id)
         return Response({'liked': True})
 
     # --------------------------------------------------------
@@ -529,12 +867,11 @@ class LikeViewSet(viewsets.ViewSet):
     # --------------------------------------------------------
     @action(detail=True, methods=['get'])
     def list_likes(self, request, pk=None):
-        post = get_object_or_404(Post, id=pk)
-
-        if post.user != request.user and not self._is_follower(request.user, post.user):
-            raise PermissionDenied("Only followers can see likes.")
+        post = self._get_post(request, pk, "Only followers can see likes on a private account.")
 
-        users = [l.user for l in post.likes.all()]
+        users = blocks.exclude_users(
+            User.objects.filter(id__in=post.likes.values('user')), blocks.hidden_ids(request.user.id), field='id'
+        )
         return Response(UserSerializer(users, many=True).data)
 
 # ===================================================================
@@ -543,6 +880,7 @@ class LikeViewSet(viewsets.ViewSet):
 class CommentViewSet(BaseModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    throttle_costs = {'create': 3}
 
     # --------------------------------------------------------
     # LIST COMMENTS (post_id required)
@@ -552,16 +890,22 @@ class CommentViewSet(BaseModelViewSet):
         post_id = self.request.query_params.get('post_id')
 
         if post_id:
-            post = get_object_or_404(Post, id=post_id)
+            post = get_object_or_404(visibility.annotate(Post.objects.all(), user), id=post_id)
+            if not post.is_visible:
+                raise PermissionDenied("Only followers can view comments on a private account.")
 
-            if post.user != user and not Follower.objects.filter(
-                follower=user, followed=post.user
-            ).exists():
-                raise PermissionDenied("Only followers can view comments.")
+            return blocks.exclude_users(
+                Comment.objects.filter(post_id=post_id, parent=None), blocks.hidden_ids(user.id)
+            )
 
-            return Comment.objects.filter(post_id=post_id, parent=None)
+        return Comment.objects.filter(user=user, post__deleted_at__isnull=True)
 
-        return Comment.objects.filter(user=user)
+    def get_serializer_context(self):
+        # Replies by blocked users are dropped too (CommentSerializer.get_replies)
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            context['hidden_user_ids'] = blocks.hidden_ids(self.request.user.id)
+        return context
 
     # --------------------------------------------------------
     # ADD COMMENT
@@ -574,15 +918,23 @@ class CommentViewSet(BaseModelViewSet):
             raise ValidationError({"post": "post is required"})
 
         # Permission check
-        if post.user != self.request.user and not Follower.objects.filter(
-            follower=self.request.user, followed=post.user
-        ).exists():
-            raise PermissionDenied("Only followers can comment.")
+        if not visibility.posts(self.request.user).filter(pk=post.pk).exists():
+            raise PermissionDenied("Only followers can comment on a private account.")
 
         if parent and parent.post != post:
             raise ValidationError({"parent": "Parent comment must belong to same post."})
 
-        serializer.save(user=self.request.user)
+        comment = serializer.save(user=self.request.user)
+        counters.comments_added(post.id)
+        tags.index_comment(comment)
+
+    def perform_destroy(self, instance):
+        post = instance.post
+        used = tags.hashtags_of(Comment.objects.filter(Q(pk=instance.pk) | Q(parent=instance)))
+        # Replies cascade with the comment; count them all off the post
+        _, deleted = instance.delete()
+        counters.comments_added(post.id, -deleted.get('api.Comment', 0))
+        tags.release_hashtags(post, used)
 
 # ===================================================================
 # 7. DIRECT MESSAGES (CLEAN & FIXED)
@@ -592,6 +944,7 @@ class MessageViewSet(BaseModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = MessageSerializer
     parser_classes = [MultiPartParser, FormParser]
+    throttle_costs = {'create': 2}
 
     # --------------------------------------------------------
     # LIST MESSAGES / CHAT WITH USER
@@ -619,20 +972,31 @@ class MessageViewSet(BaseModelViewSet):
             raise ValidationError({"receiver": "Receiver is required"})
 
         receiver = get_object_or_404(User, id=receiver_id)
+        if blocks.is_blocked(self.request.user.id, receiver.id):
+            raise PermissionDenied("You cannot message this user.")
 
         file = self.request.FILES.get('media')
-        media_url = None
-
-        if file:
-            ext = os.path.splitext(file.name)[1].lower()
-            path = f"messages/{self.request.user.id}/{uuid.uuid4()}{ext}"
-            media_url = upload_to_supabase(file, path)
-
-        serializer.save(
-            sender=self.request.user,
-            receiver=receiver,
-            media_url=media_url
-        )
+        upload_id = self.request.data.get('upload_id')
+        media_path = None
+
+        if file and not upload_id:
+            # Any file type can be sent; only images and videos are typed as such
+            item = store_upload(
+                file, f"messages/{self.request.user.id}", media_type_for(file.name) or 'file'
+            )
+            if not item:
+                raise ValidationError({"media": "Upload failed"})
+            media_path = item["path"]
+
+        # A failed save leaves the upload unclaimed, so it can be sent again
+        with transaction.atomic():
+            if upload_id:
+                media_path = claim_upload(self.request.user, upload_id, 'message')["path"]
+            serializer.save(
+                sender=self.request.user,
+                receiver=receiver,
+                media_path=media_path
+            )
 
     # --------------------------------------------------------
     # MARK AS READ
@@ -652,18 +1016,30 @@ class MessageViewSet(BaseModelViewSet):
         return Response({'message': 'Message marked read'})
 
     # --------------------------------------------------------
-    # CHAT — FULL CONVERSATION WITH A USER
+    # CHAT — CONVERSATION WITH A USER (cursor paged, archive included)
     # --------------------------------------------------------
     @action(detail=False, methods=['get'], url_path='chat/(?P<user_id>[^/.]+)')
     def chat(self, request, user_id=None):
+        """Newest page first, oldest message first within a page; `next` pages back into the archive."""
         other = get_object_or_404(User, id=user_id)
-
-        msgs = Message.objects.filter(
-            Q(sender=request.user, receiver=other) |
-            Q(sender=other, receiver=request.user)
-        ).order_by('created_at')
-
-        return Response(self.get_serializer(msgs, many=True).data)
+        try:
+            msgs, next_cursor = archive.chat_page(
+                request.user, other,
+                cursor=request.query_params.get('cursor'),
+                page_size=self.paginator.get_page_size(request) or 20,
+            )
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return Response({"error": "Invalid cursor."}, status=400)
+
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', next_cursor
+            )
+        return Response({
+            "next": next_url,
+            "results": self.get_serializer(msgs, many=True).data,
+        })
 
 
 
@@ -672,37 +1048,50 @@ class MessageViewSet(BaseModelViewSet):
 # ===================================================================
 
 class StoryViewSet(BaseModelViewSet):
-    queryset = Story.objects.filter(
-        expires_at__gt=timezone.now()
-    ).select_related('user')
+    queryset = Story.objects.select_related('user')
     serializer_class = StorySerializer
     parser_classes = [MultiPartParser, FormParser]
+    throttle_costs = {'create': 10}
+
+    def get_queryset(self):
+        # Active stories the viewer may see (expiry is checked per request,
+        # not once at import)
+        return visibility.stories(
+            self.request.user, super().get_queryset().filter(expires_at__gt=timezone.now())
+        )
 
     # --------------------------------------------------------
     # UPLOAD STORY
     # --------------------------------------------------------
     def perform_create(self, serializer):
         file = self.request.FILES.get('file') or self.request.FILES.get('media')
-        if not file:
-            raise ValidationError({"media": "media file required"})
+        upload_id = self.request.data.get('upload_id')
 
-        mime_type, _ = guess_type(file.name)
-        if not mime_type or not mime_type.startswith(('image/', 'video/')):
-            raise ValidationError({"media": "Only image/video allowed"})
+        if upload_id:
+            item = claim_upload(self.request.user, upload_id, 'story')
+            media_type = item["type"]
+        else:
+            if not file:
+                raise ValidationError({"media": "media file required"})
 
-        media_type = 'image' if mime_type.startswith('image/') else 'video'
+            media_type = media_type_for(file.name)
+            if not media_type:
+                raise ValidationError({"media": "Only image/video allowed"})
 
-        path = f"stories/{self.request.user.id}/{uuid.uuid4()}{os.path.splitext(file.name)[1]}"
-        media_url = upload_to_supabase(file, path)
+            item = store_upload(file, f"stories/{self.request.user.id}", media_type)
+            if not item:
+                raise ValidationError({"media": "Upload failed"})
 
         expires_at = timezone.now() + timedelta(hours=24)
 
-        serializer.save(
+        story = serializer.save(
             user=self.request.user,
-            media_url=media_url,
+            media=item,
             media_type=media_type,
             expires_at=expires_at
         )
+        counters.bump_profile_version(self.request.user.id)
+        enqueue(process_story_media, str(story.id))
 
     # --------------------------------------------------------
     # LIST STORIES OF FOLLOWING USERS + SELF
@@ -719,6 +1108,7 @@ class StoryViewSet(BaseModelViewSet):
             user__in=user_ids,
             expires_at__gt=timezone.now()
         ).order_by('user', '-created_at')
+        stories = blocks.exclude_users(stories, blocks.feed_excluded_ids(request.user.id))
 
         return Response(
             self.get_serializer(stories, many=True).data
@@ -729,15 +1119,19 @@ class StoryViewSet(BaseModelViewSet):
     # --------------------------------------------------------
     @action(detail=True, methods=['post'])
     def mark_viewed(self, request, pk=None):
-        story = get_object_or_404(Story, id=pk)
+        # Stories of blocked users 404 here (visibility.stories)
+        story = get_object_or_404(self.get_queryset(), id=pk)
 
-        if story.user == request.user:
+        if story.user_id == request.user.id:
             return Response({'message': 'Cannot mark own story'}, status=400)
 
         view, created = StoryView.objects.get_or_create(
             story=story,
             viewer=request.user
         )
+        if created:
+            # Only this viewer's story ring changes: drop just their cached screen
+            cache.delete(ProfileViewSet.screen_cache_key(request.user.id, story.user.username))
 
         return Response({
             'viewed': True,
@@ -750,9 +1144,11 @@ class StoryViewSet(BaseModelViewSet):
     # --------------------------------------------------------
     @action(detail=True, methods=['get'])
     def views(self, request, pk=None):
-        story = get_object_or_404(Story, id=pk)
+        story = get_object_or_404(self.get_queryset(), id=pk)
         viewers = StoryView.objects.filter(story=story).values_list('viewer', flat=True)
-        users = User.objects.filter(id__in=viewers)
+        users = blocks.exclude_users(
+            User.objects.filter(id__in=viewers), blocks.hidden_ids(request.user.id), field='id'
+        )
         return Response(UserSerializer(users, many=True).data)
 
     # --------------------------------------------------------
@@ -765,6 +1161,7 @@ class StoryViewSet(BaseModelViewSet):
         if story.user != request.user:
             return Response({'error': 'Not allowed'}, status=403)
 
+        release_media([story.media])
         story.delete()
         return Response({'deleted': True})
 
@@ -775,12 +1172,335 @@ class StoryViewSet(BaseModelViewSet):
 # ===================================================================
 class UserSearchView(generics.ListAPIView):
     serializer_class = UserSerializer
+    # Search-as-you-type fires on every keystroke
+    throttle_cost = 2
+    low_priority = True
 
     def get_queryset(self):
         q = self.request.query_params.get('q', '').strip()
         if len(q) < 2:
             return User.objects.none()
-        return User.objects.filter(
-            Q(username__icontains=q) | Q(profile__full_name__icontains=q)
-        ).distinct()[:20]
+        users = User.objects.filter(
+            Q(username__icontains=q) | Q(profile__full_name__icontains=q),
+            is_active=True,
+        )
+        return blocks.exclude_users(users, blocks.hidden_ids(self.request.user.id), 'id').distinct()[:20]
+
+
+class ContentSearchView(generics.GenericAPIView):
+    """GET /search/content/?q=...&page=N — posts by caption / comment text (see search.py)."""
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_cost = 3
+    low_priority = True
+    page_size = 20
+
+    def get(self, request):
+        from . import search
+        q = request.query_params.get('q', '').strip()
+        if len(q) < 2:
+            return Response({'next': None, 'results': []})
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+        except ValueError:
+            return Response({'error': 'page must be an integer.'}, status=400)
+
+        # One extra row tells whether there is a next page
+        ids = search.search_post_ids(
+            request.user, q, limit=self.page_size + 1, offset=(page - 1) * self.page_size
+        )
+        has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        posts = Post.objects.select_related('user', 'user__profile').in_bulk(ids)
+
+        return Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'page', page + 1) if has_next else None,
+            'results': self.get_serializer([posts[i] for i in ids if i in posts], many=True).data,
+        })
+
 
+# ===================================================================
+# 10. Resumable uploads (large story / post / message videos)
+# ===================================================================
+class UploadViewSet(viewsets.ViewSet):
+    """
+    tus-style resumable uploads:
+
+    POST   /uploads/                 {purpose, filename, content_type, length}
+    HEAD   /uploads/<id>/            -> Upload-Offset (where to resume from)
+    PATCH  /uploads/<id>/            raw chunk body + Upload-Offset header
+    POST   /uploads/<id>/finalize/   store the file; then pass upload_id when
+                                     creating a post / story / message
+    DELETE /uploads/<id>/            abort
+    """
+    authentication_classes = [SessionIDAuthentication]
+    permission_classes = [IsAuthenticated]
+    # PATCH bodies are read straight from the request stream, never parsed
+    parser_classes = [JSONParser, FormParser]
+    throttle_costs = {'create': 10, 'partial_update': 1, 'finalize': 10}
+
+    def _headers(self, session):
+        return {
+            'Tus-Resumable': '1.0.0',
+            'Upload-Offset': str(session.offset),
+            'Upload-Length': str(session.length),
+            'Cache-Control': 'no-store',
+        }
+
+    def _payload(self, session):
+        return {
+            'id': str(session.id),
+            'purpose': session.purpose,
+            'offset': session.offset,
+            'length': session.length,
+            'status': session.status,
+        }
+
+    def create(self, request):
+        session = create_session(
+            request.user,
+            request.data.get('purpose'),
+            request.data.get('filename'),
+            request.data.get('content_type'),
+            request.data.get('length') or request.headers.get('Upload-Length'),
+        )
+        headers = self._headers(session)
+        headers['Location'] = request.build_absolute_uri(f"{session.id}/")
+        return Response(self._payload(session), status=status.HTTP_201_CREATED, headers=headers)
+
+    def retrieve(self, request, pk=None):
+        session = get_object_or_404(UploadSession, id=pk, user=request.user)
+        return Response(self._payload(session), headers=self._headers(session))
+
+    def partial_update(self, request, pk=None):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({'error': 'Upload-Offset header required.'}, status=400)
+
+        get_object_or_404(UploadSession, id=pk, user=request.user)
+        try:
+            new_offset = append_chunk(pk, request.user, offset, request.stream or io.BytesIO())
+        except OffsetMismatch as e:
+            return Response({'error': 'Offset mismatch.', 'offset': e.offset},
+                            status=status.HTTP_409_CONFLICT,
+                            headers={'Upload-Offset': str(e.offset)})
+
+        return Response(status=status.HTTP_204_NO_CONTENT,
+                        headers={'Tus-Resumable': '1.0.0', 'Upload-Offset': str(new_offset)})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        get_object_or_404(UploadSession, id=pk, user=request.user)
+        session = finalize(pk, request.user)
+        return Response({**self._payload(session), 'upload_id': str(session.id)})
+
+    def destroy(self, request, pk=None):
+        session = get_object_or_404(UploadSession, id=pk, user=request.user)
+        if session.status == 'attached':
+            return Response({'error': 'Upload is already attached.'}, status=400)
+        abort(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# ===================================================================
+# 11. Media files (local / memory storage backends)
+# ===================================================================
+def serve_media(request, path):
+    """
+    Serve an object of the local or in-memory storage backend at MEDIA_URL.
+    Behind nginx set MEDIA_ACCEL_REDIRECT to an internal location aliasing
+    MEDIA_ROOT and nginx sends the file; otherwise FileResponse streams it
+    (sendfile where the server supports wsgi.file_wrapper).
+    """
+    from django.conf import settings
+    from django.http import FileResponse, Http404, HttpResponse
+    from .utils.storage import LocalStorage
+
+    storage = get_storage()
+    content_type = guess_type(path)[0] or 'application/octet-stream'
+    if isinstance(storage, LocalStorage):
+        try:
+            full_path = storage.full_path(path)
+        except ValueError:
+            raise Http404
+        if not os.path.isfile(full_path):
+            raise Http404
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT.rstrip('/') + '/' + path
+            return response
+        return FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    data = storage.get(path)
+    if data is None:
+        raise Http404
+    return HttpResponse(data, content_type=content_type)
+
+
+# ===================================================================
+# 12. Hashtags (indexes maintained by tags.py)
+# ===================================================================
+class HashtagFeedPagination(CursorPagination):
+    page_size = 20
+    ordering = ('-created_at', '-id')
+
+
+class HashtagViewSet(viewsets.ViewSet):
+    """
+    GET /hashtags/<name>/               tag + post count
+    GET /hashtags/<name>/posts/         tagged posts, newest first (cursor paged)
+    GET /hashtags/autocomplete/?q=ca    tags starting with the prefix
+    GET /hashtags/trending/?hours=24    most used tags over the last hours
+    """
+    authentication_classes = [SessionIDAuthentication]
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'name'
+    lookup_value_regex = r'\w+'
+    low_priority_actions = ('autocomplete', 'trending')
+
+    def retrieve(self, request, name=None):
+        tag = get_object_or_404(Hashtag, name=name.lower())
+        return Response({'name': tag.name, 'post_count': tag.post_count})
+
+    @action(detail=True, methods=['get'])
+    def posts(self, request, name=None):
+        tag = get_object_or_404(Hashtag, name=name.lower())
+        links = PostHashtag.objects.filter(
+            visibility.visible_q(request.user, 'post__user'),
+            hashtag=tag, post__deleted_at__isnull=True,
+        ).select_related('post__user__profile')
+
+        paginator = HashtagFeedPagination()
+        page = paginator.paginate_queryset(links, request, view=self)
+        return paginator.get_paginated_response(PostSerializer(
+            [link.post for link in page], many=True, context={'request': request}
+        ).data)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        return Response(tags.autocomplete(request.query_params.get('q', '')))
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        try:
+            hours = min(max(int(request.query_params.get('hours', 24)), 1), tags.TREND_RETENTION_HOURS)
+        except ValueError:
+            return Response({'error': 'hours must be an integer.'}, status=400)
+        return Response(tags.trending(hours))
+
+
+# ===================================================================
+# 13. Data exports ("download your data", see exports.py)
+# ===================================================================
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def ranged_file_response(request, fileobj, size, content_type, filename):
+    """Stream fileobj, honouring a single `Range: bytes=a-b` so downloads can resume."""
+    from django.http import HttpResponse, StreamingHttpResponse
+
+    start, end, status_code = 0, size - 1, 200
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if match and any(match.groups()):
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)  # suffix range: the last N bytes
+        if start > end:
+            fileobj.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        status_code = 206
+
+    def chunks():
+        try:
+            fileobj.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = fileobj.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        finally:
+            fileobj.close()
+
+    response = StreamingHttpResponse(chunks(), status=status_code, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if status_code == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+class ExportViewSet(viewsets.ViewSet):
+    """
+    POST /exports/                          queue an export (or return the running one)
+    GET  /exports/                          my recent exports
+    GET  /exports/<id>/                     status + signed download_url once ready
+    GET  /exports/<id>/download/?token=...  the ZIP (no session needed; Range supported)
+    """
+    authentication_classes = [SessionIDAuthentication]
+    throttle_costs = {'create': 20}
+
+    def get_permissions(self):
+        if self.action == 'download':
+            return [AllowAny()]  # the signed token is the credential
+        return [IsAuthenticated()]
+
+    def _data(self, request, export):
+        from . import exports
+        data = {
+            'id': str(export.id),
+            'status': export.status,
+            'size': export.size,
+            'created_at': export.created_at,
+            'expires_at': export.expires_at,
+            'download_url': None,
+        }
+        if export.status == 'ready':
+            url = reverse('exports-download', kwargs={'pk': export.id})
+            data['download_url'] = request.build_absolute_uri(
+                f"{url}?token={exports.download_token(export)}"
+            )
+        return data
+
+    def create(self, request):
+        from . import exports
+        export, created = exports.request_export(request.user)
+        return Response(self._data(request, export), status=202 if created else 200)
+
+    def list(self, request):
+        recent = DataExport.objects.filter(user=request.user).order_by('-created_at')[:10]
+        return Response([self._data(request, e) for e in recent])
+
+    def retrieve(self, request, pk=None):
+        export = get_object_or_404(DataExport, id=pk, user=request.user)
+        return Response(self._data(request, export))
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        from django.http import HttpResponseRedirect
+        from . import exports
+
+        export = exports.export_for_token(request.query_params.get('token', ''))
+        if export is None or str(export.id) != str(pk):
+            return Response({'error': 'Download link is invalid or has expired.'}, status=403)
+
+        storage = get_storage()
+        # Supabase serves (and resumes) it directly from a short-lived signed URL
+        signed = storage.signed_url(export.path, expires_in=5 * 60)
+        if signed:
+            return HttpResponseRedirect(signed)
+
+        fileobj = storage.open(export.path)
+        if fileobj is None:
+            return Response({'error': 'Export file is missing.'}, status=410)
+        return ranged_file_response(
+            request, fileobj, export.size, 'application/zip', f"instagram-data-{export.created_at:%Y%m%d}.zip"
+        )
@@ -0,0 +1,50 @@
+# backend/api/visibility.py
+"""
+What a viewer may see, as queryset filters.
+
+A row owned by user U is visible to viewer V when
+
+    U is V  OR  U's profile is public  OR  V follows U
+
+and neither of them blocked the other (blocks.py). visible_q() builds that
+as one Q over the path to the owning user (`user`, `post__user`, ...), with
+the follow check as an IN (subquery), so it runs inside the list or detail
+query itself instead of as separate Follower.exists() round-trips.
+
+    visibility.posts(viewer)                     # filtered queryset
+    visibility.annotate(Post.objects, viewer)    # every row + .is_visible,
+                                                 # to tell 404 from 403
+"""
+from django.db.models import BooleanField, ExpressionWrapper, Q
+
+from . import blocks
+from .models import Follower, Post, Story
+
+
+def visible_q(viewer, owner="user"):
+    following = Follower.objects.filter(follower_id=viewer.id).values("followed_id")
+    q = (
+        Q(**{owner: viewer.id})
+        | Q(**{f"{owner}__profile__is_private": False})
+        | Q(**{f"{owner}__in": following})
+    )
+    hidden = blocks.hidden_ids(viewer.id)
+    if hidden:
+        q &= ~Q(**{f"{owner}__in": hidden})
+    return q
+
+
+def annotate(queryset, viewer, owner="user"):
+    return queryset.annotate(
+        is_visible=ExpressionWrapper(visible_q(viewer, owner), output_field=BooleanField())
+    )
+
+
+def posts(viewer, queryset=None):
+    queryset = Post.objects.all() if queryset is None else queryset
+    return queryset.filter(visible_q(viewer))
+
+
+def stories(viewer, queryset=None):
+    queryset = Story.objects.all() if queryset is None else queryset
+    return queryset.filter(visible_q(viewer))
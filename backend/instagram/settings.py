@@ -38,13 +38,14 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',
     'api',
-    'django_crontab',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
+    'api.middleware.LoadSheddingMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',  # Disabled for pure API (good)
     'django.middleware.security.SecurityMiddleware',
@@ -92,6 +93,34 @@ else:
         }
     }
 
+# Read replicas: comma separated URLs -> aliases replica_0, replica_1, ...
+# (see api/db_routing.py). Tests read through the primary.
+for i, url in enumerate(filter(None, os.getenv('REPLICA_DATABASE_URLS', '').split(','))):
+    DATABASES[f'replica_{i}'] = {
+        **dj_database_url.parse(url.strip(), conn_max_age=600),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.db_routing.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 15))           # read-your-writes window
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.getenv('REPLICA_HEALTH_CHECK_INTERVAL', 5))
+
+# ==================== CACHE ====================
+# Shared cache when Redis is available, per-process memory otherwise
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # ==================== STATIC ====================
 STATIC_URL = '/static/'
@@ -119,20 +148,75 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.WeightedRateThrottle',
+    ],
+    # Proxies in front of the app that append to X-Forwarded-For; 0 trusts REMOTE_ADDR only
+    'NUM_PROXIES': int(os.getenv('THROTTLE_TRUSTED_PROXIES', 0)),
 }
 
+# ==================== THROTTLING / LOAD SHEDDING ====================
+# Token bucket per session user (or IP); views set per-action costs (api/throttling.py)
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_CAPACITY = int(os.getenv('THROTTLE_CAPACITY', 120))                   # burst, in cost units
+THROTTLE_REFILL_PER_SECOND = float(os.getenv('THROTTLE_REFILL_PER_SECOND', 2))
+THROTTLE_DEFAULT_COSTS = {'read': 1, 'write': 2}
+# Shed low-priority reads while the average query takes longer than this (0 disables)
+LOAD_SHED_DB_LATENCY_MS = float(os.getenv('LOAD_SHED_DB_LATENCY_MS', 250))
+LOAD_SHED_RETRY_AFTER = int(os.getenv('LOAD_SHED_RETRY_AFTER', 5))            # seconds
+
+# ==================== DATA EXPORTS ====================
+# "Download your data" ZIPs (api/exports.py)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))                  # rows per DB round-trip
+EXPORT_MEDIA_WORKERS = int(os.getenv('EXPORT_MEDIA_WORKERS', 8))               # parallel media downloads
+EXPORT_LINK_TTL = int(os.getenv('EXPORT_LINK_TTL', 24 * 60 * 60))              # signed link lifetime (s)
+EXPORT_RETENTION_DAYS = int(os.getenv('EXPORT_RETENTION_DAYS', 7))
+
+# ==================== MESSAGE ARCHIVE ====================
+# Old direct messages packed into compressed storage segments (api/archive.py)
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.getenv('MESSAGE_ARCHIVE_AFTER_DAYS', 365))  # 0 disables archiving
+MESSAGE_SEGMENT_SIZE = int(os.getenv('MESSAGE_SEGMENT_SIZE', 1000))            # messages per segment
+
+# ==================== BATCH REQUESTS ====================
+# POST /api/batch/ (api/batch.py)
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 4))                             # concurrent GETs per process
+
 # ==================== SUPABASE ====================
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
 SUPABASE_BUCKET = os.environ.get('SUPABASE_BUCKET', 'files')
 
-# ==================== CELERY ====================
-if os.getenv('REDIS_URL'):
-    CELERY_BROKER_URL = os.getenv('REDIS_URL')
-    CELERY_RESULT_BACKEND = os.getenv('REDIS_URL')
-else:
-    CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
-    CELERY_RESULT_BACKEND = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+# Storage HTTP client (api/utils/storage_gateway.py)
+STORAGE_POOL_SIZE = int(os.getenv('STORAGE_POOL_SIZE', 20))                 # pooled connections per process
+STORAGE_CONNECT_TIMEOUT = float(os.getenv('STORAGE_CONNECT_TIMEOUT', 3))
+STORAGE_TIMEOUT = float(os.getenv('STORAGE_TIMEOUT', 30))                   # per attempt; a call's deadline covers all retries
+STORAGE_MAX_RETRIES = int(os.getenv('STORAGE_MAX_RETRIES', 2))
+STORAGE_BREAKER_THRESHOLD = int(os.getenv('STORAGE_BREAKER_THRESHOLD', 5))  # consecutive failures before failing fast
+STORAGE_BREAKER_RESET = float(os.getenv('STORAGE_BREAKER_RESET', 30))       # seconds before a trial call
+
+# ==================== MEDIA STORAGE ====================
+# supabase | local | memory (api/utils/storage.py); rows store keys, so this can change freely
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase' if SUPABASE_URL else 'local')
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', str(BASE_DIR / 'media'))
+MEDIA_URL = os.getenv('MEDIA_URL', '/media/')  # may be absolute, e.g. a CDN in front of MEDIA_ROOT
+# Behind nginx, hand local files off with X-Accel-Redirect to this internal location
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', '')
+
+# ==================== RESUMABLE UPLOADS ====================
+RESUMABLE_UPLOAD_DIR = os.getenv('RESUMABLE_UPLOAD_DIR', str(BASE_DIR / 'tmp' / 'uploads'))
+RESUMABLE_UPLOAD_MAX_SIZE = int(os.getenv('RESUMABLE_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))  # 1 GB
+
+# ==================== BACKGROUND JOBS ====================
+# api/jobs.py. 'inprocess' needs nothing else; 'redis' needs `manage.py run_jobs` workers
+JOBS_BACKEND = os.getenv('JOBS_BACKEND', 'inprocess')
+REDIS_URL = os.getenv('REDIS_URL', '')
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', os.getenv('BACKGROUND_WORKERS', 4)))
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False') == 'True'       # run jobs inline (tests)
+JOBS_DEDUP_TTL = int(os.getenv('JOBS_DEDUP_TTL', 60 * 60))     # longest a dedup key can block re-queueing
+JOBS_SCHEDULER_TICK = int(os.getenv('JOBS_SCHEDULER_TICK', 30))
+# Modules defining @periodic jobs, imported by the scheduler
+JOBS_MODULES = ['api.services', 'api.uploads', 'api.purge', 'api.explore', 'api.tags', 'api.exports', 'api.follow_requests', 'api.archive']
 
 
 # ============ MULTI-USER SESSION SETTINGS - KEEP FOREVER ============
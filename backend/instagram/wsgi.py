@@ -7,3 +7,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'instagram.settings')
 
 application = get_wsgi_application()
+
+# Without dedicated job workers, the web process also runs the periodic jobs
+from django.conf import settings  # noqa: E402
+
+if settings.JOBS_BACKEND == 'inprocess' and not settings.JOBS_EAGER:
+    from api.jobs import start_scheduler  # noqa: E402
+    start_scheduler()